@@ -1,22 +1,12 @@
 #!/bin/sh
 # Usage:
 # $ bash merge-csv.sh [directory_with_csvs]
-
-# Merge all non-header lines into merged.csv
-for fname in $1/*
-do 
-    tail -n+2 $fname >> merged.csv;
-done
-
-# Get the unique rows by column 1, 2
-awk -F"," '!seen[$1, $2]++' merged.csv > merged2.csv
-
-# Sort the final rows in alpha order - first by the first col., then by second col.
-sort -k1,1 -k2,2 merged2.csv > merged3.csv
-
-# Rename and cleanup output
-# Commented out 'rm' commands just in case
-#rm merged.csv
-#rm merged2.csv
-#mv merged3.csv merged.csv
-
+#
+# Superseded by `gts merge`, which keeps the newest value of each
+# (repository, date/site) instead of the first one seen, sorts in bounded
+# memory and leaves no intermediate files behind.
+
+# Merge each kind of snapshot into its own sorted, de-duplicated CSV
+gts merge $1/*-traffic-stats.csv -o merged-traffic-stats.csv
+gts merge $1/*-clone-stats.csv -o merged-clone-stats.csv
+gts merge $1/*-referrer-stats.csv -o merged-referrer-stats.csv
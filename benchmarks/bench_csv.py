@@ -0,0 +1,102 @@
+""" Throughput of the CSV output: the per-row open/append store_csv it replaced
+versus the single-open buffered CsvStore, over a synthetic organization.
+
+    $ python benchmarks/bench_csv.py --repos 10000
+
+The previous implementation re-reads the whole file for every repository, so its
+cost grows quadratically; use --legacy-repos to bound how long it runs.
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gts import csv_store
+from gts.record import RepoStats
+
+
+def synthetic_responses(repos):
+    """ One views, clones and referrers response per repository, 14 days each """
+    for i in range(repos):
+        repo = 'repo-%05d' % i
+        days = [{'timestamp': '2017-07-%02dT00:00:00Z' % (17 + d), 'count': (i + d) % 50, 'uniques': (i + d) % 7}
+                for d in range(14)]
+        yield (repo,
+               {'count': sum(r['count'] for r in days), 'uniques': 7, 'views': days},
+               {'count': sum(r['count'] for r in days), 'uniques': 7, 'clones': days},
+               [{'referrer': 'site-%d' % s, 'count': i % 30 + s, 'uniques': s} for s in range(5)])
+
+
+def legacy_store_csv(file_path, repo, json_response, response_type, headers, rows):
+    """ The previous store_csv/store_csv_referrers: read the file, then reopen it per row """
+    try:
+        csv_file = open(file_path).readlines()
+        if csv_file:
+            for row in rows:
+                with open(file_path, 'a') as csvfile:
+                    csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                    csv_writer.writerow(row)
+    except IOError:
+        with open(file_path, 'a') as csvfile:
+            csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            csv_writer.writerow(headers)
+        for row in rows:
+            with open(file_path, 'a') as csvfile:
+                csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                csv_writer.writerow(row)
+
+
+def legacy_rows(repo, json_response, response_type):
+    dates_and_views = OrderedDict()
+    for row in json_response[response_type]:
+        dates_and_views[str(row['timestamp'][0:10])] = (str(row['count']), str(row['uniques']))
+    return [[repo, d, v[0], v[1]] for d, v in dates_and_views.items()]
+
+
+def run_legacy(directory, repos):
+    paths = [os.path.join(directory, name) for name in ('views.csv', 'clones.csv', 'referrers.csv')]
+    for repo, traffic, clones, referrers in synthetic_responses(repos):
+        legacy_store_csv(paths[0], repo, traffic, 'views', csv_store.views_headers, legacy_rows(repo, traffic, 'views'))
+        legacy_store_csv(paths[1], repo, clones, 'clones', csv_store.clones_headers, legacy_rows(repo, clones, 'clones'))
+        legacy_store_csv(paths[2], repo, referrers, '', csv_store.referrers_headers,
+                         [[repo, r['referrer'], str(r['count']), str(r['uniques'])] for r in referrers])
+
+
+def run_store(directory, repos):
+    paths = [os.path.join(directory, name) for name in ('views.csv', 'clones.csv', 'referrers.csv')]
+    with csv_store.CsvStore(*paths) as store:
+        for response in synthetic_responses(repos):
+            # The parse is timed too, the legacy writer walks the JSON itself
+            store.write(RepoStats.from_json(*response))
+
+
+def measure(label, run, repos):
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        run(directory, repos)
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(directory)
+    rows = repos * (14 + 14 + 5)
+    print('%-18s %6d repos %8d rows  %7.2fs  %10.0f rows/sec' % (label, repos, rows, elapsed, rows / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repos', default=10000, type=int, help='Number of synthetic repositories')
+    parser.add_argument('--legacy-repos', default=None, type=int, help='Repositories for the previous writer [--repos]')
+    args = parser.parse_args()
+
+    measure('store_csv (before)', run_legacy, args.legacy_repos or args.repos)
+    measure('CsvStore (after)', run_store, args.repos)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+""" Rows/sec of the Postgres writer: the per-row SELECT-then-INSERT loop it replaced
+versus the batched upserts of gts.db.
+
+Needs psycopg2 and a scratch database, whose gts tables are dropped and recreated:
+
+    $ python benchmarks/bench_db.py --dsn 'host=127.0.0.1 dbname=test user=root' --repos 500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2
+
+from gts import db
+
+
+def synthetic_responses(repos):
+    """ One views, clones and referrers response per repository, 14 days each """
+    for i in range(repos):
+        repo = 'repo-%05d' % i
+        days = [{'timestamp': '2017-07-%02dT00:00:00Z' % (17 + d), 'count': (i + d) % 50, 'uniques': (i + d) % 7}
+                for d in range(14)]
+        yield (repo,
+               {'count': sum(r['count'] for r in days), 'uniques': 7, 'views': days},
+               {'count': sum(r['count'] for r in days), 'uniques': 7, 'clones': days},
+               [{'referrer': 'site-%d' % s, 'count': i % 30 + s, 'uniques': s} for s in range(5)])
+
+
+def legacy_write(cur, repo, traffic, clones, referrers):
+    """ The per-row loops of the previous store_db, with autocommit on """
+    rows = 0
+    for response_type, table, json_response in (('views', 'repo_visitors', traffic), ('clones', 'repo_clones', clones)):
+        cur.execute("SELECT COUNT(*) FROM repo_overview WHERE create_timestamp=DATE(NOW()) AND Repo_Name='%s' AND Result_Type='%s'" % (repo, response_type))
+        if cur.fetchall()[0][0] == 0:
+            cur.execute("INSERT INTO repo_overview(create_timestamp, Repo_Name, Result_Type, Uniques, Total) VALUES (DATE(NOW()), '%s', '%s', %s, %s);" % (repo, response_type, json_response['uniques'], json_response['count']))
+        rows += 1
+        for obj in json_response[response_type]:
+            cur.execute("SELECT COUNT(*) FROM %s WHERE create_timestamp='%s' AND Repo_Name='%s';" % (table, obj['timestamp'], repo))
+            if cur.fetchall()[0][0] == 0:
+                cur.execute("INSERT INTO %s(Repo_Name, create_timestamp, Uniques, Total) VALUES ('%s', '%s', %s, %s);" % (table, repo, obj['timestamp'], obj['uniques'], obj['count']))
+            rows += 1
+    for obj in referrers:
+        cur.execute("SELECT COUNT(*) FROM repo_referrals WHERE Repo_Name='%s' AND Referral='%s'" % (repo, obj['referrer']))
+        if cur.fetchall()[0][0] == 0:
+            cur.execute("INSERT INTO repo_referrals(Repo_Name, Referral, Uniques, Total) VALUES('%s', '%s', %s, %s)" % (repo, obj['referrer'], obj['uniques'], obj['count']))
+        else:
+            cur.execute("UPDATE repo_referrals SET Uniques=%s, Total=%s WHERE Repo_Name='%s' AND Referral='%s'" % (obj['uniques'], obj['count'], repo, obj['referrer']))
+        rows += 1
+    return rows
+
+
+def batched_write(cur, repo, traffic, clones, referrers):
+    rows = db.write_traffic(cur, repo, traffic, 'views')
+    rows += db.write_traffic(cur, repo, clones, 'clones')
+    rows += db.write_referrals(cur, repo, referrers)
+    return rows
+
+
+def reset_tables(conn):
+    sql_path = os.path.join(os.path.dirname(db.__file__), 'create_table.sql')
+    with conn.cursor() as cur:
+        cur.execute(open(sql_path).read())
+    conn.commit()
+
+
+def run(conn, write, repos, autocommit):
+    reset_tables(conn)
+    conn.autocommit = autocommit
+    rows = 0
+    start = time.time()
+    with conn.cursor() as cur:
+        for response in synthetic_responses(repos):
+            rows += write(cur, *response)
+    if not autocommit:
+        conn.commit()
+    elapsed = time.time() - start
+    conn.autocommit = False
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('GTS_BENCH_DSN', 'host=127.0.0.1 dbname=test'),
+                        help='libpq connection string of a scratch database')
+    parser.add_argument('--repos', default=500, type=int, help='Number of synthetic repositories')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        for label, write, autocommit in (('per-row (before)', legacy_write, True),
+                                         ('batched (after)', batched_write, False)):
+            rows, elapsed = run(conn, write, args.repos, autocommit)
+            print('%-18s %8d rows  %7.2fs  %10.0f rows/sec' % (label, rows, elapsed, rows / elapsed))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
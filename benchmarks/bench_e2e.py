@@ -0,0 +1,139 @@
+""" End to end throughput of gts against the local mock GitHub API of the tests,
+for each output: printing, CSV, SQLite and (with --db-host) Postgres.
+
+    $ python benchmarks/bench_e2e.py --repos 1000 --latency 0.02 --workers 8
+
+main() is driven with the same arguments as the command line, the mock
+serves the paginated listing (Link headers), the three traffic endpoints
+and X-RateLimit-* headers, delaying every response by --latency seconds.
+Results can be saved with --json and compared against a saved run with
+--compare, which exits with an error when a sink got slower than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'tests'))
+
+from gts import main as gts_main
+from mock_github import MockGitHub
+
+sinks = ('print', 'csv', 'sqlite', 'db')
+
+
+def sink_arguments(sink, directory, args):
+    """ Command line selecting the output of a sink, printing only for 'print' """
+    if sink == 'print':
+        return ['no_csv', '-print', 'True', '-f', args.format]
+    if sink == 'csv':
+        return ['save_csv', '-print', 'False']
+    if sink == 'sqlite':
+        return ['set_sqlite', '-print', 'False', '--sqlite-path', os.path.join(directory, 'history.sqlite3')]
+    return ['set_db', '-print', 'False', '-hp', args.db_host, '-usr', args.db_user, '-name', args.db_name]
+
+
+def run_sink(sink, args):
+    """ Run main() once for a sink
+    :return: dict - wall time, throughput and the --stats-json figures of the run
+    """
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    stats_path = os.path.join(directory, 'stats.json')
+    argv = (['user:token', 'ALL'] + sink_arguments(sink, directory, args) +
+            ['-o', 'bench', '-w', str(args.workers), '--no-cache', '--stats-json', stats_path])
+    try:
+        # The CSVs are written to the working directory
+        os.chdir(directory)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.time()
+            gts_main.main(argv)
+            elapsed = time.time() - start
+        with open(stats_path) as f:
+            stats = json.load(f)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    request = stats['stages'].get('request', {})
+    output = stats['stages'].get('render' if sink == 'print' else 'store', {})
+    requests = sum(r['count'] for r in stats['requests'])
+    return {'sink': sink,
+            'repos': args.repos,
+            'seconds': elapsed,
+            'repos_per_sec': args.repos / elapsed,
+            'requests_per_sec': requests / elapsed,
+            'request_p50_ms': request.get('p50', 0) * 1000,
+            'request_p95_ms': request.get('p95', 0) * 1000,
+            'output_mean_ms': output.get('mean', 0) * 1000,
+            'rows': stats['counters'].get('rows_written', 0)}
+
+
+def compare(results, baseline_path, tolerance):
+    """ Sinks whose throughput dropped by more than tolerance against a saved run """
+    with open(baseline_path) as f:
+        baseline = dict((r['sink'], r) for r in json.load(f))
+    slower = []
+    for result in results:
+        before = baseline.get(result['sink'])
+        if before and result['repos_per_sec'] < before['repos_per_sec'] * (1 - tolerance):
+            slower.append('%s: %.1f repos/sec, was %.1f' % (result['sink'], result['repos_per_sec'], before['repos_per_sec']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repos', default=500, type=int, help='Number of repositories served by the mock [500]')
+    parser.add_argument('--latency', default=0.02, type=float, help='Seconds each mock response is delayed by [0.02]')
+    parser.add_argument('--workers', default=8, type=int, help='Value of gts -w [8]')
+    parser.add_argument('--rate-limit', default=None, type=int, help='Request budget reported by the mock [unlimited]')
+    parser.add_argument('--sinks', default='print,csv,sqlite', help='Comma separated subset of %s [print,csv,sqlite]' % ','.join(sinks))
+    parser.add_argument('-f', '--format', default='table', help='Printed output of the print sink [table]')
+    parser.add_argument('--db-host', default=None, help='Postgres host:port, required by the db sink')
+    parser.add_argument('--db-user', default='root:""', help='Postgres user:password')
+    parser.add_argument('--db-name', default='test', help='Postgres database')
+    parser.add_argument('--json', default=None, help='Save the results as JSON')
+    parser.add_argument('--compare', default=None, help='Results saved with --json to compare against')
+    parser.add_argument('--tolerance', default=0.2, type=float, help='Allowed throughput drop with --compare [0.2]')
+    args = parser.parse_args()
+
+    selected = [sink.strip() for sink in args.sinks.split(',') if sink.strip()]
+    for sink in selected:
+        if sink not in sinks:
+            parser.error('unknown sink %r' % sink)
+    if 'db' in selected and not args.db_host:
+        parser.error('the db sink needs --db-host')
+
+    repos = ['repo-%05d' % i for i in range(args.repos)]
+    results = []
+    with MockGitHub(repos, rate_limit=args.rate_limit, latency=args.latency) as mock:
+        api_url = gts_main.api_url
+        gts_main.api_url = mock.url
+        try:
+            print('%-7s %6s %8s %10s %12s %9s %9s %10s %8s' % ('sink', 'repos', 'seconds', 'repos/sec', 'requests/sec',
+                                                               'p50 ms', 'p95 ms', 'output ms', 'rows'))
+            for sink in selected:
+                r = run_sink(sink, args)
+                results.append(r)
+                print('%-7s %6d %8.2f %10.1f %12.1f %9.2f %9.2f %10.3f %8d' % (
+                    r['sink'], r['repos'], r['seconds'], r['repos_per_sec'], r['requests_per_sec'],
+                    r['request_p50_ms'], r['request_p95_ms'], r['output_mean_ms'], r['rows']))
+        finally:
+            gts_main.api_url = api_url
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        slower = compare(results, args.compare, args.tolerance)
+        if slower:
+            sys.exit('Slower than %s:\n%s' % (args.compare, '\n'.join(slower)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,25 @@
-from .main import send_request, store_csv
+""" GitHub traffic stats: the gts command line and a small library API (see gts.api).
+Names are imported on first use, so importing gts is cheap and has no side effects.
+"""
+import importlib
+
+__all__ = ['TrafficClient', 'RepoTraffic', 'ApiError', 'send_request', 'store_csv']
+
+_exports = {'TrafficClient': 'api',
+            'RepoTraffic': 'api',
+            'ApiError': 'client',
+            'send_request': 'main',
+            'store_csv': 'main'}
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,67 @@
+""" Accounts file listing several owners to fetch in one run, each with its own token
+
+The file is JSON, either a list of accounts or {"accounts": [...]}:
+
+    {"accounts": [
+        {"username": "nchah", "token_env": "GTS_TOKEN_NCHAH"},
+        {"username": "nickdiorio", "token": "...", "organization": "NREL", "repo": "SAM"}
+    ]}
+
+"token" holds the password or access token, "token_env" names an environment
+variable holding it. "organization" defaults to the username and "repo" to
+the repo argument of the command line.
+"""
+import json
+import os
+
+
+class Account(object):
+    """ One owner to fetch and the credentials to fetch it with
+    :param username: string - GitHub username
+    :param password: string - password or access token
+    :param organization: string - the repository organization or owner
+    :param repo: string - GitHub user's repo name or 'ALL' repos
+    """
+
+    def __init__(self, username, password, organization=None, repo='ALL'):
+        self.username = username
+        self.password = password
+        self.organization = organization or username
+        self.repo = repo
+
+    @property
+    def auth(self):
+        return (self.username, self.password)
+
+    def __repr__(self):
+        return 'Account(%r, organization=%r, repo=%r)' % (self.username, self.organization, self.repo)
+
+
+def load_accounts(path, repo='ALL'):
+    """ Read an accounts file
+    :param path: string - path of the JSON accounts file
+    :param repo: string - repo of the accounts that do not name one
+    :return: list - Account objects
+    :raise ValueError: if the file is malformed or a token is missing
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get('accounts') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('%s: expected a non-empty list of accounts' % path)
+    accounts = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get('username'):
+            raise ValueError('%s: account %d has no username' % (path, i + 1))
+        password = entry.get('token')
+        if password is None and entry.get('token_env'):
+            password = os.environ.get(entry['token_env'])
+            if password is None:
+                raise ValueError('%s: environment variable %s of account %d is not set'
+                                 % (path, entry['token_env'], i + 1))
+        if password is None:
+            raise ValueError('%s: account %d has no token or token_env' % (path, i + 1))
+        accounts.append(Account(entry['username'].strip(), password.strip(),
+                                (entry.get('organization') or '').strip() or None,
+                                (entry.get('repo') or '').strip() or repo))
+    return accounts
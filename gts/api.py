@@ -0,0 +1,86 @@
+""" Programmatic access to the traffic stats, for embedding collection in other programs
+
+    from gts import TrafficClient
+
+    with TrafficClient('nchah', token, workers=8) as client:
+        for info in client.iter_repos(skip_forks=True):
+            print(info['name'], info['pushed_at'])
+        for traffic in client.fetch_traffic(include=['gts-*']):
+            print(traffic.repo, traffic.views['count'], traffic.clones['count'])
+
+Responses are the JSON documents of the GitHub API. They can be saved with
+the same storage backends as the command line (gts.csv_store.CsvStore,
+gts.sqlite_store.SqliteStore, gts.db.PostgresStore), through their write().
+"""
+from collections import namedtuple
+
+from . import main as gts_main
+from .cache import HttpCache
+from .client import Client
+from .filters import RepoFilter
+from .ratelimit import RateLimiter
+
+RepoTraffic = namedtuple('RepoTraffic', ['repo', 'views', 'clones', 'referrers', 'errors'])
+RepoTraffic.__doc__ = """ Stats of one repository: views, clones and referrers JSON responses,
+None where the request failed, and errors mapping those fields to the API message """
+
+
+class TrafficClient(object):
+    """ Lists repositories and fetches their traffic stats, without the command line
+    :param username: string - GitHub username
+    :param token: string - password or access token
+    :param organization: string - the repository organization or owner, defaults to username
+    :param workers: int - number of repositories fetched concurrently
+    :param max_retries: int - retries of rate limited or failed requests
+    :param cache_dir: string - if specified, directory of the HTTP response cache
+    :param use_graphql: bool - list repositories through the GraphQL API
+    :param stats: Stats - if specified, where requests are counted and timed
+    """
+
+    def __init__(self, username, token, organization=None, workers=1, max_retries=5,
+                 cache_dir=None, use_graphql=False, stats=None):
+        self.auth = (username, token)
+        self.organization = organization or username
+        self.workers = workers
+        self.use_graphql = use_graphql
+        self.client = Client(self.auth, pool_size=max(10, workers * 3), limiter=RateLimiter(max_retries=max_retries),
+                             cache=HttpCache(cache_dir) if cache_dir else None, stats=stats)
+
+    def iter_repos(self, include=None, exclude=None, skip_archived=False, skip_forks=False):
+        """ Iterate over the repositories of the owner, pages are fetched as the iteration goes
+        :param include: list - glob patterns, if specified only matching names are listed
+        :param exclude: list - glob patterns of names left out
+        :param skip_archived: bool - leave out archived repositories
+        :param skip_forks: bool - leave out forks
+        :return: generator - dicts with name, archived, fork, visibility and pushed_at
+        :raise ApiError: if the owner cannot be listed
+        """
+        repo_filter = RepoFilter(include, exclude, skip_archived, skip_forks)
+        for info in gts_main.iter_repo_info(self.organization, self.auth, self.client, self.use_graphql):
+            if repo_filter.accept(info):
+                yield info
+
+    def fetch_traffic(self, repos=None, **filters):
+        """ Fetch the stats of repositories, in order, `workers` at a time
+        :param repos: iterable - repository names, by default every repository of iter_repos(**filters)
+        :return: generator - RepoTraffic tuples
+        """
+        if repos is None:
+            repos = (info['name'] for info in self.iter_repos(**filters))
+        for result in gts_main.fetch_repos(self.organization, self.auth, repos, self.workers, self.client):
+            responses = list(result[1:])
+            errors = {}
+            for i, response in enumerate(responses):
+                if isinstance(response, dict) and response.get('message'):
+                    errors[RepoTraffic._fields[i + 1]] = response['message']
+                    responses[i] = None
+            yield RepoTraffic(result[0], responses[0], responses[1], responses[2], errors)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,150 @@
+""" On-disk HTTP cache used to send conditional requests to the GitHub API """
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+default_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'github-traffic-stats')
+
+# Response headers kept with a cached body, Link keeps pagination working on a 304
+cached_headers = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+
+class HttpCache(object):
+    """ Stores the body and validators (ETag/Last-Modified) of GET responses, one JSON
+    file per URL and auth identity, so the next request can be sent with If-None-Match.
+    GitHub does not count 304 Not Modified answers against the rate limit.
+    :param directory: str - where the cache entries are stored
+    :param max_entries: int - entries kept before the least recently used are evicted
+    :param max_age: int - seconds after which an entry is discarded
+    """
+
+    def __init__(self, directory=default_cache_dir, max_entries=20000, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(directory):
+            self.evict()
+        else:
+            os.makedirs(directory)
+
+    def key(self, url, params=None, auth=None):
+        """ Cache key of a request, the credentials are only ever stored hashed
+        :param url: str - the full URL
+        :param params: dict - the query parameters
+        :param auth: tuple - (username, password) pair identifying the caller
+        :return: str - hex digest
+        """
+        identity = json.dumps([url, sorted((params or {}).items()), list(auth or [])])
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """ Return the cached entry for a key, or None if missing or expired """
+        entry_path = self.path(key)
+        try:
+            # The modification time is refreshed each time the entry is revalidated
+            if time.time() - os.path.getmtime(entry_path) > self.max_age:
+                self.remove(entry_path)
+                return None
+            with open(entry_path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def conditional_headers(self, entry):
+        """ Validator headers for a request revalidating a cached entry """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key, response):
+        """ Store a 200 response if it carries a validator """
+        with self.lock:
+            self.misses += 1
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        entry = {'url': response.url,
+                 'etag': etag,
+                 'last_modified': last_modified,
+                 'stored_at': time.time(),
+                 'headers': dict((h, response.headers[h]) for h in cached_headers if h in response.headers),
+                 'body': response.text}
+        entry_path = self.path(key)
+        tmp_path = '%s.%d.%d.tmp' % (entry_path, os.getpid(), threading.current_thread().ident)
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+        with self.lock:
+            self.puts += 1
+            evict = self.puts % 500 == 0
+        if evict:
+            self.evict()
+
+    def revalidated(self, key, entry, not_modified):
+        """ Build a 200 response from a cached entry after a 304
+        :param key: str - the cache key
+        :param entry: dict - the cached entry
+        :param not_modified: response - the 304 response, its headers take precedence
+        :return: response - a requests response with the cached body
+        """
+        with self.lock:
+            self.hits += 1
+        # Refresh the modification time so age and eviction count from the last revalidation
+        try:
+            os.utime(self.path(key), None)
+        except OSError:
+            pass
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers.update(not_modified.headers)
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.request = not_modified.request
+        response.from_cache = True
+        return response
+
+    def remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """ Drop expired entries and the least recently used ones above max_entries """
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            entry_path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(entry_path)
+            except OSError:
+                continue
+            if now - mtime > self.max_age:
+                self.remove(entry_path)
+            else:
+                entries.append((mtime, entry_path))
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, entry_path in entries[:len(entries) - self.max_entries]:
+                self.remove(entry_path)
@@ -0,0 +1,128 @@
+""" Persistent HTTP client shared by every call to the GitHub API """
+import threading
+import time
+
+from .ratelimit import RateLimiter
+from .stats import NullStats
+
+
+class ApiError(Exception):
+    """ Raised when the GitHub API answers with an error payload such as
+    {'documentation_url': 'https://developer.github.com/v3', 'message': 'Not Found'}
+    """
+    pass
+
+
+default_headers = {
+    'Accept': 'application/vnd.github.v3+json',
+    'Accept-Encoding': 'gzip, deflate',
+    'User-Agent': 'github-traffic-stats',
+}
+
+
+class Client(object):
+    """ Wraps a single keep-alive requests.Session so connections (and their
+    TLS handshakes) are reused across the thousands of calls made in one run.
+    :param auth: tuple - (username, password) pair sent with every request
+    :param pool_size: int - number of pooled connections kept per host
+    :param headers: dict - extra headers sent with every request
+    :param limiter: RateLimiter - if specified, the scheduler pacing and retrying requests
+    :param cache: HttpCache - if specified, GET responses are cached and revalidated with ETags
+    :param stats: Stats - if specified, where requests are counted and timed
+    """
+
+    def __init__(self, auth=None, pool_size=10, headers=None, limiter=None, cache=None, stats=None):
+        # Imported here so that importing gts stays cheap until a client is needed
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.retried_errors = (requests.ConnectionError, requests.Timeout)
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.stats = stats or NullStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(default_headers)
+        if headers:
+            self.session.headers.update(headers)
+        if auth:
+            self.session.auth = auth
+
+    def get(self, url, params=None, auth=None):
+        """ Send a GET request through the pooled session
+        :param url: string - the full URL
+        :param params: dict - if specified, the query parameters
+        :param auth: tuple - if specified, overrides the session auth
+        :return: response - the requests response
+        """
+        if self.cache is None:
+            return self.request('GET', url, params=params, auth=auth)
+
+        key = self.cache.key(url, params, auth or self.session.auth)
+        entry = self.cache.get(key)
+        headers = self.cache.conditional_headers(entry) if entry else None
+        response = self.request('GET', url, params=params, auth=auth, headers=headers)
+        if response.status_code == 304 and entry:
+            return self.cache.revalidated(key, entry, response)
+        self.cache.put(key, response)
+        return response
+
+    def post(self, url, json=None, auth=None):
+        """ Send a POST request with a JSON body, used by the GraphQL API """
+        return self.request('POST', url, json=json, auth=auth)
+
+    def request(self, method, url, **kwargs):
+        """ Send a request, waiting for rate limit budget and retrying
+        429, 5xx, secondary rate limit and connection errors with backoff
+        :param method: string - the HTTP method
+        :param url: string - the full URL
+        :return: response - the requests response
+        """
+        attempt = 0
+        while True:
+            self.limiter.before_request()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except self.retried_errors:
+                self.stats.record_request(method, url, None, 0, time.perf_counter() - start)
+                response = None
+                delay = self.limiter.retry_delay(None, attempt)
+                if delay is None:
+                    raise
+            else:
+                if self.stats.enabled:
+                    nbytes = int(response.headers.get('Content-Length') or len(response.content))
+                    self.stats.record_request(method, url, response.status_code, nbytes, time.perf_counter() - start)
+                self.limiter.update(response)
+                delay = self.limiter.retry_delay(response, attempt)
+                if delay is None:
+                    return response
+            self.limiter.record_retry()
+            self.stats.count('retries')
+            self.limiter.wait(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """ Return the process-wide client used when no client is passed explicitly """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = Client()
+        return _default_client
@@ -0,0 +1,293 @@
+""" Roll old daily traffic rows up into weekly and monthly totals, and merge CSV snapshots
+
+GitHub only serves the last 14 days, so every snapshot is archived and the
+daily history grows without bound. Under a retention policy the most recent
+--keep-daily days stay at full resolution, older days are summed per week
+until they are --keep-weekly days old, and per month after that. Weeks are
+cut at month boundaries so they roll into months exactly. Unique visitors
+of a period are the sum of the daily uniques, as GitHub does not give
+distinct counts over longer windows.
+
+Only whole periods are rolled up, so a period is rolled up once, from all of
+its days. In a database the compaction is one transaction. CSV snapshots of
+a kind are merged into the newest one (see gts.merge) and the rolled up
+periods go to a *-rollup.csv next to them; days of a period already in the
+rollup are dropped, so an interrupted compaction can simply be run again.
+"""
+import argparse
+import csv
+import datetime
+import os
+
+from . import merge
+from .csv_store import clones_headers, referrers_headers, views_headers
+
+# Daily CSVs: (kind in the file names, header, metric)
+csv_kinds = (('traffic', views_headers, 'views'), ('clone', clones_headers, 'clones'))
+
+rollup_headers = ['repository_name', 'period', 'start', 'count', 'uniques']
+
+
+def parse_date(date):
+    return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+
+def period_start(date, period):
+    """ First day of the week or month holding a date, weeks start on Monday or on the 1st
+    :param date: str - YYYY-MM-DD
+    :param period: str - 'week' or 'month'
+    :return: str - YYYY-MM-DD
+    """
+    day = parse_date(date)
+    first = day.replace(day=1)
+    if period == 'month':
+        return first.isoformat()
+    return max(day - datetime.timedelta(days=day.weekday()), first).isoformat()
+
+
+class Retention(object):
+    """ Retention policy, days before the cutoffs are rolled up
+    :param keep_daily: int - days kept at daily resolution, at least the 14 days served by GitHub
+    :param keep_weekly: int - days kept at weekly resolution, monthly before that
+    :param today: str - YYYY-MM-DD the ages are counted from, today by default
+    """
+
+    def __init__(self, keep_daily=90, keep_weekly=365, today=None):
+        if keep_daily < 14:
+            # Days still served by GitHub would be fetched again into rolled up periods
+            raise ValueError('--keep-daily must be at least 14 days')
+        if keep_weekly < keep_daily:
+            raise ValueError('--keep-weekly must be at least --keep-daily')
+        today = parse_date(today) if today else datetime.date.today()
+        # Aligned on period starts, so that only whole periods are rolled up
+        self.daily_cutoff = period_start((today - datetime.timedelta(days=keep_daily)).isoformat(), 'week')
+        self.weekly_cutoff = period_start((today - datetime.timedelta(days=keep_weekly)).isoformat(), 'month')
+
+    def bucket(self, date):
+        """ (period, start) a day is rolled into, None if it is kept """
+        if date >= self.daily_cutoff:
+            return None
+        period = 'week' if date >= self.weekly_cutoff else 'month'
+        return period, period_start(date, period)
+
+
+def read_rollup(file_path):
+    """ Rows of a rollup CSV, {(repo, period, start): [count, uniques]} """
+    rollup = {}
+    if os.path.exists(file_path):
+        with open(file_path, newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for repo, period, start, count, uniques in reader:
+                rollup[repo, period, start] = [int(count), int(uniques)]
+    return rollup
+
+
+def write_csv(file_path, header, rows):
+    """ Write a CSV, returning the number of rows """
+    count = 0
+    with open(file_path, 'w', newline='', buffering=1 << 16) as f:
+        writer = csv.writer(f, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def compact_csv(directory, retention, chunk_size=1000000):
+    """ Merge the snapshots of each kind in a directory and roll up their old days
+    :param directory: str - folder of the CSVs written by "save_csv"
+    :param retention: Retention - the retention policy
+    :param chunk_size: int - rows sorted in memory at a time, see gts.merge
+    :return: list - a dict per kind: kind, files merged, output, rows kept, rows rolled up, rollup rows
+    """
+    results = []
+    for kind, header, metric in csv_kinds + (('referrer', referrers_headers, None),):
+        files = [f for f in merge.snapshot_files([directory]) if merge.read_header(f) == header]
+        if not files:
+            continue
+        output = files[-1]
+        rollup_path = os.path.join(directory, kind + '-rollup.csv')
+        rollup = read_rollup(rollup_path) if metric else {}
+        rolled = {}
+
+        # Weeks past the weekly window become months
+        for key in [key for key in rollup if key[1] == 'week' and key[2] < retention.weekly_cutoff]:
+            count, uniques = rollup.pop(key)
+            total = rolled.setdefault((key[0], 'month', period_start(key[2], 'month')), [0, 0])
+            total[0] += count
+            total[1] += uniques
+
+        result = {'kind': kind, 'files': len(files), 'output': output, 'rolled': 0}
+
+        def kept_rows(rows):
+            for row in rows:
+                bucket = retention.bucket(row[1]) if metric else None
+                if bucket is None:
+                    yield row
+                    continue
+                total = rolled.setdefault((row[0],) + bucket, [0, 0])
+                total[0] += int(row[2])
+                total[1] += int(row[3])
+                result['rolled'] += 1
+
+        header, rows = merge.iter_merged(files, chunk_size)
+        result['rows'] = write_csv(output + '.tmp', header, kept_rows(rows))
+        if metric:
+            for key, total in rolled.items():
+                # Already rolled up by an earlier, interrupted compaction
+                if key not in rollup:
+                    rollup[key] = total
+            result['rollup'] = write_csv(rollup_path + '.tmp', rollup_headers,
+                                         (list(key) + total for key, total in sorted(rollup.items())))
+            # The rollup is replaced before the days it holds are removed from the snapshots
+            os.replace(rollup_path + '.tmp', rollup_path)
+        os.replace(output + '.tmp', output)
+        for file_path in files[:-1]:
+            os.remove(file_path)
+        results.append(result)
+    return results
+
+
+# Weeks past the weekly window become months, then old days become weeks or months
+sqlite_statements = (
+    """INSERT INTO traffic_rollup(repo, metric, period, start, count, uniques)
+       SELECT repo, metric, 'month', date(start, 'start of month'), SUM(count), SUM(uniques)
+       FROM traffic_rollup WHERE period = 'week' AND start < :weekly
+       GROUP BY repo, metric, date(start, 'start of month')
+       ON CONFLICT (repo, metric, period, start)
+       DO UPDATE SET count = count + excluded.count, uniques = uniques + excluded.uniques""",
+    "DELETE FROM traffic_rollup WHERE period = 'week' AND start < :weekly",
+    """INSERT INTO traffic_rollup(repo, metric, period, start, count, uniques)
+       SELECT repo, metric, period, start, SUM(count), SUM(uniques) FROM (
+           SELECT repo, metric, count, uniques,
+                  CASE WHEN date < :weekly THEN 'month' ELSE 'week' END AS period,
+                  CASE WHEN date < :weekly THEN date(date, 'start of month')
+                       ELSE max(date(date, '-6 days', 'weekday 1'), date(date, 'start of month')) END AS start
+           FROM traffic_daily WHERE date < :daily)
+       WHERE true GROUP BY repo, metric, period, start
+       ON CONFLICT (repo, metric, period, start)
+       DO UPDATE SET count = count + excluded.count, uniques = uniques + excluded.uniques""",
+)
+
+
+def compact_sqlite(path, retention, vacuum=False):
+    """ Roll up the old days of a SQLite history written with "set_sqlite"
+    :param path: str - path of the SQLite database
+    :param retention: Retention - the retention policy
+    :param vacuum: bool - give the freed pages back to the file system
+    :return: dict - rows rolled up and rollup rows
+    """
+    from .sqlite_store import SqliteStore
+
+    cutoffs = {'daily': retention.daily_cutoff, 'weekly': retention.weekly_cutoff}
+    store = SqliteStore(path)
+    try:
+        with store.lock:
+            conn = store.conn
+            for sql in sqlite_statements:
+                conn.execute(sql, cutoffs)
+            rolled = conn.execute('DELETE FROM traffic_daily WHERE date < :daily', cutoffs).rowcount
+            conn.commit()
+            if vacuum:
+                conn.execute('VACUUM')
+            rollup = conn.execute('SELECT COUNT(*) FROM traffic_rollup').fetchone()[0]
+    finally:
+        store.close()
+    return {'rolled': rolled, 'rollup': rollup}
+
+
+pg_rollup_months = (
+    "INSERT INTO repo_traffic_rollup(Repo_Name, Result_Type, Period, Period_Start, Uniques, Total) "
+    "SELECT Repo_Name, Result_Type, 'month', DATE_TRUNC('month', Period_Start)::DATE, SUM(Uniques), SUM(Total) "
+    "FROM repo_traffic_rollup WHERE Period = 'week' AND Period_Start < %s "
+    "GROUP BY Repo_Name, Result_Type, DATE_TRUNC('month', Period_Start) "
+    "ON CONFLICT (Repo_Name, Result_Type, Period, Period_Start) "
+    "DO UPDATE SET Uniques = repo_traffic_rollup.Uniques + EXCLUDED.Uniques, "
+    "Total = repo_traffic_rollup.Total + EXCLUDED.Total")
+
+pg_delete_weeks = "DELETE FROM repo_traffic_rollup WHERE Period = 'week' AND Period_Start < %s"
+
+# Deletes the old days of a daily table and inserts their sums in one statement
+pg_rollup_days = (
+    "WITH rolled AS (DELETE FROM {table} WHERE create_timestamp < %s "
+    "RETURNING Repo_Name, create_timestamp, Uniques, Total) "
+    "INSERT INTO repo_traffic_rollup(Repo_Name, Result_Type, Period, Period_Start, Uniques, Total) "
+    "SELECT Repo_Name, %s, period, start, SUM(Uniques), SUM(Total) FROM ("
+    "SELECT Repo_Name, Uniques, Total, "
+    "CASE WHEN create_timestamp < %s THEN 'month' ELSE 'week' END AS period, "
+    "CASE WHEN create_timestamp < %s THEN DATE_TRUNC('month', create_timestamp) "
+    "ELSE GREATEST(DATE_TRUNC('week', create_timestamp), DATE_TRUNC('month', create_timestamp)) END::DATE AS start "
+    "FROM rolled) AS days GROUP BY Repo_Name, period, start "
+    "ON CONFLICT (Repo_Name, Result_Type, Period, Period_Start) "
+    "DO UPDATE SET Uniques = repo_traffic_rollup.Uniques + EXCLUDED.Uniques, "
+    "Total = repo_traffic_rollup.Total + EXCLUDED.Total")
+
+
+def compact_postgres(conn, retention):
+    """ Roll up the old days of repo_visitors and repo_clones into repo_traffic_rollup, in one transaction
+    :param conn: connection - a psycopg2 connection, see gts.db.connect
+    :param retention: Retention - the retention policy
+    :return: dict - rollup rows inserted or updated
+    """
+    from .db import daily_tables
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(pg_rollup_months, (retention.weekly_cutoff,))
+            cur.execute(pg_delete_weeks, (retention.weekly_cutoff,))
+            rollup = 0
+            for response_type, table in sorted(daily_tables.items()):
+                cur.execute(pg_rollup_days.format(table=table),
+                            (retention.daily_cutoff, response_type, retention.weekly_cutoff, retention.weekly_cutoff))
+                rollup += cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'rollup': rollup}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='gts compact', description='Roll old daily traffic up into weekly and monthly totals, and merge CSV snapshots')
+    parser.add_argument('paths', nargs='*', help='Directories of CSV snapshots written by "save_csv"')
+    parser.add_argument('--sqlite', default=None, help='Compact a SQLite history written with "set_sqlite"')
+    parser.add_argument('--postgres', action='store_true', help='Compact the Postgres tables written with "set_db"')
+    parser.add_argument('-hp', '--host', default='127.0.0.1:5432', help='Database host and port with --postgres [127.0.0.1:5432]')
+    parser.add_argument('-usr', '--db-user', default='root:""', help='Database user and password with --postgres [root:""]')
+    parser.add_argument('-name', '--db-name', default='test', help='Database name with --postgres [test]')
+    parser.add_argument('--keep-daily', default=90, type=int, help='Days kept at daily resolution, at least 14 [90]')
+    parser.add_argument('--keep-weekly', default=365, type=int, help='Days kept at weekly resolution, monthly before that [365]')
+    parser.add_argument('--today', default=None, help='Day the retention is counted from (YYYY-MM-DD) [today]')
+    parser.add_argument('--vacuum', action='store_true', help='Shrink the SQLite file after compacting')
+    parser.add_argument('--chunk-size', default=1000000, type=int, help='Rows sorted in memory at a time when merging CSVs [1000000]')
+    args = parser.parse_args(argv)
+    if not args.paths and not args.sqlite and not args.postgres:
+        parser.error('give CSV directories, --sqlite or --postgres')
+    for path in args.paths:
+        if not os.path.isdir(path):
+            parser.error('not a directory: %s' % path)
+    try:
+        retention = Retention(args.keep_daily, args.keep_weekly, args.today)
+    except ValueError as err:
+        parser.error(str(err))
+
+    print('Keeping days from %s, weeks from %s' % (retention.daily_cutoff, retention.weekly_cutoff))
+    for path in args.paths:
+        for result in compact_csv(path, retention, args.chunk_size):
+            print('Merged %d %s snapshots into %s, %d rows kept, %d rolled up'
+                  % (result['files'], result['kind'], result['output'], result['rows'], result['rolled']))
+    if args.sqlite:
+        result = compact_sqlite(args.sqlite, retention, args.vacuum)
+        print('Rolled up %d daily rows of %s, %d rollup rows' % (result['rolled'], args.sqlite, result['rollup']))
+    if args.postgres:
+        from . import db
+        from .main import parse_db_config
+        conn = db.connect(parse_db_config(args))
+        try:
+            result = compact_postgres(conn, retention)
+        finally:
+            conn.close()
+        print('Rolled up the daily tables into %d rollup rows' % result['rollup'])
+    return 'Code done.'
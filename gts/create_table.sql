@@ -1,23 +1,28 @@
+
 -- These tables are an alternative to the CSV files being created
+-- The primary keys are the conflict targets of the upserts in gts/db.py
 
 DROP TABLE IF EXISTS repo_overview;
 DROP TABLE IF EXISTS repo_visitors; 
 DROP TABLE IF EXISTS repo_clones;
 DROP TABLE IF EXISTS repo_referrals; 
+DROP TABLE IF EXISTS repo_traffic_rollup;
 
 CREATE TABLE repo_overview(
    create_timestamp DATE         NOT NULL DEFAULT DATE(NOW()), -- date of generated results
    Repo_Name        VARCHAR(255) NOT NULL DEFAULT '', 
    Result_Type      VARCHAR(255) NOT NULL DEFAULT '', 
    Uniques          INT          NOT NULL DEFAULT 0,
-   Total            INT          NOT NULL DEFAULT 0 
+   Total            INT          NOT NULL DEFAULT 0,
+   PRIMARY KEY (create_timestamp, Repo_Name, Result_Type)
 ); 
 
 CREATE TABLE repo_visitors( 
    Repo_Name        VARCHAR(255) NOT NULL DEFAULT '',
    create_timestamp DATE         NOT NULL DEFAULT DATE(NOW()), 
    Uniques          INT          NOT NULL DEFAULT 0, 
-   Total            INT          NOT NULL DEFAULT 0
+   Total            INT          NOT NULL DEFAULT 0,
+   PRIMARY KEY (Repo_Name, create_timestamp)
 ); 
 
 
@@ -25,13 +30,32 @@ CREATE table repo_clones(
    Repo_Name        VARCHAR(255) NOT NULL DEFAULT '', 
    create_timestamp DATE         NOT NULL DEFAULT DATE(NOW()), 
    Uniques          INT          NOT NULL DEFAULT 0, 
-   Total            INT          NOT NULL DEFAULT 0
+   Total            INT          NOT NULL DEFAULT 0,
+   PRIMARY KEY (Repo_Name, create_timestamp)
 ); 
 
 CREATE TABLE repo_referrals(
    Repo_Name        VARCHAR(255) NOT NULL DEFAULT '',
    Referral         VARCHAR(255) NOT NULL DEFAULT '',
    Uniques          INT          NOT NULL DEFAULT 0,
-   Total            INT          NOT NULL DEFAULT 0
+   Total            INT          NOT NULL DEFAULT 0,
+   PRIMARY KEY (Repo_Name, Referral)
 );  
 
+-- Weekly and monthly sums of the old days of repo_visitors/repo_clones, written by gts compact
+CREATE TABLE repo_traffic_rollup(
+   Repo_Name        VARCHAR(255) NOT NULL DEFAULT '',
+   Result_Type      VARCHAR(255) NOT NULL DEFAULT '',  -- 'views' or 'clones'
+   Period           VARCHAR(5)   NOT NULL DEFAULT '',  -- 'week' or 'month'
+   Period_Start     DATE         NOT NULL,             -- first day of the period
+   Uniques          INT          NOT NULL DEFAULT 0,
+   Total            INT          NOT NULL DEFAULT 0,
+   PRIMARY KEY (Repo_Name, Result_Type, Period, Period_Start)
+);
+
+-- Upgrading tables created by an earlier version (remove any duplicate rows first):
+-- ALTER TABLE repo_overview  ADD PRIMARY KEY (create_timestamp, Repo_Name, Result_Type);
+-- ALTER TABLE repo_visitors  ADD PRIMARY KEY (Repo_Name, create_timestamp);
+-- ALTER TABLE repo_clones    ADD PRIMARY KEY (Repo_Name, create_timestamp);
+-- ALTER TABLE repo_referrals ADD PRIMARY KEY (Repo_Name, Referral);
+-- Before running gts compact on them, also create repo_traffic_rollup as above.
@@ -0,0 +1,122 @@
+""" Buffered CSV output of traffic stats """
+import csv
+import os
+import threading
+
+from .record import Referrers, Series
+
+
+views_headers = ['repository_name', 'date', 'views', 'unique_visitors/cloners']
+clones_headers = ['repository_name', 'date', 'clones', 'unique_visitors/cloners']
+referrers_headers = ['repository_name', 'site', 'views', 'unique_visitors/cloners']
+
+
+def series_rows(repo, series):
+    """ CSV rows of a views or clones series: repo_name, date, views/clones, unique_visitors/cloners
+    :param repo: str - the GitHub repository name
+    :param series: Series - the parsed views or clones
+    :return: list - rows
+    """
+    return [[repo, date, count, uniques] for date, count, uniques in series.rows()]
+
+
+def site_rows(repo, referrers):
+    """ CSV rows of the referring sites: repo_name, site, views, unique_visitors
+    :param repo: str - the GitHub repository name
+    :param referrers: Referrers - the parsed referrers
+    :return: list - rows
+    """
+    return [[repo, site, count, uniques] for site, count, uniques in referrers.rows()]
+
+
+def traffic_rows(repo, json_response, response_type):
+    """ CSV rows of a views or clones response, see series_rows() """
+    return series_rows(repo, Series.from_json(json_response, response_type))
+
+
+def referrer_rows(repo, json_response):
+    """ CSV rows of a referrers response, see site_rows() """
+    return site_rows(repo, Referrers.from_json(json_response))
+
+
+class CsvFile(object):
+    """ A CSV file opened once in append mode, the header is only written to a new file
+    :param file_path: str - path to store CSV
+    :param headers: list - the header row
+    """
+
+    def __init__(self, file_path, headers):
+        is_new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self.file = open(file_path, 'a', newline='', buffering=1 << 16)
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if is_new:
+            self.writer.writerow(headers)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def append_rows(file_path, headers, rows):
+    """ Append rows to a CSV, writing the header first if the file is new """
+    csv_file = CsvFile(file_path, headers)
+    try:
+        csv_file.write(rows)
+    finally:
+        csv_file.close()
+
+
+class CsvStore(object):
+    """ Storage backend writing the views, clones and referrers CSVs of a run.
+    Each file is opened once and rows are streamed through one buffered writer.
+    :param file_path: str - path of the views CSV
+    :param file_path_clones: str - path of the clones CSV
+    :param file_path_referrers: str - path of the referrers CSV
+    """
+
+    def __init__(self, file_path, file_path_clones, file_path_referrers):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.views = CsvFile(file_path, views_headers)
+        self.clones = CsvFile(file_path_clones, clones_headers)
+        self.referrers = CsvFile(file_path_referrers, referrers_headers)
+
+    def write(self, stats):
+        """ Append the stats of one repository
+        :param stats: RepoStats - the parsed stats, parts not fetched in this run are None (see --resume)
+        """
+        repo = stats.repo
+        views = series_rows(repo, stats.views) if stats.views is not None else []
+        clones = series_rows(repo, stats.clones) if stats.clones is not None else []
+        referrers = site_rows(repo, stats.referrers) if stats.referrers is not None else []
+        with self.lock:
+            self.views.write(views)
+            self.clones.write(clones)
+            self.referrers.write(referrers)
+            self.rows += len(views) + len(clones) + len(referrers)
+
+    def commit(self):
+        """ Flush the buffered rows to disk, for long running processes """
+        with self.lock:
+            for csv_file in (self.views, self.clones, self.referrers):
+                csv_file.flush()
+
+    def rollback(self):
+        """ Nothing to undo, rows already written are kept """
+        pass
+
+    def close(self, commit=True):
+        """ Flush and close the files, rows already written are kept either way """
+        for csv_file in (self.views, self.clones, self.referrers):
+            csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
@@ -0,0 +1,282 @@
+""" Long running polling mode, started with gts serve
+
+One process keeps the HTTP session, the response cache and the storage
+backend open between polls. The repository listing is refreshed on its own
+interval, and the per-repository fetches are spread evenly over the polling
+interval through a priority queue of due times, so the API sees a steady
+trickle of requests instead of a burst at the top of every hour.
+Counters are served in the Prometheus text format on a local HTTP endpoint.
+"""
+import heapq
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import main as gts_main
+from . import render
+from .filters import RepoFilter
+
+
+class Scheduler(object):
+    """ Priority queue of repositories ordered by the time their next fetch is due
+    :param interval: float - seconds between two fetches of the same repository
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.heap = []
+        self.repos = set()
+
+    def __len__(self):
+        return len(self.repos)
+
+    def update(self, repos, now):
+        """ Follow a new listing: unlisted repositories are dropped, new ones are
+        spread evenly over the next interval and the others keep their due time
+        :param repos: list - repository names
+        :param now: float - current epoch time
+        """
+        listed = set(repos)
+        new = [repo for repo in repos if repo not in self.repos]
+        if self.repos - listed:
+            self.heap = [entry for entry in self.heap if entry[1] in listed]
+            heapq.heapify(self.heap)
+        self.repos = listed
+        step = self.interval / max(1, len(new))
+        for i, repo in enumerate(new):
+            heapq.heappush(self.heap, (now + i * step, repo))
+
+    def next_due(self):
+        """ Due time of the next fetch, None if nothing is scheduled """
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self, now):
+        """ Take the next repository if it is due, and schedule its following fetch
+        :return: string - the repository name, None if nothing is due yet
+        """
+        due = self.next_due()
+        if due is None or due > now:
+            return None
+        due, repo = heapq.heappop(self.heap)
+        # Keep the slot of the repository, a slow fetch does not shift the schedule
+        heapq.heappush(self.heap, (max(due + self.interval, now), repo))
+        return repo
+
+
+class Daemon(object):
+    """ Polls the traffic of the repositories of one owner until stopped
+    :param client: Client - the pooled HTTP client, kept for the lifetime of the daemon
+    :param organization: string - the repository organization or owner
+    :param auth: tuple - (username, password) pair
+    :param repo: string - GitHub user's repo name or 'ALL' repos
+    :param store: store - if specified, the storage backend, committed after every fetch
+    :param renderer: Renderer - if specified, where the stats are printed
+    :param repo_filter: RepoFilter - selects the repositories among 'ALL'
+    :param state: State - if specified, saved every save_every fetches, on relisting and on shutdown
+    :param interval: float - seconds between two fetches of the same repository
+    :param relist_interval: float - seconds between two listings of the repositories
+    :param use_graphql: bool - list repositories through the GraphQL API
+    :param clock: function - returns the current epoch time, for testing
+    :param save_every: int - fetches between two saves of the state file
+    """
+
+    def __init__(self, client, organization, auth, repo='ALL', store=None, renderer=None, repo_filter=None,
+                 state=None, interval=3600, relist_interval=6 * 3600, use_graphql=False, clock=time.time,
+                 save_every=100):
+        self.client = client
+        self.organization = organization
+        self.auth = auth
+        self.repo = repo
+        self.store = store
+        self.renderer = renderer
+        self.repo_filter = repo_filter or RepoFilter()
+        self.state = state
+        self.relist_interval = relist_interval
+        self.use_graphql = use_graphql
+        self.clock = clock
+        self.save_every = save_every
+        self.unsaved = 0
+        self.scheduler = Scheduler(interval)
+        self.stopped = threading.Event()
+        self.started = clock()
+        self.next_listing = self.started
+        self.listings = 0
+        self.listing_errors = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def save_state(self):
+        """ Write the state file if fetches completed since it was last written """
+        if self.state is not None and self.unsaved:
+            self.state.save()
+        self.unsaved = 0
+
+    def relist(self, now):
+        """ Refresh the repositories to poll """
+        self.next_listing = now + self.relist_interval
+        self.save_state()
+        if self.repo != 'ALL':
+            self.scheduler.update([self.repo], now)
+            return
+        try:
+            repos = gts_main.iter_repo_info(self.organization, self.auth, self.client, self.use_graphql)
+            names = list(self.repo_filter.select(repos))
+        except Exception as err:
+            self.listing_errors += 1
+            sys.stderr.write('Listing repositories failed: %s\n' % err)
+            if not len(self.scheduler):
+                # Nothing to poll yet, do not wait a full relist interval
+                self.next_listing = now + min(60, self.relist_interval)
+            return
+        self.listings += 1
+        self.scheduler.update(names, now)
+
+    def fetch(self, repo):
+        """ Fetch, print and save the stats of one repository, errors are reported and the polling goes on """
+        try:
+            result = (repo,) + gts_main.fetch_repo(self.organization, self.auth, repo, self.client)
+            repo_stats = gts_main.output_repo(self.renderer, self.store, *result)
+            self.repo_filter.record(repo_stats)
+            if self.store is not None:
+                self.store.commit()
+        except Exception as err:
+            self.fetch_errors += 1
+            sys.stderr.write('Fetching %s failed: %s\n' % (repo, err))
+            if self.store is not None:
+                # A failed statement aborts a Postgres transaction, and IncrementalStore
+                # would otherwise save high-water marks of days that were not stored
+                try:
+                    self.store.rollback()
+                except Exception as err:
+                    sys.stderr.write('Rolling back failed: %s\n' % err)
+            return
+        self.fetches += 1
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save_state()
+
+    def step(self):
+        """ Run what is due now
+        :return: float - seconds until something is due again
+        """
+        now = self.clock()
+        if now >= self.next_listing:
+            self.relist(now)
+        repo = self.scheduler.pop(now)
+        if repo is not None:
+            self.fetch(repo)
+            return 0
+        due = self.scheduler.next_due()
+        return max(0, min(self.next_listing, due if due is not None else self.next_listing) - now)
+
+    def run(self):
+        """ Poll until stop() is called """
+        while not self.stopped.is_set():
+            delay = self.step()
+            if delay:
+                self.stopped.wait(delay)
+
+    def stop(self):
+        self.stopped.set()
+
+    def metrics(self):
+        """ Return the counters of the daemon as a dict """
+        values = {'uptime_seconds': self.clock() - self.started,
+                  'repos_scheduled': len(self.scheduler),
+                  'listings_total': self.listings,
+                  'listing_errors_total': self.listing_errors,
+                  'fetches_total': self.fetches,
+                  'fetch_errors_total': self.fetch_errors,
+                  'repos_skipped_total': self.repo_filter.skipped}
+        counters = self.client.limiter.counters()
+        values.update({'requests_total': counters['requests'],
+                       'retries_total': counters['retries'],
+                       'rate_limit_wait_seconds_total': counters['wait_time']})
+        if counters['remaining'] is not None:
+            values['rate_limit_remaining'] = counters['remaining']
+        if self.client.cache is not None:
+            values['cache_hits_total'] = self.client.cache.hits
+            values['cache_misses_total'] = self.client.cache.misses
+        if self.store is not None:
+            values['rows_written_total'] = self.store.rows
+        return values
+
+
+def format_metrics(values, prefix='gts_'):
+    """ Render counters in the Prometheus text exposition format """
+    return ''.join('%s%s %s\n' % (prefix, name, values[name]) for name in sorted(values))
+
+
+class MetricsServer(object):
+    """ Serves the metrics of a daemon on GET /metrics from a background thread
+    :param daemon: Daemon - the daemon whose counters are served
+    :param host: string - address to bind, keep it local
+    :param port: int - port to bind, 0 picks a free one
+    """
+
+    def __init__(self, daemon, host='127.0.0.1', port=9179):
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = format_metrics(daemon.metrics()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://%s:%d/metrics' % self.server.server_address[:2]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = gts_main.build_parser(prog='gts serve', epilog=None, one_shot=False)
+    parser.description = 'Poll traffic stats continuously, spreading the fetches of each repository over the polling interval'
+    parser.add_argument('--interval', default=3600, type=float, help='Seconds between two fetches of the same repository [3600]')
+    parser.add_argument('--relist-interval', default=6 * 3600, type=float, help='Seconds between two listings of the repositories [21600]')
+    parser.add_argument('--metrics', default='127.0.0.1:9179', metavar='HOST:PORT', help='Serve counters on http://HOST:PORT/metrics, "off" to disable [127.0.0.1:9179]')
+    args = parser.parse_args(argv)
+
+    auth_pair = gts_main.parse_credentials(args.username)
+    organization = args.organization.strip() if args.organization else auth_pair[0]
+    client = gts_main.make_client(args, auth_pair, gts_main.make_cache(args))
+    renderer = render.Renderer(sys.stdout, args.format) if args.print_screen == 'True' else None
+    state, repo_filter = gts_main.make_filter(args)
+    store = gts_main.open_store(args, gts_main.parse_db_config(args), state)
+    daemon = Daemon(client, organization, auth_pair, args.repo.strip(), store, renderer, repo_filter, state,
+                    args.interval, args.relist_interval, args.graphql)
+    metrics = None
+    if args.metrics != 'off':
+        host, port = args.metrics.rsplit(':', 1)
+        metrics = MetricsServer(daemon, host, int(port))
+        metrics.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.stop()
+        if store is not None:
+            store.close()
+        daemon.save_state()
+        client.close()
+    return 'Code done.'
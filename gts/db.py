@@ -0,0 +1,177 @@
+""" Batched, parameterized writes of traffic stats into the tables of create_table.sql
+Every call sends one set-based upsert per table, so a repository costs a single
+round trip per table instead of a SELECT and an INSERT per data point.
+"""
+import sys
+import threading
+
+from .record import Referrers, Series
+
+upsert_overview = (
+    "INSERT INTO repo_overview(create_timestamp, Repo_Name, Result_Type, Uniques, Total) "
+    "VALUES (DATE(NOW()), %s, %s, %s, %s) "
+    "ON CONFLICT (create_timestamp, Repo_Name, Result_Type) "
+    "DO UPDATE SET Uniques = EXCLUDED.Uniques, Total = EXCLUDED.Total")
+
+upsert_daily = (
+    "INSERT INTO {table}(Repo_Name, create_timestamp, Uniques, Total) VALUES %s "
+    "ON CONFLICT (Repo_Name, create_timestamp) "
+    "DO UPDATE SET Uniques = EXCLUDED.Uniques, Total = EXCLUDED.Total")
+
+upsert_referrals = (
+    "INSERT INTO repo_referrals(Repo_Name, Referral, Uniques, Total) VALUES %s "
+    "ON CONFLICT (Repo_Name, Referral) "
+    "DO UPDATE SET Uniques = EXCLUDED.Uniques, Total = EXCLUDED.Total")
+
+# Table receiving the daily rows of each response type
+daily_tables = {'views': 'repo_visitors', 'clones': 'repo_clones'}
+
+
+def series_rows(repo, series):
+    """ Rows of the daily breakdown of a views or clones series
+    :param repo: str - the GitHub repository name
+    :param series: Series - the parsed views or clones
+    :return: list - (repo_name, date, uniques, total) tuples
+    """
+    return [(repo, date, uniques, count) for date, count, uniques in series.rows()]
+
+
+def site_rows(repo, referrers):
+    """ Rows of the referring sites
+    :param repo: str - the GitHub repository name
+    :param referrers: Referrers - the parsed referrers
+    :return: list - (repo_name, referral, uniques, total) tuples
+    """
+    return [(repo, site, uniques, count) for site, count, uniques in referrers.rows()]
+
+
+def daily_rows(repo, json_response, response_type):
+    """ Rows of a views or clones response, see series_rows() """
+    return series_rows(repo, Series.from_json(json_response, response_type))
+
+
+def referral_rows(repo, json_response):
+    """ Rows of a referrers response, see site_rows() """
+    return site_rows(repo, Referrers.from_json(json_response))
+
+
+def write_series(cur, repo, series, response_type):
+    """ Upsert a views or clones series into `repo_overview` and `repo_visitors`/`repo_clones`
+    :param cur: psql - cursor used to execute the statements
+    :param repo: str - the GitHub repository name
+    :param series: Series - the parsed views or clones
+    :param response_type: str - 'views', 'clones'
+    :return: int - number of rows written
+    """
+    from psycopg2.extras import execute_values
+
+    cur.execute(upsert_overview, (repo, response_type, series.uniques, series.count))
+    rows = series_rows(repo, series)
+    if rows:
+        execute_values(cur, upsert_daily.format(table=daily_tables[response_type]), rows, page_size=1000)
+    return len(rows) + 1
+
+
+def write_sites(cur, repo, referrers):
+    """ Upsert the referring sites into `repo_referrals`
+    :param cur: psql - cursor used to execute the statements
+    :param repo: str - the GitHub repository name
+    :param referrers: Referrers - the parsed referrers
+    :return: int - number of rows written
+    """
+    from psycopg2.extras import execute_values
+
+    rows = site_rows(repo, referrers)
+    if rows:
+        execute_values(cur, upsert_referrals, rows, page_size=1000)
+    return len(rows)
+
+
+def write_traffic(cur, repo, json_response, response_type):
+    """ Upsert a views or clones response, see write_series() """
+    return write_series(cur, repo, Series.from_json(json_response, response_type), response_type)
+
+
+def write_referrals(cur, repo, json_response):
+    """ Upsert a referrers response, see write_sites() """
+    return write_sites(cur, repo, Referrers.from_json(json_response))
+
+
+def import_psycopg2():
+    """ Import psycopg2, exiting with a message if it is not installed """
+    try:
+        import psycopg2
+    except ImportError:
+        sys.stderr.write('The psycopg2 library is required to use database features.\n')
+        sys.stderr.flush()
+        sys.exit(1)
+    return psycopg2
+
+
+def connect(db_config):
+    """ Open a connection from the CLI database config
+    :param db_config: dict - dictionary containing configuration information for database
+    :return: connection - a psycopg2 connection
+    """
+    psycopg2 = import_psycopg2()
+    return psycopg2.connect(host=db_config['host'], port=db_config['port'], user=db_config['user'],
+                            password=db_config['password'], dbname=db_config['dbname'])
+
+
+class PostgresStore(object):
+    """ Storage backend holding one connection for a whole run.
+    Writes go into one transaction that is committed when the run completes and
+    rolled back if it fails. Runs keeping a checkpoint journal (see gts.journal)
+    also commit after each repository, so an interrupted run can be resumed.
+    Writes are serialized with a lock, so the store can be shared by worker threads.
+    :param db_config: dict - dictionary containing configuration information for database
+    """
+
+    def __init__(self, db_config):
+        self.db_config = db_config
+        self.conn = connect(db_config)
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def write(self, stats):
+        """ Upsert the stats of one repository
+        :param stats: RepoStats - the parsed stats, parts not fetched in this run are None (see --resume)
+        """
+        with self.lock:
+            with self.conn.cursor() as cur:
+                rows = 0
+                if stats.views is not None:
+                    rows += write_series(cur, stats.repo, stats.views, 'views')
+                if stats.clones is not None:
+                    rows += write_series(cur, stats.repo, stats.clones, 'clones')
+                if stats.referrers is not None:
+                    rows += write_sites(cur, stats.repo, stats.referrers)
+            self.rows += rows
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def rollback(self):
+        """ Drop the writes since the last commit, reconnecting if the connection was lost """
+        with self.lock:
+            if self.conn.closed:
+                self.conn = connect(self.db_config)
+            else:
+                self.conn.rollback()
+
+    def close(self, commit=True):
+        """ Commit (or roll back) the transaction and close the connection """
+        try:
+            if commit:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
@@ -0,0 +1,95 @@
+""" Selection of the repositories fetched in a run """
+import calendar
+import fnmatch
+import threading
+import time
+
+
+def parse_timestamp(timestamp):
+    """ Epoch seconds of a GitHub timestamp such as 2017-07-30T15:17:04Z, None if missing """
+    if not timestamp:
+        return None
+    return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+
+
+class RepoFilter(object):
+    """ Decides which listed repositories are fetched, before any traffic call is spent on them.
+    A repository is dormant when it was not pushed to for `dormant_days` and the last
+    run saw no traffic at all; dormant repositories are only fetched again once every
+    `dormant_interval` days, so a revival is still picked up.
+    :param include: list - glob patterns, if specified only matching names are fetched
+    :param exclude: list - glob patterns of names never fetched
+    :param skip_archived: bool - drop archived repositories
+    :param skip_forks: bool - drop forks
+    :param dormant_days: int - if specified, days without a push before a repository may be dormant
+    :param dormant_interval: int - days between fetches of a dormant repository
+    :param state: State - where the outcome of the last fetch of each repository is kept
+    :param clock: function - returns the current epoch time, for testing
+    """
+
+    def __init__(self, include=None, exclude=None, skip_archived=False, skip_forks=False,
+                 dormant_days=None, dormant_interval=7, state=None, clock=time.time):
+        self.include = include or []
+        self.exclude = exclude or []
+        self.skip_archived = skip_archived
+        self.skip_forks = skip_forks
+        self.dormant_days = dormant_days
+        self.dormant_interval = dormant_interval
+        self.activity = state.section('activity') if state is not None else {}
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.selected = 0
+        self.skipped = 0
+
+    def matches(self, name):
+        if self.include and not any(fnmatch.fnmatchcase(name, p) for p in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(name, p) for p in self.exclude)
+
+    def is_dormant(self, info, now):
+        """ Whether a repository is dormant and was fetched recently enough to skip it """
+        if self.dormant_days is None:
+            return False
+        last = self.activity.get(info['name'])
+        if not last or not last.get('zero'):
+            return False
+        pushed_at = parse_timestamp(info.get('pushed_at'))
+        if pushed_at is None or now - pushed_at < self.dormant_days * 86400:
+            return False
+        return now - last['checked'] < self.dormant_interval * 86400
+
+    def accept(self, info, now=None):
+        """ Whether a repository should be fetched in this run
+        :param info: dict - a repository from iter_repo_info()
+        :return: bool
+        """
+        now = self.clock() if now is None else now
+        return not ((self.skip_archived and info['archived'])
+                    or (self.skip_forks and info['fork'])
+                    or not self.matches(info['name'])
+                    or self.is_dormant(info, now))
+
+    def select(self, repos):
+        """ Filter listed repositories
+        :param repos: iterable - dicts of iter_repo_info()
+        :return: generator - names of the repositories to fetch
+        """
+        now = self.clock()
+        for info in repos:
+            accepted = self.accept(info, now)
+            with self.lock:
+                if accepted:
+                    self.selected += 1
+                else:
+                    self.skipped += 1
+            if accepted:
+                yield info['name']
+
+    def record(self, stats):
+        """ Remember whether a fetched repository had any traffic, for the next run
+        :param stats: RepoStats - the parsed stats, only recorded when complete
+        """
+        if stats is None or not stats.is_complete():
+            return
+        with self.lock:
+            self.activity[stats.repo] = {'checked': int(self.clock()), 'zero': stats.is_all_zero()}
@@ -0,0 +1,62 @@
+""" Checkpoint journal of the (repository, endpoint) fetches a run has saved
+
+Every line of the journal is "repository<TAB>endpoint", appended and flushed
+once the response has been committed to the storage backend. A run that
+dies partway leaves the journal behind; started again with --resume, it
+skips the pairs already in the journal. A run that completes removes it.
+"""
+import os
+import threading
+
+endpoints = ('traffic', 'clones', 'referrers')
+
+
+class Journal(object):
+    """ Append-only record of saved fetches
+    :param path: str - path of the journal file
+    :param resume: bool - keep the entries of a previous run, otherwise start empty
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if resume:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        # A line cut short by a crash has no newline, it is redone
+                        if line.endswith('\n') and '\t' in line:
+                            self.done.add(tuple(line[:-1].split('\t', 1)))
+            except (IOError, OSError):
+                pass
+        self.resumed = len(self.done)
+        self.finished = False
+        self.file = open(path, 'a' if resume else 'w')
+
+    def is_done(self, repo, endpoint):
+        return (repo, endpoint) in self.done
+
+    def is_repo_done(self, repo):
+        return all((repo, endpoint) in self.done for endpoint in endpoints)
+
+    def record(self, repo, saved):
+        """ Add the endpoints of a repository whose responses were committed
+        :param repo: str - the GitHub repository name
+        :param saved: iterable - endpoint names, see output_repo()
+        """
+        with self.lock:
+            lines = []
+            for endpoint in saved:
+                if (repo, endpoint) not in self.done:
+                    self.done.add((repo, endpoint))
+                    lines.append('%s\t%s\n' % (repo, endpoint))
+            if lines:
+                self.file.write(''.join(lines))
+                self.file.flush()
+
+    def close(self, complete=False):
+        """ Close the journal, removing it when the run completed (collect sets finished) """
+        self.file.close()
+        if complete:
+            os.remove(self.path)
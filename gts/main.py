@@ -1,71 +1,192 @@
 #!/usr/bin/env python
 
 import argparse
-import csv
 import os
-from collections import OrderedDict
+import sys
+from collections import deque
 import datetime
 import getpass
-import requests
+import io
+import threading
+
+from .accounts import load_accounts
+from .cache import HttpCache, default_cache_dir
+from .client import ApiError, Client, default_client
+from . import csv_store, db, graphql, render
+from .filters import RepoFilter
+from .journal import Journal, endpoints
+from .record import Referrers, RepoStats, Series
+from .state import IncrementalStore, State
+from .stats import Profiler, Stats
+from .ratelimit import RateLimiter
 
 
 # Globals
 current_timestamp = str(datetime.datetime.now().strftime('%Y-%m-%d-%Hh-%Mm'))  # was .strftime('%Y-%m-%d'))
 path = os.path.abspath(os.path.dirname(__file__))
+api_url = 'https://api.github.com'
 csv_file_name = current_timestamp + '-traffic-stats.csv'
 csv_file_name_clones = current_timestamp + '-clone-stats.csv'
 csv_file_name_referrers = current_timestamp + '-referrer-stats.csv'
 
 
-def send_request(resource, organization, auth, repo=None):
+def send_request(resource, organization, auth, repo=None, client=None):
     """ Send request to specific Github API endpoint
     :param resource: string - specify the API to call
     :param organization: string - specify the repository organization if not owner by username
     :param auth: username:password separated string - if no password specified, interactive dialog used
     :param repo: string - if specified, the specific repository name
-    :param headers: dict - if specified, the request headers
-    :param params: dict - if specified, the parameters
-    :return: response - GET request response, if a tuple then (response, header) responses
+    :param client: Client - if specified, the pooled HTTP client to send the request through
+    :return: response - GET request response
     """
+    client = client or default_client()
     if resource == 'traffic':
         # GET /repos/:owner/:repo/traffic/views <- from developer.github.com/v3/repos/traffic/#views
-        base_url = 'https://api.github.com/repos/'
+        base_url = api_url + '/repos/'
         base_url = base_url + organization + '/' + repo + '/traffic/views'
-        response = requests.get(base_url, auth=auth)
+        response = client.get(base_url, auth=auth)
         return response
     elif resource == 'repos':
         # GET /user/repos <- from developer.github.com/v3/repos/#list-your-repositories
-        base_url = 'https://api.github.com/users/'
+        base_url = api_url + '/users/'
         base_url = base_url + organization + '/repos'
         params = {'per_page': '100'}
-        response = requests.get(base_url, auth=auth, params=params)
-        headers = requests.head(base_url, auth=auth, params=params)
-        return (response, headers)
+        response = client.get(base_url, auth=auth, params=params)
+        return response
     elif resource == 'clones':
         # GET /repos/:owner/:repo/traffic/clones <- from developer.github.com/v3/repos/traffic/#clones
-        base_url = 'https://api.github.com/repos/'
+        base_url = api_url + '/repos/'
         base_url = base_url + organization + '/' + repo + '/traffic/clones'
-        response = requests.get(base_url, auth=auth)
+        response = client.get(base_url, auth=auth)
         return response
     elif resource == 'referrers':
         # GET /repos/:owner/:repo/traffic/popular/referrers <- from developer.github.com/v3/repos/traffic/#list-referrers
-        base_url = 'https://api.github.com/repos/'
+        base_url = api_url + '/repos/'
         base_url = base_url + organization + '/' + repo + '/traffic/popular/referrers'
-        response = requests.get(base_url, auth=auth)
+        response = client.get(base_url, auth=auth)
         return response
 
 
-def send_request_pagination(url, auth):
+def send_request_pagination(url, auth, client=None):
     """ Send request to specific Github API endpoint using pagination
     :param url: string - the URL from the "response.links" header
     :param auth: username:password separated string - if no password specified, interactive dialog used
-    :param params: dict - if specified, the parameters
-    :return: response - a tuple of (response, header) responses
+    :param client: Client - if specified, the pooled HTTP client to send the request through
+    :return: response - GET request response, the next page is in response.links
     """
-    params = {'per_page': '100'}
-    response = requests.get(url, auth=auth, params=params)
-    headers = requests.head(url)
-    return (response, headers)
+    client = client or default_client()
+    # The "next" URL already carries the per_page and page parameters
+    response = client.get(url, auth=auth)
+    return response
+
+
+def iter_repos(organization, auth, client=None):
+    """ Iterate over the names of all repositories of a user or organization
+    Pages are requested lazily, following the Link header of each GET response,
+    so names are yielded as soon as their page arrives.
+    :param organization: string - the repository organization or owner
+    :param auth: tuple - (username, password) pair
+    :param client: Client - if specified, the pooled HTTP client to send the requests through
+    :return: generator - repository names
+    """
+    for info in iter_repo_info(organization, auth, client):
+        yield info['name']
+
+
+def iter_repo_info(organization, auth, client=None, use_graphql=False):
+    """ Iterate over all repositories of a user or organization with their metadata
+    :param organization: string - the repository organization or owner
+    :param auth: tuple - (username, password) pair
+    :param client: Client - if specified, the pooled HTTP client to send the requests through
+    :param use_graphql: bool - list through the GraphQL API instead of REST
+    :return: generator - dicts with name, archived, fork, visibility and pushed_at
+    """
+    if use_graphql:
+        for info in graphql.iter_repo_info(api_url + '/graphql', organization, auth, client or default_client()):
+            yield info
+        return
+    client = client or default_client()
+    response = send_request('repos', organization, auth, client=client)
+    while True:
+        with client.stats.timer('decode'):
+            repos_json = response.json()
+        # Error handling in case of {'documentation_url':'https://developer.github.com/v3','message':'Not Found'}
+        if isinstance(repos_json, dict):
+            raise ApiError(repos_json.get('message'))
+        for repo in repos_json:
+            yield {'name': repo['name'],
+                   'archived': repo.get('archived', False),
+                   'fork': repo.get('fork', False),
+                   'visibility': repo.get('visibility') or ('private' if repo.get('private') else 'public'),
+                   'pushed_at': repo.get('pushed_at')}
+        next_link = response.links.get('next')
+        if not next_link:
+            break
+        response = send_request_pagination(next_link['url'], auth, client)
+
+
+def get_json(resource, organization, auth, repo=None, client=None):
+    """ Send a request with send_request() and decode its JSON body
+    :return: json - the decoded response
+    """
+    client = client or default_client()
+    response = send_request(resource, organization, auth, repo, client)
+    with client.stats.timer('decode'):
+        return response.json()
+
+
+def fetch_repo(organization, auth, repo, client=None, skip=None):
+    """ Fetch the traffic, clones and referrers stats of a single repository
+    :param organization: string - the repository organization or owner
+    :param auth: tuple - (username, password) pair
+    :param repo: string - the repository name
+    :param client: Client - if specified, the pooled HTTP client to send the requests through
+    :param skip: function - if specified, skip(repo, endpoint) is true for the endpoints not to fetch
+    :return: tuple - (traffic, clones, referrers) json responses, None where skipped
+    """
+    return tuple(None if skip is not None and skip(repo, resource)
+                 else get_json(resource, organization, auth, repo, client)
+                 for resource in endpoints)
+
+
+def fetch_repos(organization, auth, repos, workers=1, client=None, skip=None):
+    """ Fetch the stats of many repositories, in parallel if workers > 1
+    Each endpoint of each repository is a separate job on a bounded thread pool,
+    but results are yielded in the order of `repos` so that printing and storage
+    stay deterministic regardless of which request finishes first.
+    :param organization: string - the repository organization or owner
+    :param auth: tuple - (username, password) pair
+    :param repos: iterable - repository names, may be a generator
+    :param workers: int - number of concurrent requests
+    :param client: Client - if specified, the pooled HTTP client to send the requests through
+    :param skip: function - if specified, skip(repo, endpoint) is true for the endpoints not to fetch
+    :return: generator - (repo, traffic, clones, referrers) tuples, None where skipped
+    """
+    if workers <= 1:
+        for repo in repos:
+            yield (repo,) + fetch_repo(organization, auth, repo, client, skip)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch_json(resource, repo):
+        return get_json(resource, organization, auth, repo, client)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded window of repos in flight so memory stays flat
+        # for very large organizations
+        pending = deque()
+        for repo in repos:
+            futures = [None if skip is not None and skip(repo, resource)
+                       else executor.submit(fetch_json, resource, repo)
+                       for resource in endpoints]
+            pending.append((repo, futures))
+            if len(pending) > workers:
+                repo_name, futures = pending.popleft()
+                yield (repo_name,) + tuple(f and f.result() for f in futures)
+        while pending:
+            repo_name, futures = pending.popleft()
+            yield (repo_name,) + tuple(f and f.result() for f in futures)
 
 
 def json_to_table(repo, json_response, response_type):
@@ -75,42 +196,13 @@ def json_to_table(repo, json_response, response_type):
     :param response_type: str - specifies the kind of table to create
     :return: table: str - for printing on command line
     """
-    if response_type == 'traffic':
-        label0 = "Visitors"
-        label1 = "Views"
-        label2 = "Unique visitors"
-    if response_type == 'clones':
-        label0 = "Git clones"
-        label1 = "Clones"
-        label2 = "Unique cloners"
-
-    repo_name = repo
-    total_label1 = str(json_response['count'])
-    total_uniques = str(json_response['uniques'])
-
-    # If there is granular date-level data
-    dates_and_label1 = OrderedDict()
-    detailed_label1 = json_response[label1.lower()]  # 'views', 'clones'
-    for row in detailed_label1:
-        utc_date = str(row['timestamp'][0:10])
-        dates_and_label1[utc_date] = (str(row['count']), str(row['uniques']))
-
-    """ Table template
-    repo_name
-    Date        label1  label2
-    Totals      #       #
-    date        #       #
-    ...         ...     ...
-    """
-    # Set the table
-    table = '> ' + repo_name + ' - ' + label0 + '\n' +\
-            'Date' + '\t\t' + label1 + '\t' + label2 + '\n' +\
-            'Totals' + '\t\t' + total_label1 + '\t' + total_uniques + '\n'
-    # Add rows to the table
-    for row in dates_and_label1:
-        table += row + '\t' + dates_and_label1[row][0] + '\t' + dates_and_label1[row][1] + '\n'
-
-    return table
+    if response_type == 'referrers':
+        part = Referrers.from_json(json_response)
+    else:
+        part = Series.from_json(json_response, 'views' if response_type == 'traffic' else 'clones')
+    out = io.StringIO()
+    render.Renderer(out).table(repo, part, response_type)
+    return out.getvalue()[:-1]  # print() adds the blank line between tables
 
 
 def json_to_table_referrers(repo, json_response):
@@ -119,38 +211,7 @@ def json_to_table_referrers(repo, json_response):
     :param json_response: json - the json input
     :return: table: str - for printing on command line
     """
-    repo_name = repo
-    total_count = 0
-    total_uniques = 0
-
-    # If there is granular date-level data
-    refs = OrderedDict()
-    for row in json_response:
-        referrer = row['referrer']
-        refs[referrer] = (str(row['count']), str(row['uniques']))
-        total_count += row['count']
-        total_uniques += row['uniques']
-    """ Table template
-    repo_name
-    Date        Count   Uniques
-    Totals      #       #
-    site        #       #
-    ...         ...     ...
-    """
-    # Set the table
-    table = '> ' + repo_name + ' - Referring sites' + '\n' +\
-            'Date' + '\t\t' + 'Views' + '\t' + 'Unique visitors' + '\n' +\
-            'Totals' + '\t\t' + str(total_count) + '\t' + str(total_uniques) + '\n'
-    # Add rows to the table
-    for row in refs:
-        # Note: The referring website can sometimes be quite lengthy
-        # so the output for this part can get buggy depending on your terminal
-        if len(row) >= 8:
-            table += '%.8s...\t%s\t%s \n' % (row, refs[row][0], refs[row][1])
-        else:
-            table += '%.8s\t\t%s\t%s \n' % (row, refs[row][0], refs[row][1])
-
-    return table
+    return json_to_table(repo, json_response, 'referrers')
 
 
 def store_csv_referrers(file_path, repo, json_response):
@@ -160,32 +221,7 @@ def store_csv_referrers(file_path, repo, json_response):
     :param repo: str - the GitHub repository name
     :param json_response: json - the json input
     """
-    repo_name = repo
-    sites_and_views = OrderedDict()
-    for row in json_response:
-        site = row['referrer']
-        sites_and_views[site] = (str(row['count']), str(row['uniques']))
-    # Starting up the CSV, writing the headers in a first pass
-    # Check if existing CSV
-    try:
-        csv_file = open(file_path).readlines()
-        if csv_file:
-            for i in sites_and_views:
-                row = [repo_name, i, sites_and_views[i][0], sites_and_views[i][1]]
-                with open(file_path, 'a') as csvfile:
-                    csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                    csv_writer.writerow(row)
-    except IOError:
-        headers = ['repository_name', 'site', 'views', 'unique_visitors/cloners']
-        with open(file_path, 'a') as csvfile:
-            csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            csv_writer.writerow(headers)
-
-        for i in sites_and_views:
-            row = [repo_name, i, sites_and_views[i][0], sites_and_views[i][1]]
-            with open(file_path, 'a') as csvfile:
-                csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                csv_writer.writerow(row)
+    csv_store.append_rows(file_path, csv_store.referrers_headers, csv_store.referrer_rows(repo, json_response))
 
 
 def store_csv(file_path, repo, json_response, response_type):
@@ -196,38 +232,9 @@ def store_csv(file_path, repo, json_response, response_type):
     :param json_response: json - the json input
     :param response_type: str - 'views', 'clones', ''
     """
-    repo_name = repo
-    # # Not writing Totals stats into the CSV to maintain normalization
-    # total_views = str(json_response['count'])
-    # total_uniques = str(json_response['uniques'])
-
-    dates_and_views = OrderedDict()
-    detailed_views = json_response[response_type]  # 'views', 'clones'
-    for row in detailed_views:
-        utc_date = str(row['timestamp'][0:10])
-        dates_and_views[utc_date] = (str(row['count']), str(row['uniques']))
-
-    # Starting up the CSV, writing the headers in a first pass
-    # Check if existing CSV
-    try:
-        csv_file = open(file_path).readlines()
-        if csv_file:
-            for i in dates_and_views:
-                row = [repo_name, i, dates_and_views[i][0], dates_and_views[i][1]]
-                with open(file_path, 'a') as csvfile:
-                    csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                    csv_writer.writerow(row)
-    except IOError:
-        headers = ['repository_name', 'date', response_type.lower(), 'unique_visitors/cloners']
-        with open(file_path, 'a') as csvfile:
-            csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            csv_writer.writerow(headers)
-
-        for i in dates_and_views:
-            row = [repo_name, i, dates_and_views[i][0], dates_and_views[i][1]]
-            with open(file_path, 'a') as csvfile:
-                csv_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                csv_writer.writerow(row)
+    # Not writing Totals stats into the CSV to maintain normalization
+    headers = ['repository_name', 'date', response_type.lower(), 'unique_visitors/cloners']
+    csv_store.append_rows(file_path, headers, csv_store.traffic_rows(repo, json_response, response_type))
 
 
 def store_db(db_config={}, repo='', json_response='', response_type=''):
@@ -237,129 +244,196 @@ def store_db(db_config={}, repo='', json_response='', response_type=''):
    :param repo: str - the GitHub repository name
    :param json_response: json - the json input
    :param response_type: str - 'views', 'clones', ''
+   Each call opens its own connection, main() writes through a single db.PostgresStore instead.
    """
-   
-   try:
-      import psycopg2
-   except:
-      import sys
-      sys.stderr.write('The psycopg2 library is required to use database features.\n')
-      sys.stderr.flush()
-      sys.exit(1)
 
    # Connect to database 
-   conn = psycopg2.connect(host=db_config['host'], port=db_config['port'], user=db_config['user'], password=db_config['password'], dbname=db_config['dbname']) 
-   conn.autocommit = True
-   cur = conn.cursor() 
-
-
-   insert_repo_overview = "INSERT INTO repo_overview(Repo_Name, Result_Type, Uniques, Total) VALUES ('%s', '%s', %s, %s);"
-   if response_type == 'views': # send data to `repo_overview` and `repo_visitors`
-      __repo_overview_insert(cur, repo, response_type, json_response)
-      __repo_views_insert(cur, repo, json_response[response_type])
-
-   elif response_type == 'clones': # send data to `repo_overview` and `repo_clones`
-      __repo_overview_insert(cur, repo, response_type, json_response)
-      __repo_clones_insert(cur, repo, json_response[response_type])
-
-   else: # send data to `repo_referrals` 
-      __insert_repo_referrals(cur, repo, json_response) 
-
-
-def __repo_overview_insert(cur=None, repo='', response_type='', json_response=None): 
-   check_count = "SELECT COUNT(*) FROM repo_overview WHERE create_timestamp=DATE(NOW()) AND Repo_Name='%s' AND Result_Type='%s'" 
-   insert_stmt = "INSERT INTO repo_overview(create_timestamp, Repo_Name, Result_Type, Uniques, Total) VALUES (DATE(NOW()), '%s', '%s', %s, %s);" 
-   
-   cur.execute(check_count % (repo, response_type)) 
-   if cur.fetchall()[0][0] == 0:
-      cur.execute(insert_stmt % (repo, response_type, json_response['uniques'], json_response['count'])) 
-
-
-def __repo_views_insert(cur=None, repo='', json_response=None): 
-   """INSERT data into repo_visitors table if row doesn't already exist 
-   :param cur: psql - Connection to the PSQL in order to execute queries 
-   :param repo: str - the GitHub repository name
-   :param json_response: json - the json input
-   """
-   check_count = "SELECT COUNT(*) FROM repo_visitors WHERE create_timestamp='%s' AND Repo_Name='%s';"
-   insert_stmt = "INSERT INTO repo_visitors(Repo_Name, create_timestamp, Uniques, Total) VALUES %s;"
-
-   for obj in json_response: 
-      cur.execute(check_count % (obj['timestamp'], repo))
-      if cur.fetchall()[0][0] == 0: 
-         insert_row = "\n\t('%s', '%s', %s, %s)" % (repo, obj['timestamp'], obj['uniques'], obj['count'])
-         cur.execute(insert_stmt % insert_row)
-
-
-def __repo_clones_insert(cur=None, repo='', json_response=None):
-   """INSERT data into repo_clones table if row doesn't already exist 
-   :param cur: psql - Connection to the PSQL in order to execute queries 
-   :param repo: str - the GitHub repository name
-   :param json_response: json - the json input
-   """
-   check_count = "SELECT COUNT(*) FROM repo_clones WHERE create_timestamp='%s' AND Repo_Name='%s';"
-   insert_stmt = "INSERT INTO repo_clones(Repo_Name, create_timestamp, Uniques, Total) VALUES %s;"
-
-   for obj in json_response: 
-      cur.execute(check_count % (obj['timestamp'], repo))
-      if cur.fetchall()[0][0] == 0: 
-         insert_row = "\n\t('%s', '%s', %s, %s)" % (repo, obj['timestamp'], obj['uniques'], obj['count'])
-         cur.execute(insert_stmt % insert_row)
+   conn = db.connect(db_config)
+   try:
+      # One transaction per call, committed on success and rolled back on error
+      with conn:
+         with conn.cursor() as cur:
+            if response_type in ('views', 'clones'): # send data to `repo_overview` and `repo_visitors`/`repo_clones`
+               db.write_traffic(cur, repo, json_response, response_type)
+            else: # send data to `repo_referrals` 
+               db.write_referrals(cur, repo, json_response)
+   finally:
+      conn.close()
+
+
+def output_repo(renderer, store, repo, traffic_response, clones_response, referrers_response):
+    """ Print and save the stats of a single repository
+    :param renderer: Renderer - if specified, where the stats are printed
+    :param store: store - if specified, the storage backend of the run (see open_store)
+    :param repo: str - the GitHub repository name
+    :param traffic_response: json - the traffic views json
+    :param clones_response: json - the clones json
+    :param referrers_response: json - the referrers json
+    Responses that were not fetched are None.
+    :return: RepoStats - the parsed stats that were printed and saved, None if every response failed
+    """
+    # Requests that still failed after retries come back as {'message': ...} payloads,
+    # they are reported and the other responses of the repository are kept
+    responses = [traffic_response, clones_response, referrers_response]
+    errors = []
+    for i, response in enumerate(responses):
+        if isinstance(response, dict) and response.get('message'):
+            errors.append(response['message'])
+            responses[i] = None
+    if errors:
+        (renderer or render.Renderer()).error(repo, errors[0])
+    if all(response is None for response in responses):
+        return None
+    # Parsed once, every output reads the same record
+    stats = RepoStats.from_json(repo, *responses)
+    if renderer is not None:
+        renderer.write(stats)
+    # Saving data
+    if store is not None:
+        store.write(stats)
+    return stats
+
+
+def checkpoint(store, journal, repo_stats):
+    """ Commit the store and record the saved endpoints of a repository in the journal """
+    if journal is not None and repo_stats is not None:
+        store.commit()
+        journal.record(repo_stats.repo, repo_stats.endpoints())
+
+
+def collect(args, client, renderer, store, organization, auth_pair, repo, repo_filter=None, journal=None):
+    """ Fetch, print and save the stats of one or 'ALL' repositories
+    :param args: argparse.Namespace - the parsed CLI arguments
+    :param client: Client - the pooled HTTP client of the run
+    :param renderer: Renderer - if specified, where the stats are printed
+    :param store: store - if specified, the storage backend of the run (see open_store)
+    :param organization: string - the repository organization or owner
+    :param auth_pair: tuple - (username, password) pair
+    :param repo: string - GitHub user's repo name or 'ALL' repos
+    :param repo_filter: RepoFilter - if specified, selects the repositories fetched among 'ALL'
+    :param journal: Journal - if specified, the checkpoint journal, each saved repository is committed
+    """
+    if repo == 'ALL':
+        # By default iterate over all repositories, fetching starts while
+        # later pages of the listing are still being retrieved
+        repos = iter_repo_info(organization, auth_pair, client, args.graphql)
+        repo_filter = repo_filter or RepoFilter()
+        repos = repo_filter.select(repos)
+        skip = None
+        if journal is not None:
+            repos = (name for name in repos if not journal.is_repo_done(name))
+            skip = journal.is_done
+        try:
+            # Results come back in listing order
+            for result in fetch_repos(organization, auth_pair, repos, args.workers, client, skip):
+                repo_stats = output_repo(renderer, store, *result)
+                repo_filter.record(repo_stats)
+                checkpoint(store, journal, repo_stats)
+        except ApiError as err:
+            print(err)
+            return 'Code done.'
+        if journal is not None:
+            journal.finished = True
 
+    else: 
+        # Or just request 1 repo
+        traffic_response = get_json('traffic', organization, auth_pair, repo, client)
+        # Error handling in case of {'documentation_url': 'https://developer.github.com/v3', 'message': 'Not Found'}
+        if traffic_response.get('message'):
+            print(traffic_response['message'])
+            return 'Code done.'
+        clones_response = get_json('clones', organization, auth_pair, repo, client)
+        referrers_response = get_json('referrers', organization, auth_pair, repo, client)
+        output_repo(renderer, store, repo, traffic_response, clones_response, referrers_response)
+
+
+def collect_accounts(args, accounts, renderer, store, repo_filter, cache=None, stats=None, journal=None):
+    """ Fetch, print and save the stats of several owners concurrently.
+    Each owner is fetched in its own thread, and each token gets its own client and
+    rate limiter, as GitHub counts the request budget per token. Repositories are
+    named 'owner/repo' in the output, so the owners can share the same sinks.
+    :param args: argparse.Namespace - the parsed CLI arguments
+    :param accounts: list - Account objects, see gts.accounts
+    :param renderer: Renderer - if specified, where the stats are printed
+    :param store: store - if specified, the storage backend of the run (see open_store)
+    :param repo_filter: RepoFilter - selects the repositories fetched, globs match 'owner/repo'
+    :param cache: HttpCache - if specified, the response cache shared by the clients
+    :param stats: Stats - if specified, where the requests of all clients are counted
+    :param journal: Journal - if specified, the checkpoint journal, each saved repository is committed
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    clients = {}
+    for account in accounts:
+        if account.auth not in clients:
+            clients[account.auth] = make_client(args, account.auth, cache, stats)
+    output_lock = threading.Lock()
+
+    def collect_account(account):
+        client = clients[account.auth]
+        organization = account.organization
+        prefix = organization + '/'
+        if account.repo == 'ALL':
+            repos = iter_repo_info(organization, account.auth, client, args.graphql)
+            repos = (dict(info, name=prefix + info['name']) for info in repos)
+            repos = repo_filter.select(repos)
+        else:
+            repos = [prefix + account.repo]
+        skip = None
+        if journal is not None:
+            repos = (name for name in repos if not journal.is_repo_done(name))
+            skip = lambda repo, endpoint: journal.is_done(prefix + repo, endpoint)
+        repos = (name[len(prefix):] for name in repos)
+        try:
+            for result in fetch_repos(organization, account.auth, repos, args.workers, client, skip):
+                result = (prefix + result[0],) + result[1:]
+                with output_lock:
+                    repo_stats = output_repo(renderer, store, *result)
+                    repo_filter.record(repo_stats)
+                    checkpoint(store, journal, repo_stats)
+        except ApiError as err:
+            print('%s: %s' % (organization, err))
+            return False
+        return True
 
-def __insert_data_none_reference(repo, json_response=None): #->str:  # func annotations from py3 on, else drop py2 support
-   """ Based on repo and info in json_response, generate the rows to be inserted into table:
-   repo_name, date, views, unique_visitors/cloners
-   :param repo: str - the GitHub repository name
-   :param json_response: json - the json input
-   :return return_stmt: str - string containing the rows which will be inserted
-   """
-   return_stmt = ""
-   i = 0 
-   for obj in json_response:
-      if i == len(json_response)-1: 
-         return_stmt += "\n\t('%s', '%s', %s, %s);" % (repo, obj['timestamp'], obj['uniques'], obj['count'])
-      else: 
-         return_stmt += "\n\t('%s', '%s', %s, %s)," % (repo, obj['timestamp'], obj['uniques'], obj['count'])
-      i += 1
-   return return_stmt
-
-
-def __insert_repo_referrals(cur=None, repo='', json_response=None): 
-   """ Based on repo and info in json_response, generate the rows to be inserted into `repo_referrals`:
-   repo_name, views, unique_visitors/cloners
-   :param cur: psql - Connection to the PSQL in order to execute queries 
-   :param repo: str - the GitHub repository name
-   :param json_response: json - the json input
-   """
-   insert_stmt = "INSERT INTO repo_referrals(Repo_Name, Referral, Uniques, Total) VALUES('%s', '%s', %s, %s)" 
-   update_stmt = "UPDATE repo_referrals SET Uniques=%s, Total=%s WHERE Repo_Name='%s' AND Referral='%s'"
-   check_stmt = "SELECT COUNT(*) FROM repo_referrals WHERE Repo_Name='%s' AND Referral='%s'"
-   for obj in json_response: 
-      # Check whether or not a given referral exists 
-      check_count = check_stmt % (repo, obj['referrer']) 
-      cur.execute(check_count)
-      count = cur.fetchall()[0][0]
-      if count == 0: # If referral doesn't exists create a new one 
-         insert = insert_stmt % (repo, obj['referrer'], obj['uniques'], obj['count'])
-      else: # If referral exists update row 
-         insert = update_stmt % (obj['uniques'], obj['count'], repo, obj['referrer']) 
-      cur.execute(insert) 
-
- 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('username', help='Github username')
-    parser.add_argument('repo', help='User\'s repo', default='ALL', nargs='?')
-    parser.add_argument('save_csv', default='save_csv', help='Set to "no_csv" if no CSV should be saved, or "set_db" if data should be saved in database', nargs='?')
-    parser.add_argument('-o', '--organization', default=None, help='Github organization')
-    parser.add_argument('-print', '--print-screen', default='True', help='Print CSV results to screen', nargs='?') # print output to screen
-    # Database config input 
-    parser.add_argument('-hp', '--host',  default='127.0.0.1:5432', help='Set database host and port [127.0.0.1:5432]', nargs='?')
-    parser.add_argument('-usr', '--db-user', default='root:""', help='Set database user and password [root:""]', nargs='?')
-    parser.add_argument('-name', '--db-name',  default='test', help='Set database where data will be stored', nargs='?')
-    args = parser.parse_args()
-    """ Run main code logic
+    try:
+        with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+            # Surface the first unexpected error once every owner is done
+            done = [f.result() for f in [executor.submit(collect_account, account) for account in accounts]]
+        if journal is not None:
+            journal.finished = all(done)
+    finally:
+        for client in clients.values():
+            client.close()
+    return 'Code done.'
+
+
+def open_store(args, db_config, state=None):
+    """ Open the storage backend selected by the save_csv argument
+    :param args: argparse.Namespace - the parsed CLI arguments
+    :param db_config: dict - dictionary containing configuration information for database
+    :param state: State - the state kept between runs, used by --incremental
+    :return: store - the storage backend, None if nothing is saved
+    """
+    if args.save_csv == 'save_csv':
+        # Each CSV is opened once for the whole run
+        store = csv_store.CsvStore(csv_file_name, csv_file_name_clones, csv_file_name_referrers)
+    elif args.save_csv.strip() == 'set_db':
+        # One connection and transaction for the whole run, rolled back if the run fails
+        store = db.PostgresStore(db_config)
+    elif args.save_csv.strip() == 'set_sqlite':
+        # Local history with indexed range queries, no database server needed
+        from . import sqlite_store
+        store = sqlite_store.SqliteStore(args.sqlite_path)
+    else:
+        return None
+    if args.incremental:
+        store = IncrementalStore(store, state)
+    return store
+
+
+def build_parser(prog=None, epilog='Other commands: gts merge -h, gts report -h, gts compact -h, gts serve -h', one_shot=True):
+    """ Parser of the arguments shared by a one-shot run and gts serve
     :param username: string - GitHub username, or username:password pair
     :param repo: string - GitHub user's repo name or by default 'ALL' repos
     :param save_csv: string - Specify if CSV log should be saved
@@ -368,8 +442,77 @@ def main():
     param -usr, --db-user: string - user and password to the database 
     param -name, --db-name: string - database name 
     param -o, --organization: string - GitHub organization (if different from username)
+    param -f, --format: string - printed output, 'table', 'tsv' or 'jsonl'
+    param -w, --workers: int - number of repositories fetched concurrently
+    param --graphql: bool - list repositories through the GraphQL API
+    param --skip-archived: bool - do not fetch archived repositories
+    param --skip-forks: bool - do not fetch forks
+    param --include, --exclude: string - glob patterns of repository names to fetch or leave out
+    param --skip-dormant: int - days without a push before a repository with no traffic is dormant
+    param --dormant-interval: int - days between fetches of a dormant repository
+    param --max-retries: int - retries of rate limited or failed requests
+    param --cache-dir: string - directory of the HTTP response cache
+    param --no-cache: bool - send unconditional requests and do not cache responses
+    param --sqlite-path: string - SQLite file used when save_csv is "set_sqlite"
+    param --incremental: bool - only save days that are new or changed since the last run
+    param --state-file: string - path of the state kept between runs
+    param --config: string - JSON accounts file, see gts.accounts
+    param --journal: string - if specified, path of the checkpoint journal of 'ALL' and --config runs that save data
+    param --resume: bool - skip what the journal records as saved by an interrupted run
+    param --stats: bool - print per-stage timings and request counts to stderr
+    param --stats-json: string - path of the same figures as JSON
+    param --profile: string - path of a cProfile dump of the run
+    --config, --journal, --resume, --stats, --stats-json and --profile only exist if one_shot is true,
+    gts serve does not support them.
+    """
+    parser = argparse.ArgumentParser(prog=prog, epilog=epilog)
+    parser.add_argument('username', help='Github username, "-" with --config' if one_shot else 'Github username')
+    parser.add_argument('repo', help='User\'s repo', default='ALL', nargs='?')
+    parser.add_argument('save_csv', default='save_csv', help='Set to "no_csv" if no CSV should be saved, "set_db" if data should be saved in database, or "set_sqlite" to save it in a local SQLite file', nargs='?')
+    parser.add_argument('-o', '--organization', default=None, help='Github organization')
+    parser.add_argument('-print', '--print-screen', default='True', help='Print CSV results to screen', nargs='?') # print output to screen
+    parser.add_argument('-f', '--format', default='table', choices=render.formats, help='Printed output: aligned tables, TSV or JSON Lines [table]')
+    parser.add_argument('-w', '--workers', default=1, type=int, help='Number of repositories fetched concurrently [1]')
+    parser.add_argument('--graphql', action='store_true', help='List repositories through the GraphQL API (requires a token), '
+                        'as many calls as the REST listing')
+    parser.add_argument('--skip-archived', action='store_true', help='Do not fetch archived repositories')
+    parser.add_argument('--skip-forks', action='store_true', help='Do not fetch forks')
+    parser.add_argument('--include', action='append', help='Only fetch repositories matching this glob, may be repeated')
+    parser.add_argument('--exclude', action='append', help='Do not fetch repositories matching this glob, may be repeated')
+    parser.add_argument('--skip-dormant', default=None, type=int, metavar='DAYS', help='Fetch repositories without a push for DAYS and no traffic in the last run only every --dormant-interval days')
+    parser.add_argument('--dormant-interval', default=7, type=int, metavar='DAYS', help='Days between fetches of a dormant repository [7]')
+    parser.add_argument('--max-retries', default=5, type=int, help='Retries of rate limited or failed requests [5]')
+    parser.add_argument('--cache-dir', default=default_cache_dir, help='Directory of the HTTP response cache [%s]' % default_cache_dir)
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the HTTP response cache')
+    parser.add_argument('--sqlite-path', default='gts-history.sqlite3', help='SQLite file used by "set_sqlite" [gts-history.sqlite3]')
+    parser.add_argument('--incremental', action='store_true', help='Only save days that are new or changed since the last run')
+    parser.add_argument('--state-file', default='gts-state.json', help='State kept between runs [gts-state.json]')
+    if one_shot:
+        add_one_shot_arguments(parser)
+    # Database config input 
+    parser.add_argument('-hp', '--host',  default='127.0.0.1:5432', help='Set database host and port [127.0.0.1:5432]', nargs='?')
+    parser.add_argument('-usr', '--db-user', default='root:""', help='Set database user and password [root:""]', nargs='?')
+    parser.add_argument('-name', '--db-name',  default='test', help='Set database where data will be stored', nargs='?')
+    return parser
+
+
+def add_one_shot_arguments(parser):
+    """ Arguments of a one-shot run that gts serve has no use for """
+    parser.add_argument('--config', default=None, metavar='FILE', help='JSON file of several accounts (username, token or token_env, organization, repo) fetched concurrently')
+    parser.add_argument('--journal', metavar='FILE', help='Checkpoint journal of the saved repositories, removed when a run completes; '
+                        'each saved repository is committed, otherwise a run is saved all or nothing')
+    parser.add_argument('--resume', action='store_true', help='Skip the repositories and endpoints saved by an interrupted run, as recorded in --journal')
+    parser.add_argument('--stats', action='store_true', help='Print per-stage timings and request counts to stderr when done')
+    parser.add_argument('--stats-json', default=None, metavar='FILE', help='Write per-stage timings and request counts as JSON, "-" for stdout')
+    parser.add_argument('--profile', default=None, metavar='FILE', help='Write a cProfile dump of the run (read it with python -m pstats)')
+
+
+def parse_credentials(username_arg):
+    """ Split the username argument, asking for the password if it is not given
+    :param username_arg: string - GitHub username, or username:password pair
+    :return: tuple - (username, password) pair
     """
-    str = args.username.strip()
+    str = username_arg.strip()
     sub = str.split(':', 1 )
     len_sub = len(sub)
 
@@ -378,89 +521,137 @@ def main():
         pw = sub[1].strip()
     else :
         pw = getpass.getpass('Password:')
+    return (username, pw)
 
-    repo = args.repo.strip()
-    organization = username
-    if args.organization != None:
-        organization = args.organization.strip()
-
-    auth_pair = (username, pw)
-    # traffic_headers = {'Accept': 'application/vnd.github.spiderman-preview'}
-
-    # database config info 
-    db_config = {'host': args.host.strip().split(":")[0],
-                 'port': int(args.host.strip().split(":")[1]),
-                 'user': args.db_user.strip().split(":")[0],
-                 'password': args.db_user.strip().split(":")[1],
-                 'dbname': args.db_name.strip()
-                }
-    if repo == 'ALL':
-        # By default iterate over all repositories
-        repos = []
-        repos_response = send_request('repos', organization, auth_pair)
-        repos_json = repos_response[0]  # 1st element from requests.get()
-        # print(repos_json.json())
-        repos_links = repos_response[1].links  # 2nd element from requests.head()
-        # Error handling in case of {'documentation_url':'https://developer.github.com/v3','message':'Not Found'}
-        try:
-            err_msg = repos_json.json().get('message')
-            print(err_msg)
-            return 'Code done.'
-        except AttributeError:
-            # Add the repos from the first request
-            for repo in repos_json.json():
-                repos.append(repo['name'])
-            while repos_links.get('next'):
-                print('Retrieving all repositories...')
-                url = repos_links['next']['url']
-                repos_response = send_request_pagination(url, auth_pair)
-                for repo in repos_response[0].json():
-                    repos.append(repo['name'])
-                repos_links = repos_response[1].links
-            # Iterate over collected repos list:
-            #print(len(repos))  # commenting out the next 12 lines, correctly retrieves all org. repos
-            for repo in repos:
-                traffic_response = send_request('traffic', organization, auth_pair, repo).json()
-                clones_response = send_request('clones', organization, auth_pair, repo).json()
-                referrers_response = send_request('referrers', organization, auth_pair, repo).json()
-                if args.print_screen == 'True': 
-                   print(json_to_table(repo, traffic_response, 'traffic'))
-                   print(json_to_table(repo, clones_response, 'clones'))
-                   print(json_to_table_referrers(repo, referrers_response))
-                # Saving data
-                if args.save_csv == 'save_csv':
-                    store_csv(csv_file_name, repo, traffic_response, 'views')
-                    store_csv(csv_file_name_clones, repo, clones_response, 'clones')
-                    store_csv_referrers(csv_file_name_referrers, repo, referrers_response)
-                elif args.save_csv.strip() == 'set_db':
-                    store_db(db_config, repo, traffic_response, 'views')
-                    store_db(db_config, repo, clones_response, 'clones')
-                    store_db(db_config, repo, referrers_response)
 
+def make_cache(args):
+    """ The response cache of a run, None with --no-cache """
+    # Conditional requests against the on-disk cache, 304s are free of rate limit cost
+    return None if args.no_cache else HttpCache(args.cache_dir)
 
-    else: 
-        # Or just request 1 repo
-        traffic_response = send_request('traffic', organization, auth_pair, repo).json()
-        # Error handling in case of {'documentation_url': 'https://developer.github.com/v3', 'message': 'Not Found'}
-        if traffic_response.get('message'):
-            print(traffic_response['message'])
-            return 'Code done.'
-        clones_response = send_request('clones', organization, auth_pair, repo).json()
-        referrers_response = send_request('referrers', organization, auth_pair, repo).json()
-        if args.print_screen == 'True': 
-           print(json_to_table(repo, traffic_response, 'traffic'))
-           print(json_to_table(repo, clones_response, 'clones'))
-           print(json_to_table_referrers(repo, referrers_response)) 
-        # Saving data
-        if args.save_csv == 'save_csv':
-            store_csv(csv_file_name, repo, traffic_response, 'views')
-            store_csv(csv_file_name_clones, repo, clones_response, 'clones')
-            store_csv_referrers(csv_file_name_referrers, repo, referrers_response)
-        elif args.save_csv.strip() == 'set_db':
-            store_db(db_config, repo, traffic_response, 'views')
-            store_db(db_config, repo, clones_response, 'clones')
-            store_db(db_config, repo, referrers_response)
 
+def make_client(args, auth_pair, cache=None, stats=None):
+    """ The pooled HTTP client of a run, with its rate limiter
+    :param cache: HttpCache - if specified, the response cache, it may be shared between clients
+    :param stats: Stats - if specified, where requests are counted and timed
+    """
+    # One keep-alive session for the whole run, sized so every worker gets a connection
+    return Client(auth_pair, pool_size=max(10, args.workers * 3),
+                  limiter=RateLimiter(max_retries=args.max_retries), cache=cache, stats=stats)
+
+
+def parse_db_config(args):
+    """ database config info """
+    return {'host': args.host.strip().split(":")[0],
+            'port': int(args.host.strip().split(":")[1]),
+            'user': args.db_user.strip().split(":")[0],
+            'password': args.db_user.strip().split(":")[1],
+            'dbname': args.db_name.strip()
+           }
+
+
+def make_filter(args):
+    """ The repository filter of a run and the state it keeps between runs
+    :return: tuple - (State or None, RepoFilter)
+    """
+    state = State(args.state_file) if args.incremental or args.skip_dormant is not None else None
+    repo_filter = RepoFilter(args.include, args.exclude, args.skip_archived, args.skip_forks,
+                             args.skip_dormant, args.dormant_interval, state)
+    return state, repo_filter
+
+
+def write_stats(args, stats, store, cache):
+    """ Print or save the instrumentation of a run, as selected by --stats and --stats-json """
+    if store is not None:
+        stats.count('rows_written', store.rows)
+    if cache is not None:
+        stats.count('cache_hits', cache.hits)
+        stats.count('cache_misses', cache.misses)
+    if args.stats:
+        stats.write_summary(sys.stderr)
+    if args.stats_json == '-':
+        stats.write_json(sys.stdout)
+    elif args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            stats.write_json(f)
+
+
+def main(argv=None):
+    """ Run main code logic, see build_parser() for the arguments """
+    argv = sys.argv[1:] if argv is None else argv
+    # Subcommands that work on stored data rather than the API
+    if argv and argv[0] == 'merge':
+        from . import merge
+        return merge.main(argv[1:])
+    if argv and argv[0] == 'report':
+        from . import report
+        return report.main(argv[1:])
+    if argv and argv[0] == 'compact':
+        from . import compact
+        return compact.main(argv[1:])
+    if argv and argv[0] == 'serve':
+        from . import daemon
+        return daemon.main(argv[1:])
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+    repo = args.repo.strip()
+    cache = make_cache(args)
+    stats = Stats() if args.stats or args.stats_json else None
+    if args.config:
+        try:
+            accounts = load_accounts(args.config, repo)
+        except (IOError, OSError, ValueError) as err:
+            parser.error(str(err))
+        run = lambda store: collect_accounts(args, accounts, renderer, store, repo_filter, cache, stats, journal)
+    else:
+        auth_pair = parse_credentials(args.username)
+        organization = auth_pair[0]
+        if args.organization != None:
+            organization = args.organization.strip()
+        client = make_client(args, auth_pair, cache, stats)
+        # traffic_headers = {'Accept': 'application/vnd.github.spiderman-preview'}
+        run = lambda store: collect(args, client, renderer, store, organization, auth_pair, repo, repo_filter, journal)
+
+    db_config = parse_db_config(args)
+    renderer = render.Renderer(sys.stdout, args.format) if args.print_screen == 'True' else None
+    state, repo_filter = make_filter(args)
+    store = open_store(args, db_config, state)
+    journal = None
+    if args.journal and store is not None and (repo == 'ALL' or args.config):
+        # Saved repositories are committed one by one, so an interrupted run can be resumed
+        journal = Journal(args.journal, args.resume)
+        if journal.resumed:
+            sys.stderr.write('Resuming, %d endpoints already saved\n' % journal.resumed)
+    if stats is not None:
+        renderer = stats.timed(renderer, 'render')
+        store = stats.timed(store, 'store')
+    profiler = None
+    if args.profile:
+        # Also profiles the worker threads, which do the fetching with -w and --config
+        profiler = Profiler()
+        profiler.enable()
+    completed = False
+    try:
+        if store is None:
+            result = run(None)
+        else:
+            with store:
+                result = run(store)
+        completed = True
+    finally:
+        if journal is not None:
+            journal.close(complete=completed and journal.finished)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+    if state is not None:
+        state.save()
+    if stats is not None:
+        write_stats(args, stats, store, cache)
+    return result
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+""" Merge CSV snapshots into one deduplicated, sorted CSV
+
+Every run writes a new timestamped CSV and consecutive runs overlap by up to
+13 days. Snapshots are merged on the (repository_name, date/site) key and the
+value from the newest snapshot wins. Rows are sorted in bounded chunks that are
+spilled to temporary files, then k-way merged, so memory stays flat however
+many snapshots are merged.
+"""
+import argparse
+import csv
+import glob
+import heapq
+import os
+import re
+import shutil
+import tempfile
+
+
+# Prefix of the file names written by gts, such as 2017-07-30-11h-17m-traffic-stats.csv
+snapshot_name = re.compile(r'\d{4}-\d{2}-\d{2}-\d{2}h-\d{2}m-')
+
+
+def snapshot_files(paths):
+    """ Expand directories to the CSVs they contain and order snapshots oldest first
+    The timestamp prefix of the file names written by gts makes name order chronological.
+    Other CSVs, such as earlier merged.csv outputs, come first so that snapshots override them.
+    :param paths: list - CSV files and/or directories
+    :return: list - CSV file paths
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '*.csv')))
+        else:
+            files.append(path)
+    return sorted(files, key=lambda f: (snapshot_name.match(os.path.basename(f)) is not None, os.path.basename(f)))
+
+
+def read_header(file_path):
+    with open(file_path, newline='') as f:
+        return next(csv.reader(f), None)
+
+
+def spill(rows, directory):
+    """ Sort a chunk of tagged rows and write it to a temporary run file """
+    rows.sort()
+    fd, run_path = tempfile.mkstemp(suffix='.csv', dir=directory)
+    with os.fdopen(fd, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return run_path
+
+
+def read_run(run_path):
+    with open(run_path, newline='') as f:
+        for row in csv.reader(f):
+            # Restore the integer ordering fields of the tag
+            row[2] = int(row[2])
+            row[3] = int(row[3])
+            yield row
+
+
+def iter_merged(paths, chunk_size=1000000):
+    """ Stream the deduplicated rows of many snapshots in (repository_name, date/site) order
+    :param paths: list - CSV files and/or directories, all with the same header
+    :param chunk_size: int - rows sorted in memory before spilling to a temporary file
+    :return: tuple - (header, generator of rows)
+    """
+    files = snapshot_files(paths)
+    if not files:
+        raise ValueError('No CSV files to merge')
+    headers = set()
+    for file_path in files:
+        header = read_header(file_path)
+        if header:
+            headers.add(tuple(header))
+    if len(headers) > 1:
+        raise ValueError('The CSVs have different headers, merge each kind separately, e.g. '
+                         '*-traffic-stats.csv, *-clone-stats.csv and *-referrer-stats.csv')
+    header = list(headers.pop()) if headers else []
+    return header, _merge_rows(files, chunk_size)
+
+
+def _merge_rows(files, chunk_size):
+    directory = tempfile.mkdtemp(prefix='gts-merge-')
+    try:
+        runs = []
+        chunk = []
+        for index, file_path in enumerate(files):
+            with open(file_path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for line_number, row in enumerate(reader):
+                    if len(row) < 2:
+                        continue
+                    # Tagged row: key, then snapshot index and line so the newest sorts last
+                    chunk.append([row[0], row[1], index, line_number] + row[2:])
+                    if len(chunk) >= chunk_size:
+                        runs.append(read_run(spill(chunk, directory)))
+                        chunk = []
+        chunk.sort()
+        runs.append(iter(chunk))
+
+        previous = None
+        for row in heapq.merge(*runs):
+            if previous is not None and previous[:2] != row[:2]:
+                yield previous[:2] + previous[4:]
+            previous = row
+        if previous is not None:
+            yield previous[:2] + previous[4:]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def merge(paths, output, chunk_size=1000000):
+    """ Merge snapshots into one CSV
+    :param paths: list - CSV files and/or directories, all with the same header
+    :param output: str - path of the merged CSV, replaced if it exists
+    :param chunk_size: int - rows sorted in memory before spilling to a temporary file
+    :return: int - number of rows written
+    """
+    files = [f for f in snapshot_files(paths) if os.path.abspath(f) != os.path.abspath(output)]
+    header, rows = iter_merged(files, chunk_size)
+    count = 0
+    tmp_output = output + '.tmp'
+    with open(tmp_output, 'w', newline='', buffering=1 << 16) as f:
+        writer = csv.writer(f, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    os.replace(tmp_output, output)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='gts merge', description='Merge CSV snapshots, keeping the newest value of each (repository, date/site)')
+    parser.add_argument('paths', nargs='+', help='CSV files or directories of CSV files of the same kind')
+    parser.add_argument('-o', '--output', default='merged.csv', help='Merged CSV [merged.csv]')
+    parser.add_argument('--chunk-size', default=1000000, type=int, help='Rows sorted in memory at a time [1000000]')
+    args = parser.parse_args(argv)
+    try:
+        count = merge(args.paths, args.output, args.chunk_size)
+    except ValueError as err:
+        parser.error(str(err))
+    print('Merged %d rows into %s' % (count, args.output))
+    return 'Code done.'
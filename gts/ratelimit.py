@@ -0,0 +1,135 @@
+""" Rate-limit aware scheduling of GitHub API requests """
+import random
+import threading
+import time
+
+
+class RateLimiter(object):
+    """ Tracks the rate limit budget reported in the X-RateLimit-* response headers,
+    paces requests once the budget runs low and decides when a response should be retried.
+    :param max_retries: int - number of retries for a single request
+    :param backoff: float - base delay in seconds of the exponential backoff
+    :param max_backoff: float - upper bound in seconds of a single backoff delay
+    :param pace_below: float - fraction of the limit under which requests are spread
+                               evenly over the time left until the reset
+    :param clock: function - returns the current epoch time, for testing
+    :param sleep: function - blocks for a number of seconds, for testing
+    """
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries=5, backoff=1.0, max_backoff=60.0, pace_below=0.2,
+                 clock=time.time, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pace_below = pace_below
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.next_slot = 0.0
+        # Counters
+        self.requests = 0
+        self.retries = 0
+        self.wait_time = 0.0
+
+    def wait(self, seconds):
+        """ Sleep for a number of seconds and account for it in wait_time """
+        if seconds <= 0:
+            return
+        with self.lock:
+            self.wait_time += seconds
+        self.sleep(seconds)
+
+    def before_request(self):
+        """ Block until the next request can be sent without exceeding the budget """
+        with self.lock:
+            self.requests += 1
+            now = self.clock()
+            slot = max(now, self.next_slot)
+            if self.remaining is not None and self.reset is not None and self.reset > now:
+                if self.remaining <= 0:
+                    # Budget exhausted: every request waits for the window to reset
+                    slot = max(slot, self.reset)
+                    self.next_slot = slot
+                    self.remaining = None
+                elif self.limit and self.remaining < self.limit * self.pace_below:
+                    # Budget running low: spread what is left over the rest of the window
+                    self.next_slot = slot + max(0.0, self.reset - slot) / self.remaining
+                    self.remaining -= 1
+                else:
+                    self.remaining -= 1
+            delay = slot - now
+        self.wait(delay)
+
+    def update(self, response):
+        """ Record the budget reported by a response
+        :param response: response - the requests response
+        """
+        headers = response.headers
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = float(headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError):
+            return
+        with self.lock:
+            limit = headers.get('X-RateLimit-Limit')
+            if limit and limit.isdigit():
+                self.limit = int(limit)
+            if self.reset is None or reset > self.reset:
+                # A new window started
+                self.reset = reset
+                self.remaining = remaining
+                self.next_slot = 0.0
+            elif reset == self.reset and (self.remaining is None or remaining < self.remaining):
+                # Concurrent responses arrive out of order, keep the lowest budget seen
+                self.remaining = remaining
+
+    def is_rate_limited(self, response):
+        """ Whether a 403 is a primary or secondary (abuse) rate limit rather than a permission error """
+        if response.status_code != 403:
+            return False
+        if 'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0':
+            return True
+        try:
+            message = response.json().get('message', '')
+        except (ValueError, AttributeError):
+            return False
+        message = message.lower()
+        return 'rate limit' in message or 'abuse' in message
+
+    def retry_delay(self, response, attempt):
+        """ Decide whether a response should be retried
+        :param response: response - the requests response, None after a connection error
+        :param attempt: int - number of retries already made for this request
+        :return: float - seconds to wait before retrying, or None if the response is final
+        """
+        if attempt >= self.max_retries:
+            return None
+        if response is not None:
+            if response.status_code not in self.retry_statuses and not self.is_rate_limited(response):
+                return None
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                try:
+                    return max(0.0, float(response.headers['X-RateLimit-Reset']) - self.clock()) + 1
+                except (KeyError, ValueError):
+                    pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def counters(self):
+        """ Return the request, retry and wait counters as a dict """
+        with self.lock:
+            return {'requests': self.requests,
+                    'retries': self.retries,
+                    'wait_time': self.wait_time,
+                    'remaining': self.remaining}
@@ -0,0 +1,152 @@
+""" Compact typed representation of the stats of a repository
+
+An API response is parsed once into a RepoStats, which every output
+(printing, CSV, SQLite, Postgres, incremental state) reads from, instead of
+each of them walking the JSON and slicing timestamps again. Daily series are
+kept as array columns of integers, dates as proleptic Gregorian ordinals.
+Dates are converted from and to 'YYYY-MM-DD' strings through memo tables,
+as a run only ever sees a few distinct days.
+"""
+import datetime
+from array import array
+
+_ordinals = {}
+_dates = {}
+
+
+def date_ordinal(timestamp):
+    """ Ordinal of the day of a GitHub timestamp such as 2017-07-30T00:00:00Z """
+    day = timestamp[0:10]
+    ordinal = _ordinals.get(day)
+    if ordinal is None:
+        ordinal = _ordinals[day] = datetime.date(int(day[0:4]), int(day[5:7]), int(day[8:10])).toordinal()
+        _dates[ordinal] = day
+    return ordinal
+
+
+def date_string(ordinal):
+    """ 'YYYY-MM-DD' of a day ordinal """
+    day = _dates.get(ordinal)
+    if day is None:
+        day = _dates[ordinal] = datetime.date.fromordinal(ordinal).isoformat()
+        _ordinals[day] = ordinal
+    return day
+
+
+class Series(object):
+    """ Daily views or clones of a repository, with the totals of the window
+    :param count: int - total count over the window
+    :param uniques: int - total uniques over the window
+    :param dates: array - day ordinals
+    :param counts: array - count per day
+    :param day_uniques: array - uniques per day
+    """
+
+    __slots__ = ('count', 'uniques', 'dates', 'counts', 'day_uniques')
+
+    def __init__(self, count=0, uniques=0, dates=None, counts=None, day_uniques=None):
+        self.count = count
+        self.uniques = uniques
+        self.dates = dates if dates is not None else array('l')
+        self.counts = counts if counts is not None else array('l')
+        self.day_uniques = day_uniques if day_uniques is not None else array('l')
+
+    @classmethod
+    def from_json(cls, json_response, response_type):
+        """ Parse a views or clones response
+        :param json_response: json - the json input
+        :param response_type: str - 'views', 'clones'
+        """
+        rows = json_response[response_type]
+        return cls(json_response['count'], json_response['uniques'],
+                   array('l', [date_ordinal(row['timestamp']) for row in rows]),
+                   array('l', [row['count'] for row in rows]),
+                   array('l', [row['uniques'] for row in rows]))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def rows(self):
+        """ Iterate over the days as ('YYYY-MM-DD', count, uniques) tuples """
+        return zip(map(date_string, self.dates), self.counts, self.day_uniques)
+
+    def select(self, indexes):
+        """ Copy holding only the days at indexes, totals are kept as is """
+        return Series(self.count, self.uniques,
+                      array('l', [self.dates[i] for i in indexes]),
+                      array('l', [self.counts[i] for i in indexes]),
+                      array('l', [self.day_uniques[i] for i in indexes]))
+
+    def to_json(self, response_type):
+        """ The response in the shape of the GitHub API """
+        return {'count': self.count, 'uniques': self.uniques,
+                response_type: [{'timestamp': day + 'T00:00:00Z', 'count': count, 'uniques': uniques}
+                                for day, count, uniques in self.rows()]}
+
+
+class Referrers(object):
+    """ Top referring sites of a repository
+    :param sites: list - site names
+    :param counts: array - views per site
+    :param uniques: array - unique visitors per site
+    """
+
+    __slots__ = ('sites', 'counts', 'uniques')
+
+    def __init__(self, sites=None, counts=None, uniques=None):
+        self.sites = sites if sites is not None else []
+        self.counts = counts if counts is not None else array('l')
+        self.uniques = uniques if uniques is not None else array('l')
+
+    @classmethod
+    def from_json(cls, json_response):
+        return cls([row['referrer'] for row in json_response],
+                   array('l', [row['count'] for row in json_response]),
+                   array('l', [row['uniques'] for row in json_response]))
+
+    def __len__(self):
+        return len(self.sites)
+
+    def rows(self):
+        """ Iterate over the sites as (site, count, uniques) tuples """
+        return zip(self.sites, self.counts, self.uniques)
+
+    def to_json(self):
+        return [{'referrer': site, 'count': count, 'uniques': uniques} for site, count, uniques in self.rows()]
+
+
+class RepoStats(object):
+    """ Stats of one repository, built once from the API responses and shared by every output
+    :param repo: str - the GitHub repository name
+    :param views: Series - daily views, None if not fetched
+    :param clones: Series - daily clones, None if not fetched
+    :param referrers: Referrers - referring sites, None if not fetched
+    """
+
+    __slots__ = ('repo', 'views', 'clones', 'referrers')
+
+    def __init__(self, repo, views=None, clones=None, referrers=None):
+        self.repo = repo
+        self.views = views
+        self.clones = clones
+        self.referrers = referrers
+
+    @classmethod
+    def from_json(cls, repo, traffic_response, clones_response, referrers_response):
+        """ Parse the responses of a repository, None responses stay None """
+        return cls(repo,
+                   Series.from_json(traffic_response, 'views') if traffic_response is not None else None,
+                   Series.from_json(clones_response, 'clones') if clones_response is not None else None,
+                   Referrers.from_json(referrers_response) if referrers_response is not None else None)
+
+    def endpoints(self):
+        """ Names of the endpoints held, see gts.journal """
+        return [endpoint for endpoint, part in (('traffic', self.views), ('clones', self.clones),
+                                                ('referrers', self.referrers)) if part is not None]
+
+    def is_complete(self):
+        return self.views is not None and self.clones is not None and self.referrers is not None
+
+    def is_all_zero(self):
+        """ Whether the repository had no views, clones or referrals in the window """
+        return not self.views.count and not self.clones.count and not any(self.referrers.counts)
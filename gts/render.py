@@ -0,0 +1,105 @@
+""" Streaming output of traffic stats: aligned tables, TSV or JSON Lines """
+import json
+import sys
+
+
+formats = ('table', 'tsv', 'jsonl')
+
+# (title, key label, count label, uniques label) of each kind of table
+table_labels = {
+    'traffic': ('Visitors', 'Date', 'Views', 'Unique visitors'),
+    'clones': ('Git clones', 'Date', 'Clones', 'Unique cloners'),
+    'referrers': ('Referring sites', 'Site', 'Views', 'Unique visitors'),
+}
+
+
+class Renderer(object):
+    """ Writes the stats of each repository straight to a stream as it arrives.
+    'table' is for people: one table per metric, columns sized from the data.
+    'tsv' and 'jsonl' are for piping into other tools: one line per data point
+    (TSV) or per repository (JSON Lines).
+    :param stream: file - where to write, sys.stdout by default
+    :param fmt: str - 'table', 'tsv' or 'jsonl'
+    """
+
+    def __init__(self, stream=None, fmt='table'):
+        if fmt not in formats:
+            raise ValueError('Unknown output format: %s' % fmt)
+        self.stream = stream or sys.stdout
+        self.fmt = fmt
+        self.header_written = False
+
+    def write(self, stats):
+        """ Render the stats of one repository
+        :param stats: RepoStats - the parsed stats, parts not fetched in this run are None (see --resume)
+        """
+        if self.fmt == 'table':
+            for part, response_type in ((stats.views, 'traffic'), (stats.clones, 'clones'),
+                                        (stats.referrers, 'referrers')):
+                if part is not None:
+                    self.table(stats.repo, part, response_type)
+        elif self.fmt == 'tsv':
+            self.tsv(stats)
+        else:
+            # Compared with None, an empty series or referrer list is falsy
+            self.stream.write(json.dumps({'repo': stats.repo,
+                                          'views': None if stats.views is None else stats.views.to_json('views'),
+                                          'clones': None if stats.clones is None else stats.clones.to_json('clones'),
+                                          'referrers': None if stats.referrers is None else stats.referrers.to_json()},
+                                         separators=(',', ':')) + '\n')
+
+    def error(self, repo, message):
+        """ Report a repository whose stats could not be fetched, kept out of machine output """
+        if self.fmt == 'table':
+            self.stream.write('> ' + repo + ' - ' + message + '\n\n')
+        else:
+            sys.stderr.write(repo + ': ' + message + '\n')
+
+    def table(self, repo, part, response_type):
+        """ Write one table: title, column labels, totals and a row per date or site
+        :param repo: str - the GitHub repository name
+        :param part: Series, Referrers - the parsed views, clones or referrers
+        :param response_type: str - 'traffic', 'clones' or 'referrers'
+        """
+        title, label0, label1, label2 = table_labels[response_type]
+        if response_type == 'referrers':
+            total_count = str(sum(part.counts))
+            total_uniques = str(sum(part.uniques))
+        else:
+            total_count = str(part.count)
+            total_uniques = str(part.uniques)
+        rows = [('Totals', total_count, total_uniques)]
+        rows.extend((key, str(count), str(uniques)) for key, count, uniques in part.rows())
+
+        """ Table template
+        > repo_name - title
+        label0      label1  label2
+        Totals      #       #
+        date/site   #       #
+        ...         ...     ...
+        """
+        width0 = max(len(label0), max(len(row[0]) for row in rows)) + 2
+        width1 = max(len(label1), max(len(row[1]) for row in rows)) + 2
+        line = '%-*s%-*s%s\n'
+        lines = ['> ' + repo + ' - ' + title + '\n', line % (width0, label0, width1, label1, label2)]
+        lines.extend(line % (width0, row[0], width1, row[1], row[2]) for row in rows)
+        lines.append('\n')
+        self.stream.write(''.join(lines))
+
+    def tsv(self, stats):
+        """ Write one line per data point: repository_name, metric, date/site, count, uniques """
+        if not self.header_written:
+            self.stream.write('repository_name\tmetric\tdate_or_site\tcount\tuniques\n')
+            self.header_written = True
+        repo = stats.repo
+        lines = []
+        for metric, series in (('views', stats.views), ('clones', stats.clones)):
+            if series is not None:
+                lines.extend('%s\t%s\t%s\t%d\t%d\n' % (repo, metric, day, count, uniques)
+                             for day, count, uniques in series.rows())
+        if stats.referrers is not None:
+            for site, count, uniques in stats.referrers.rows():
+                # Tabs and newlines cannot appear in the fields of a TSV line
+                site = site.replace('\t', ' ').replace('\n', ' ')
+                lines.append('%s\treferrers\t%s\t%d\t%d\n' % (repo, site, count, uniques))
+        self.stream.write(''.join(lines))
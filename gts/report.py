@@ -0,0 +1,221 @@
+""" Aggregate stored traffic history without calling the GitHub API
+
+Reads the CSV snapshots (deduplicated through gts.merge) or a SQLite history
+written with "set_sqlite" as one stream of rows sorted by repository and date,
+and computes totals, top repositories, week-over-week deltas and rolling
+averages in a single pass.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+from collections import deque
+
+from . import compact, merge
+
+
+def parse_date(date):
+    return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+
+class Aggregator(object):
+    """ Single pass aggregation of daily (repo, date, count, uniques) rows.
+    Only the trailing two weeks of each repository and one value per day for the
+    whole organization are kept, so memory does not grow with the history length.
+    Periods rolled up by gts compact only count in the totals.
+    :param window: int - days in a week-over-week window and in the rolling average
+    :param end: str - if specified, last day of the report (YYYY-MM-DD), later rows are left out
+    """
+
+    def __init__(self, window=7, end=None):
+        self.window = window
+        self.end = end
+        self.repos = {}
+        self.daily = {}
+        self.first_date = None
+        self.last_date = None
+
+    def total(self, repo, date, count, uniques):
+        """ Add to the totals of a repository, return its stats """
+        stats = self.repos.get(repo)
+        if stats is None:
+            stats = self.repos[repo] = {'count': 0, 'uniques': 0, 'recent': deque(maxlen=2 * self.window)}
+        stats['count'] += count
+        stats['uniques'] += uniques
+        if self.first_date is None or date < self.first_date:
+            self.first_date = date
+        if self.last_date is None or date > self.last_date:
+            self.last_date = date
+        return stats
+
+    def add(self, repo, date, count, uniques):
+        """ Add one daily row, dates must be YYYY-MM-DD strings """
+        if self.end is not None and date > self.end:
+            return
+        stats = self.total(repo, date, count, uniques)
+        stats['recent'].append((date, count))
+        self.daily[date] = self.daily.get(date, 0) + count
+
+    def add_period(self, repo, period, start, count, uniques):
+        """ Add a week or month rolled up by gts compact, it is left out of the daily
+        series, the rolling average and the week-over-week windows
+        """
+        if self.end is not None and start > self.end:
+            return
+        self.total(repo, start, count, uniques)
+
+    def weeks(self, recent, end):
+        """ Sums of the last and the previous window ending at `end` """
+        last = previous = 0
+        for date, count in recent:
+            age = (end - parse_date(date)).days
+            if 0 <= age < self.window:
+                last += count
+            elif self.window <= age < 2 * self.window:
+                previous += count
+        return last, previous
+
+    def result(self, top=10):
+        """ The report as a dict, the week-over-week windows end on `end` or the latest date
+        :param top: int - number of repositories in the top list
+        :return: dict - totals, top repositories and the org-wide daily series
+        """
+        end = self.end or self.last_date
+        if self.first_date is None:
+            return {'repositories': 0, 'top': [], 'daily': []}
+        end_date = parse_date(end)
+        repos = []
+        for repo, stats in self.repos.items():
+            last, previous = self.weeks(stats['recent'], end_date)
+            repos.append({'repo': repo, 'count': stats['count'], 'uniques': stats['uniques'],
+                          'last_week': last, 'previous_week': previous, 'delta': last - previous})
+        repos.sort(key=lambda r: (-r['count'], r['repo']))
+
+        # Org-wide daily series with a trailing rolling average, missing days count as 0
+        daily = []
+        history = deque(maxlen=self.window)
+        day = parse_date(min(self.daily)) if self.daily else end_date + datetime.timedelta(days=1)
+        while day <= end_date:
+            date = day.isoformat()
+            history.append(self.daily.get(date, 0))
+            daily.append({'date': date, 'count': self.daily.get(date, 0),
+                          'rolling_average': float(sum(history)) / self.window})
+            day += datetime.timedelta(days=1)
+
+        last_week = sum(r['last_week'] for r in repos)
+        previous_week = sum(r['previous_week'] for r in repos)
+        return {'first_date': self.first_date,
+                'last_date': end,
+                'repositories': len(repos),
+                'count': sum(r['count'] for r in repos),
+                'uniques': sum(r['uniques'] for r in repos),
+                'last_week': last_week,
+                'previous_week': previous_week,
+                'delta': last_week - previous_week,
+                'top': repos[:top],
+                'daily': daily}
+
+
+def csv_rollups(paths, metric):
+    """ (repo, period, start, count, uniques) periods rolled up by gts compact in the directories of paths """
+    kind = 'traffic' if metric == 'views' else 'clone'
+    for path in paths:
+        rollup_path = os.path.join(path, kind + '-rollup.csv')
+        if os.path.isdir(path) and os.path.exists(rollup_path):
+            for (repo, period, start), (count, uniques) in sorted(compact.read_rollup(rollup_path).items()):
+                yield repo, period, start, count, uniques
+
+
+def csv_rows(paths, metric):
+    """ Deduplicated (repo, date, count, uniques) rows of the CSV snapshots of a metric """
+    files = [f for f in merge.snapshot_files(paths)
+             if (merge.read_header(f) or [])[1:3] == ['date', metric]]
+    if not files:
+        return
+    header, rows = merge.iter_merged(files)
+    for row in rows:
+        yield row[0], row[1], int(row[2]), int(row[3])
+
+
+def sqlite_query(path, sql, metric):
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    try:
+        for row in conn.execute(sql, (metric,)):
+            yield row
+    finally:
+        conn.close()
+
+
+def sqlite_rows(path, metric):
+    """ (repo, date, count, uniques) rows of a SQLite history """
+    return sqlite_query(path, 'SELECT repo, date, count, uniques FROM traffic_daily WHERE metric = ? '
+                              'ORDER BY repo, date', metric)
+
+
+def sqlite_rollups(path, metric):
+    """ (repo, period, start, count, uniques) periods of a SQLite history rolled up by gts compact """
+    return sqlite_query(path, 'SELECT repo, period, start, count, uniques FROM traffic_rollup WHERE metric = ? '
+                              'ORDER BY repo, start', metric)
+
+
+def percent(delta, previous):
+    if not previous:
+        return 'n/a'
+    return '%+.1f%%' % (100.0 * delta / previous)
+
+
+def format_report(report, metric, out):
+    """ Write a report as tables, in the layout of the fetch output """
+    label = metric.capitalize()
+    if not report['repositories']:
+        out.write('No %s data found.\n' % metric)
+        return
+    out.write('> Report - %s from %s to %s, %d repositories\n'
+              % (label, report['first_date'], report['last_date'], report['repositories']))
+    out.write('Totals\t\t%s\tUniques\tLast 7d\tPrev 7d\tWoW\n' % label)
+    out.write('All\t\t%d\t%d\t%d\t%d\t%s\n\n' % (report['count'], report['uniques'], report['last_week'],
+                                                   report['previous_week'],
+                                                   percent(report['delta'], report['previous_week'])))
+    width = max([len('Repository')] + [len(r['repo']) for r in report['top']])
+    out.write('> Top %d repositories\n' % len(report['top']))
+    out.write('%-*s  %s\tUniques\tLast 7d\tPrev 7d\tWoW\n' % (width, 'Repository', label))
+    for r in report['top']:
+        out.write('%-*s  %d\t%d\t%d\t%d\t%s\n' % (width, r['repo'], r['count'], r['uniques'], r['last_week'],
+                                               r['previous_week'], percent(r['delta'], r['previous_week'])))
+    out.write('\n> Daily - all repositories\n')
+    out.write('Date\t\t%s\t7d avg\n' % label)
+    for day in report['daily'][-14:]:
+        out.write('%s\t%d\t%.1f\n' % (day['date'], day['count'], day['rolling_average']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='gts report', description='Aggregate stored traffic history, without calling the GitHub API')
+    parser.add_argument('paths', nargs='*', help='CSV snapshots or directories of CSV snapshots')
+    parser.add_argument('--sqlite', default=None, help='Read a SQLite history written with "set_sqlite" instead of CSVs')
+    parser.add_argument('-m', '--metric', default='views', choices=['views', 'clones'], help='Metric to report [views]')
+    parser.add_argument('-n', '--top', default=10, type=int, help='Number of top repositories [10]')
+    parser.add_argument('--end', default=None, help='Last day of the report and of the week-over-week comparison (YYYY-MM-DD) [latest date]')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+    if not args.paths and not args.sqlite:
+        parser.error('give CSV paths or --sqlite')
+
+    if args.sqlite:
+        rollups, rows = sqlite_rollups(args.sqlite, args.metric), sqlite_rows(args.sqlite, args.metric)
+    else:
+        rollups, rows = csv_rollups(args.paths, args.metric), csv_rows(args.paths, args.metric)
+    aggregator = Aggregator(end=args.end)
+    for repo, period, start, count, uniques in rollups:
+        aggregator.add_period(repo, period, start, count, uniques)
+    for repo, date, count, uniques in rows:
+        aggregator.add(repo, date, count, uniques)
+    report = aggregator.result(args.top)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        format_report(report, args.metric, sys.stdout)
+    return 'Code done.'
@@ -0,0 +1,130 @@
+""" Embedded SQLite history of traffic stats, indexed for range queries across years """
+import datetime
+import sqlite3
+import threading
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS traffic_daily(
+    repo    TEXT    NOT NULL,
+    metric  TEXT    NOT NULL,   -- 'views' or 'clones'
+    date    TEXT    NOT NULL,   -- YYYY-MM-DD
+    count   INTEGER NOT NULL DEFAULT 0,
+    uniques INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repo, metric, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS traffic_daily_metric_date ON traffic_daily(metric, date);
+
+CREATE TABLE IF NOT EXISTS referrers(
+    repo          TEXT    NOT NULL,
+    snapshot_date TEXT    NOT NULL,   -- day the 14 day referrer totals were fetched
+    site          TEXT    NOT NULL,
+    count         INTEGER NOT NULL DEFAULT 0,
+    uniques       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repo, snapshot_date, site)
+) WITHOUT ROWID;
+
+-- Weekly and monthly sums of the days rolled up by gts compact
+CREATE TABLE IF NOT EXISTS traffic_rollup(
+    repo    TEXT    NOT NULL,
+    metric  TEXT    NOT NULL,   -- 'views' or 'clones'
+    period  TEXT    NOT NULL,   -- 'week' or 'month'
+    start   TEXT    NOT NULL,   -- YYYY-MM-DD, first day of the period
+    count   INTEGER NOT NULL DEFAULT 0,
+    uniques INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repo, metric, period, start)
+) WITHOUT ROWID;
+"""
+
+upsert_daily = "INSERT OR REPLACE INTO traffic_daily(repo, metric, date, count, uniques) VALUES (?, ?, ?, ?, ?)"
+upsert_referrers = "INSERT OR REPLACE INTO referrers(repo, snapshot_date, site, count, uniques) VALUES (?, ?, ?, ?, ?)"
+
+
+class SqliteStore(object):
+    """ Storage backend upserting fetched stats into a local SQLite file.
+    Like PostgresStore, a run is one transaction committed when it completes.
+    :param path: str - path of the SQLite database, created if missing
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(schema)
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.snapshot_date = datetime.date.today().isoformat()
+
+    def write(self, stats):
+        """ Upsert the stats of one repository
+        :param stats: RepoStats - the parsed stats, parts not fetched in this run are None (see --resume)
+        """
+        repo = stats.repo
+        daily = []
+        for metric, series in (('views', stats.views), ('clones', stats.clones)):
+            if series is not None:
+                daily.extend((repo, metric, date, count, uniques) for date, count, uniques in series.rows())
+        referrers = []
+        if stats.referrers is not None:
+            referrers = [(repo, self.snapshot_date, site, count, uniques)
+                         for site, count, uniques in stats.referrers.rows()]
+        with self.lock:
+            self.conn.executemany(upsert_daily, daily)
+            self.conn.executemany(upsert_referrers, referrers)
+            self.rows += len(daily) + len(referrers)
+
+    def query(self, metric, start=None, end=None, repos=None):
+        """ Daily rows of a metric in a date range, served from the indexes
+        :param metric: str - 'views' or 'clones'
+        :param start: str - first date (YYYY-MM-DD), inclusive
+        :param end: str - last date (YYYY-MM-DD), inclusive
+        :param repos: list - if specified, only these repositories
+        :return: list - (repo, date, count, uniques) tuples ordered by repo and date
+        """
+        sql = 'SELECT repo, date, count, uniques FROM traffic_daily WHERE metric = ? AND date BETWEEN ? AND ?'
+        params = [metric, start or '0000-00-00', end or '9999-99-99']
+        if repos:
+            sql += ' AND repo IN (%s)' % ', '.join('?' * len(repos))
+            params.extend(repos)
+        sql += ' ORDER BY repo, date'
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def totals(self, metric, start=None, end=None):
+        """ Per-repo sums of a metric in a date range, rolled up periods count if they start in the range
+        :return: list - (repo, count, uniques) tuples ordered by repo
+        """
+        sql = ('SELECT repo, SUM(count), SUM(uniques) FROM ('
+               'SELECT repo, count, uniques FROM traffic_daily WHERE metric = :metric AND date BETWEEN :start AND :end '
+               'UNION ALL '
+               'SELECT repo, count, uniques FROM traffic_rollup WHERE metric = :metric AND start BETWEEN :start AND :end) '
+               'GROUP BY repo ORDER BY repo')
+        params = {'metric': metric, 'start': start or '0000-00-00', 'end': end or '9999-99-99'}
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def rollback(self):
+        """ Drop the writes since the last commit """
+        with self.lock:
+            self.conn.rollback()
+
+    def close(self, commit=True):
+        """ Commit (or roll back) the transaction and close the database """
+        with self.lock:
+            try:
+                if commit:
+                    self.conn.commit()
+                else:
+                    self.conn.rollback()
+            finally:
+                self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
@@ -0,0 +1,122 @@
+""" Small JSON state persisted between runs, and the incremental collection built on it """
+import json
+import os
+
+from .record import RepoStats
+
+
+class State(object):
+    """ A JSON document split into named sections, written atomically on save
+    :param path: str - path of the state file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.data = {}
+
+    def section(self, name):
+        return self.data.setdefault(name, {})
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class IncrementalStore(object):
+    """ Storage backend wrapper that only passes on new or changed days.
+    GitHub returns a 14 day window, so consecutive daily runs overlap by 13 days.
+    For each repo and metric the state keeps a high-water mark (the latest date
+    stored) and the values of the days in the last window; days older than the
+    high-water mark that are not in that window were stored by an earlier run.
+    The state only advances when the wrapped store commits, and is restored when it rolls back.
+    Runs keeping a checkpoint journal commit after each repository, so the state file
+    is only rewritten every save_every commits and when the store is closed.
+    :param store: CsvStore, PostgresStore - the wrapped storage backend
+    :param state: State - where the high-water marks are kept
+    :param save_every: int - commits between two saves of the state file
+    """
+
+    def __init__(self, store, state, save_every=100):
+        self.store = store
+        self.state = state
+        self.save_every = save_every
+        self.commits = 0
+        self.seen = state.section('incremental')
+        # Entries of self.seen as of the last commit, for the repos changed since
+        self.undo = {}
+        self.kept = 0
+        self.skipped = 0
+
+    @property
+    def rows(self):
+        """ Rows written by the wrapped store, referrers included """
+        return self.store.rows
+
+    def changed(self, repo, series, response_type):
+        """ Copy of a views or clones series holding only new or changed days
+        :param repo: str - the GitHub repository name
+        :param series: Series - the parsed views or clones
+        :param response_type: str - 'views', 'clones'
+        :return: Series - the filtered series, totals are kept as is
+        """
+        if series is None:
+            return None
+        previous = self.seen.get(repo, {}).get(response_type, {'high_water': '', 'days': {}})
+        days = {}
+        keep = []
+        for i, (date, count, uniques) in enumerate(series.rows()):
+            value = [count, uniques]
+            days[date] = value
+            known = previous['days'].get(date)
+            if known == value or (known is None and date < previous['high_water']):
+                self.skipped += 1
+                continue
+            keep.append(i)
+        high_water = max([previous['high_water']] + list(days))
+        if (repo, response_type) not in self.undo:
+            self.undo[repo, response_type] = self.seen.get(repo, {}).get(response_type)
+        self.seen.setdefault(repo, {})[response_type] = {'high_water': high_water, 'days': days}
+        self.kept += len(keep)
+        return series.select(keep)
+
+    def write(self, stats):
+        self.store.write(RepoStats(stats.repo,
+                                   self.changed(stats.repo, stats.views, 'views'),
+                                   self.changed(stats.repo, stats.clones, 'clones'),
+                                   stats.referrers))
+
+    def commit(self):
+        self.store.commit()
+        self.undo = {}
+        self.commits += 1
+        if self.commits % self.save_every == 0:
+            self.state.save()
+
+    def rollback(self):
+        """ Roll back the wrapped store and the high-water marks advanced since the last commit """
+        self.store.rollback()
+        for (repo, response_type), entry in self.undo.items():
+            if entry is None:
+                self.seen[repo].pop(response_type, None)
+                if not self.seen[repo]:
+                    del self.seen[repo]
+            else:
+                self.seen[repo][response_type] = entry
+        self.undo = {}
+
+    def close(self, commit=True):
+        self.store.close(commit)
+        if commit:
+            self.state.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
@@ -0,0 +1,258 @@
+""" Low overhead instrumentation of a run, enabled with --stats or --stats-json
+
+Each stage (HTTP requests, JSON decoding, printing, saving) records its
+latencies into a histogram with fixed power-of-two buckets, so recording is
+a clock read, a bucket lookup and a few additions under a lock. HTTP
+requests are also counted by endpoint and status, with the bytes received.
+"""
+import bisect
+import json
+import threading
+import time
+
+from urllib.parse import urlparse
+
+# Bucket upper bounds in seconds, 10us doubling up to ~84s
+bucket_bounds = [0.00001 * 2 ** i for i in range(24)]
+
+
+class Histogram(object):
+    """ Latency histogram with fixed buckets, quantiles are bucket upper bounds """
+
+    def __init__(self):
+        self.buckets = [0] * (len(bucket_bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(bucket_bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bucket_bounds[i], self.max) if i < len(bucket_bounds) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5),
+                'p95': self.quantile(0.95),
+                'p99': self.quantile(0.99),
+                'max': self.max,
+                'buckets': dict((repr(bound), n) for bound, n in zip(bucket_bounds + [float('inf')], self.buckets) if n)}
+
+
+def endpoint_name(method, url):
+    """ URL template of a GitHub API call, e.g. GET /repos/{owner}/{repo}/traffic/views """
+    parts = urlparse(url).path.strip('/').split('/')
+    if len(parts) >= 2 and parts[0] in ('users', 'orgs'):
+        parts[1] = '{owner}'
+    elif len(parts) >= 3 and parts[0] == 'repos':
+        parts[1:3] = ['{owner}', '{repo}']
+    return '%s /%s' % (method, '/'.join(parts))
+
+
+class Timer(object):
+
+    __slots__ = ('stats', 'stage', 'start')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.observe(self.stage, time.perf_counter() - self.start)
+
+
+class NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+null_timer = NullTimer()
+
+
+class NullStats(object):
+    """ Stand-in used when instrumentation is off, every call is a no-op """
+    enabled = False
+
+    def timer(self, stage):
+        return null_timer
+
+    def observe(self, stage, seconds):
+        pass
+
+    def record_request(self, method, url, status, nbytes, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+
+class Stats(object):
+    """ Counters and latency histograms of a run, shared by all threads """
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.requests = {}
+        self.extra = {}
+
+    def timer(self, stage):
+        """ Context manager recording the time spent in its block under stage """
+        return Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.add(seconds)
+
+    def record_request(self, method, url, status, nbytes, seconds):
+        """ Count one HTTP request (a retried call counts once per attempt)
+        :param status: int - the response status, None if the connection failed
+        :param nbytes: int - size of the response body as received
+        """
+        key = (endpoint_name(method, url), status)
+        with self.lock:
+            counters = self.requests.get(key)
+            if counters is None:
+                counters = self.requests[key] = [0, 0]
+            counters[0] += 1
+            counters[1] += nbytes
+            histogram = self.stages.get('request')
+            if histogram is None:
+                histogram = self.stages['request'] = Histogram()
+            histogram.add(seconds)
+
+    def count(self, name, n=1):
+        """ Add to a plain counter such as retries or rows written """
+        with self.lock:
+            self.extra[name] = self.extra.get(name, 0) + n
+
+    def timed(self, target, stage):
+        """ Wrap a store or renderer so the time spent in its write() is recorded """
+        return target if target is None else Timed(target, stage, self)
+
+    def summary(self):
+        """ Return everything recorded as a JSON-serializable dict """
+        with self.lock:
+            return {'wall_time': time.perf_counter() - self.started,
+                    'stages': dict((name, h.as_dict()) for name, h in self.stages.items()),
+                    'requests': [{'endpoint': endpoint, 'status': status, 'count': c[0], 'bytes': c[1]}
+                                 for (endpoint, status), c in sorted(self.requests.items(), key=lambda kv: (kv[0][0], str(kv[0][1])))],
+                    'bytes': sum(c[1] for c in self.requests.values()),
+                    'counters': dict(self.extra)}
+
+    def write_json(self, stream):
+        json.dump(self.summary(), stream, indent=2, sort_keys=True)
+        stream.write('\n')
+
+    def write_summary(self, stream):
+        """ Print a human readable summary """
+        summary = self.summary()
+        stream.write('Stage      Count   Total s   Mean ms    p50 ms    p95 ms    Max ms\n')
+        for name in sorted(summary['stages']):
+            s = summary['stages'][name]
+            stream.write('%-8s %7d %9.3f %9.2f %9.2f %9.2f %9.2f\n'
+                         % (name, s['count'], s['total'], s['mean'] * 1000, s['p50'] * 1000,
+                            s['p95'] * 1000, s['max'] * 1000))
+        if summary['requests']:
+            width = max(len(r['endpoint']) for r in summary['requests'])
+            stream.write('\n%-*s  Status    Count       Bytes\n' % (width, 'Endpoint'))
+            for r in summary['requests']:
+                stream.write('%-*s  %6s %8d %11d\n' % (width, r['endpoint'], r['status'], r['count'], r['bytes']))
+        stream.write('\n')
+        for name in sorted(summary['counters']):
+            stream.write('%s: %s\n' % (name.replace('_', ' ').capitalize(), summary['counters'][name]))
+        stream.write('Bytes received: %d\nWall time: %.3f s\n' % (summary['bytes'], summary['wall_time']))
+
+
+class Timed(object):
+    """ Proxy of a store or renderer recording the duration of write() calls """
+
+    def __init__(self, target, stage, stats):
+        self.target = target
+        self.stage = stage
+        self.stats = stats
+
+    def write(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.target.write(*args)
+        finally:
+            self.stats.observe(self.stage, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+    def __enter__(self):
+        self.target.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.target.__exit__(exc_type, exc, tb)
+
+
+class Profiler(object):
+    """ cProfile of the calling thread and of every thread started while it is enabled,
+    such as the fetch workers of -w and --config, dumped as one merged profile
+    """
+
+    def __init__(self):
+        import cProfile
+
+        self.new_profile = cProfile.Profile
+        self.profiles = [cProfile.Profile()]
+        self.lock = threading.Lock()
+
+    def start_thread(self, frame, event, arg):
+        """ Profile hook of new threads, replaced by a profile of their own on the first event """
+        profile = self.new_profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows a single profiler, which already sees every thread
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def enable(self):
+        threading.setprofile(self.start_thread)
+        self.profiles[0].enable()
+
+    def disable(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+
+    def dump_stats(self, path):
+        import pstats
+
+        with self.lock:
+            stats = pstats.Stats(self.profiles[0])
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+        stats.dump_stats(path)
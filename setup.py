@@ -35,8 +35,8 @@ class PublishCommand(Command):
         except:
             pass
 
-        self.status('Building Source and Wheel (universal) distribution…')
-        os.system('{0} setup.py sdist bdist_wheel --universal'.format(sys.executable))
+        self.status('Building Source and Wheel distribution…')
+        os.system('{0} setup.py sdist bdist_wheel'.format(sys.executable))
 
         self.status('Uploading the package to PyPi via Twine…')
         os.system('twine upload dist/*')
@@ -56,14 +56,17 @@ setup(
     description="Get statistics on web traffic to your GitHub repositories.",
     author="Niel Chah, Anthony Bloomer",
     url="https://github.com/nchah/github-traffic-stats",
+    python_requires='>=3.7',
     install_requires=[
         'requests'
     ],
     extras_require = {
         'sql':  ["psycopg2"]
-    }
+    },
     classifiers=[
         'Intended Audience :: Developers',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
     cmdclass={
         'publish': PublishCommand,
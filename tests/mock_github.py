@@ -0,0 +1,249 @@
+""" A small local stand-in for the GitHub REST API, used by the offline tests.
+Serves the repository listing (with Link header pagination) and the three
+traffic endpoints with deterministic data derived from the repository name.
+"""
+import hashlib
+import json
+import threading
+import time
+import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def repo_seed(repo):
+    return zlib.crc32(repo.encode('utf-8')) & 0xffff
+
+
+def traffic_json(repo, kind):
+    """ Deterministic /traffic/views or /traffic/clones payload for a repo """
+    seed = repo_seed(repo)
+    rows = []
+    for day in range(14):
+        count = (seed + day * 7) % 23
+        uniques = count // 3 + (1 if count else 0)
+        rows.append({'timestamp': '2017-07-%02dT00:00:00Z' % (17 + day),
+                     'count': count, 'uniques': uniques})
+    return {'count': sum(r['count'] for r in rows),
+            'uniques': sum(r['uniques'] for r in rows),
+            kind: rows}
+
+
+def referrers_json(repo):
+    """ Deterministic /traffic/popular/referrers payload for a repo """
+    seed = repo_seed(repo)
+    return [{'referrer': 'Google', 'count': seed % 40, 'uniques': seed % 11},
+            {'referrer': 'github.com', 'count': seed % 13, 'uniques': seed % 5}]
+
+
+def repo_stats(repo):
+    """ The payloads of a repo parsed into a RepoStats, as the sinks receive them """
+    from gts.record import RepoStats
+    return RepoStats.from_json(repo, traffic_json(repo, 'views'), traffic_json(repo, 'clones'), referrers_json(repo))
+
+
+class MockGitHub(object):
+    """ Threaded HTTP server mimicking the parts of the GitHub API used by gts
+    :param repos: list - repository names owned by every organization
+    :param per_page: int - maximum page size of the repository listing
+    :param owners: list - if specified, the only users/organizations that exist
+    :param rate_limit: int - if specified, the request budget reported in X-RateLimit-* headers
+    :param metadata: dict - if specified, archived/fork/private/pushed_at overrides per repository
+    :param latency: float - seconds each response is delayed by, to mimic a remote server
+    """
+
+    def __init__(self, repos=None, per_page=100, owners=None, rate_limit=None, metadata=None, latency=0):
+        self.repos = list(repos or [])
+        self.metadata = metadata or {}
+        self.per_page = per_page
+        self.latency = latency
+        self.owners = owners
+        self.rate_limit = rate_limit
+        self.rate_remaining = rate_limit
+        self.rate_reset = int(time.time()) + 3600
+        self.failures = []
+        self.calls = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        self.url = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail(self, prefix, status, times=1, headers=None, body=None):
+        """ Answer the next `times` requests whose path starts with prefix with an error """
+        with self.lock:
+            self.failures.append([prefix, status, times, headers or {}, body or {'message': 'Server Error'}])
+
+    def count(self, method=None, prefix=''):
+        """ Number of recorded calls, optionally filtered by method and path prefix """
+        with self.lock:
+            return len([c for c in self.calls
+                        if (method is None or c[0] == method) and c[1].startswith(prefix)])
+
+    def authorizations(self):
+        """ Number of recorded calls per Authorization header """
+        with self.lock:
+            counts = {}
+            for c in self.calls:
+                counts[c[2]] = counts.get(c[2], 0) + 1
+            return counts
+
+    def repo_json(self, organization, name):
+        """ REST representation of a repository in the listing """
+        repo = {'name': name, 'full_name': organization + '/' + name, 'archived': False,
+                'fork': False, 'private': False, 'pushed_at': '2017-07-30T00:00:00Z'}
+        repo.update(self.metadata.get(name, {}))
+        repo['visibility'] = 'private' if repo['private'] else 'public'
+        return repo
+
+    def route(self, method, url, body=None):
+        """ Return (status, headers, body) for a request """
+        parsed = urlparse(url)
+        if method == 'POST' and parsed.path == '/graphql':
+            return self.route_graphql(json.loads(body.decode('utf-8')))
+        parts = parsed.path.strip('/').split('/')
+        query = parse_qs(parsed.query)
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'repos':
+            return self.route_repos(parts[1], parsed.path, query)
+        if len(parts) >= 5 and parts[0] == 'repos' and parts[3] == 'traffic':
+            repo = parts[2]
+            if repo not in self.repos:
+                return 404, {}, {'message': 'Not Found'}
+            endpoint = '/'.join(parts[4:])
+            if endpoint == 'views':
+                return 200, {}, traffic_json(repo, 'views')
+            if endpoint == 'clones':
+                return 200, {}, traffic_json(repo, 'clones')
+            if endpoint == 'popular/referrers':
+                return 200, {}, referrers_json(repo)
+        return 404, {}, {'message': 'Not Found'}
+
+    def route_repos(self, organization, path, query):
+        if self.owners is not None and organization not in self.owners:
+            return 404, {}, {'message': 'Not Found'}
+        per_page = min(int(query.get('per_page', ['30'])[0]), self.per_page)
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * per_page
+        body = [self.repo_json(organization, name) for name in self.repos[start:start + per_page]]
+        last = max(1, (len(self.repos) + per_page - 1) // per_page)
+        links = []
+        if page < last:
+            links.append('<%s%s?per_page=%d&page=%d>; rel="next"' % (self.url, path, per_page, page + 1))
+            links.append('<%s%s?per_page=%d&page=%d>; rel="last"' % (self.url, path, per_page, last))
+        headers = {'Link': ', '.join(links)} if links else {}
+        return 200, headers, body
+
+    def route_graphql(self, request):
+        """ Answer the repository listing query of gts.graphql, paginated with cursors """
+        variables = request.get('variables', {})
+        login = variables['login']
+        if self.owners is not None and login not in self.owners:
+            return 200, {}, {'data': {'repositoryOwner': None}}
+        first = min(int(variables.get('first', 100)), 100)
+        start = int(variables.get('after') or 0)
+        nodes = []
+        for name in self.repos[start:start + first]:
+            repo = self.repo_json(login, name)
+            nodes.append({'name': name, 'isArchived': repo['archived'], 'isFork': repo['fork'],
+                          'visibility': repo['visibility'].upper(), 'pushedAt': repo['pushed_at']})
+        end = start + len(nodes)
+        page_info = {'hasNextPage': end < len(self.repos), 'endCursor': str(end)}
+        return 200, {}, {'data': {'repositoryOwner': {'repositories': {'pageInfo': page_info, 'nodes': nodes}}}}
+
+    def handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def respond(self, send_body):
+                length = int(self.headers.get('Content-Length') or 0)
+                request_body = self.rfile.read(length) if length else None
+                if mock.latency:
+                    time.sleep(mock.latency)
+                with mock.lock:
+                    mock.calls.append((self.command, self.path, self.headers.get('Authorization')))
+                    mock.connections.add(self.client_address)
+                    failure = None
+                    for f in mock.failures:
+                        if f[2] > 0 and self.path.startswith(f[0]):
+                            f[2] -= 1
+                            failure = f
+                            break
+                    rate_headers = {}
+                    if mock.rate_limit is not None:
+                        mock.rate_remaining = max(0, mock.rate_remaining - 1)
+                        rate_headers = {'X-RateLimit-Limit': str(mock.rate_limit),
+                                        'X-RateLimit-Remaining': str(mock.rate_remaining),
+                                        'X-RateLimit-Reset': str(mock.rate_reset)}
+                if failure:
+                    status, headers, body = failure[1], dict(failure[3]), failure[4]
+                else:
+                    status, headers, body = mock.route(self.command, self.path, request_body)
+                headers.update(rate_headers)
+                payload = json.dumps(body).encode('utf-8')
+                if status == 200:
+                    etag = '"%s"' % hashlib.md5(payload).hexdigest()
+                    headers['ETag'] = etag
+                    if self.headers.get('If-None-Match') == etag:
+                        status, payload = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(payload)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_POST(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class MockGitHubTestCase(unittest.TestCase):
+    """ Test case whose requests go to a MockGitHub
+    start_mock() is called from setUp(), the mock is stopped and gts.main.api_url restored after the test.
+    """
+
+    def start_mock(self, repos=None, **kwargs):
+        """ Start a MockGitHub(repos, **kwargs) as self.mock and point gts at it """
+        from gts import main as gts_main
+        self.mock = MockGitHub(repos, **kwargs)
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.addCleanup(setattr, gts_main, 'api_url', gts_main.api_url)
+        gts_main.api_url = self.mock.url
+        return self.mock
@@ -0,0 +1,94 @@
+import base64
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts.accounts import load_accounts
+from gts.sqlite_store import SqliteStore
+from mock_github import MockGitHubTestCase
+
+
+def basic(username, password):
+    return 'Basic ' + base64.b64encode(('%s:%s' % (username, password)).encode()).decode()
+
+
+class AccountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'accounts.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+    def test_load(self):
+        os.environ['GTS_TEST_TOKEN'] = 'from-env'
+        try:
+            self.write({'accounts': [{'username': 'a', 'token': 't1'},
+                                     {'username': 'b', 'token_env': 'GTS_TEST_TOKEN', 'organization': 'org', 'repo': 'r'}]})
+            first, second = load_accounts(self.path, 'ALL')
+        finally:
+            del os.environ['GTS_TEST_TOKEN']
+        self.assertEqual((first.auth, first.organization, first.repo), (('a', 't1'), 'a', 'ALL'))
+        self.assertEqual((second.auth, second.organization, second.repo), (('b', 'from-env'), 'org', 'r'))
+
+    def test_invalid(self):
+        for data in ([], {'accounts': [{'token': 't'}]}, [{'username': 'a'}],
+                     [{'username': 'a', 'token_env': 'GTS_TEST_UNSET_TOKEN'}]):
+            self.write(data)
+            with self.assertRaises(ValueError):
+                load_accounts(self.path)
+
+
+class FanOutTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.start_mock(['repo-%d' % i for i in range(8)], owners=['org-a', 'org-b', 'org-c'])
+        self.config = os.path.join(self.tmp_dir, 'accounts.json')
+        with open(self.config, 'w') as f:
+            json.dump({'accounts': [{'username': 'alice', 'token': 'token-a', 'organization': 'org-a'},
+                                    {'username': 'alice', 'token': 'token-a', 'organization': 'org-b', 'repo': 'repo-1'},
+                                    {'username': 'bob', 'token': 'token-c', 'organization': 'org-c'},
+                                    {'username': 'bob', 'token': 'token-c', 'organization': 'missing'}]}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shared_sink(self):
+        sqlite_path = os.path.join(self.tmp_dir, 'history.sqlite3')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['-', 'ALL', 'set_sqlite', '--config', self.config, '--no-cache', '-w', '4',
+                           '--sqlite-path', sqlite_path, '--exclude', 'org-c/repo-7', '-print', 'False',
+                           '--journal', os.path.join(self.tmp_dir, 'journal.log')])
+        self.assertIn('missing: Not Found', out.getvalue())
+        store = SqliteStore(sqlite_path)
+        repos = [row[0] for row in store.totals('views')]
+        store.close()
+        self.assertEqual(repos, ['org-a/repo-%d' % i for i in range(8)] + ['org-b/repo-1'] +
+                         ['org-c/repo-%d' % i for i in range(7)])
+        # Every request was sent with the token of its account
+        counts = self.mock.authorizations()
+        self.assertEqual(set(counts), {basic('alice', 'token-a'), basic('bob', 'token-c')})
+        self.assertEqual(counts[basic('alice', 'token-a')], 1 + 8 * 3 + 3)
+        self.assertEqual(counts[basic('bob', 'token-c')], 2 + 7 * 3)
+
+    def test_bad_config(self):
+        with open(self.config, 'w') as f:
+            f.write('[]')
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            gts_main.main(['-', '--config', self.config])
+
+
+if __name__ == '__main__':
+    unittest.main()
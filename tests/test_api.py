@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import gts
+from gts import main as gts_main
+from gts.api import RepoTraffic, TrafficClient
+from mock_github import MockGitHubTestCase, traffic_json
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_import_has_no_side_effects(self):
+        # argv that would make the command line exit, and no heavy imports
+        code = ('import sys; sys.argv = ["gts", "--bogus"]; import gts; '
+                'assert "requests" not in sys.modules, "requests"; '
+                'assert "gts.main" not in sys.modules, "gts.main"; '
+                'from gts import TrafficClient; '
+                'assert "requests" not in sys.modules, "requests after api"')
+        subprocess.check_call([sys.executable, '-c', code], cwd=root)
+
+    def test_lazy_names(self):
+        self.assertIs(gts.send_request, gts_main.send_request)
+        self.assertIs(gts.RepoTraffic, RepoTraffic)
+        self.assertIn('TrafficClient', dir(gts))
+        with self.assertRaises(AttributeError):
+            gts.missing
+
+
+class TrafficClientTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.repos = ['repo-%d' % i for i in range(15)] + ['old']
+        self.start_mock(self.repos, per_page=4, metadata={'old': {'archived': True}})
+
+    def test_iter_and_fetch(self):
+        with TrafficClient('user', 'token', organization='org', workers=4) as client:
+            names = [info['name'] for info in client.iter_repos(skip_archived=True)]
+            self.assertEqual(names, self.repos[:15])
+            traffic = list(client.fetch_traffic(include=['repo-1*']))
+        self.assertEqual([t.repo for t in traffic], ['repo-1'] + ['repo-1%d' % i for i in range(5)])
+        self.assertEqual(traffic[0].views, traffic_json('repo-1', 'views'))
+        self.assertEqual(traffic[0].errors, {})
+
+    def test_errors(self):
+        self.mock.fail('/repos/org/repo-2/traffic/popular/referrers', 500)
+        with TrafficClient('user', 'token', organization='org', max_retries=0) as client:
+            traffic, = client.fetch_traffic(['repo-2'])
+            missing, = client.fetch_traffic(['missing'])
+        self.assertIsNone(traffic.referrers)
+        self.assertEqual(traffic.errors, {'referrers': 'Server Error'})
+        self.assertIsNotNone(traffic.clones)
+        self.assertEqual(sorted(missing.errors), ['clones', 'referrers', 'views'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from gts import main as gts_main
+from gts.cache import HttpCache
+from gts.client import Client
+from mock_github import MockGitHubTestCase, traffic_json
+
+
+class HttpCacheTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.start_mock(['alpha', 'beta'], rate_limit=5000)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_revalidates_with_etag(self):
+        cache = HttpCache(self.cache_dir)
+        with Client(('user', 'pw'), cache=cache) as client:
+            first = gts_main.send_request('traffic', 'org', None, 'alpha', client)
+            second = gts_main.send_request('traffic', 'org', None, 'alpha', client)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), traffic_json('alpha', 'views'))
+        self.assertTrue(second.from_cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # The rate limit headers of the 304 are kept
+        self.assertEqual(second.headers['X-RateLimit-Remaining'], '4998')
+
+    def test_persists_across_clients(self):
+        with Client(('user', 'pw'), cache=HttpCache(self.cache_dir)) as client:
+            gts_main.send_request('clones', 'org', None, 'beta', client)
+        cache = HttpCache(self.cache_dir)
+        with Client(('user', 'pw'), cache=cache) as client:
+            gts_main.send_request('clones', 'org', None, 'beta', client)
+        self.assertEqual(cache.hits, 1)
+
+    def test_key_depends_on_auth(self):
+        cache = HttpCache(self.cache_dir)
+        url = self.mock.url + '/repos/org/alpha/traffic/views'
+        self.assertNotEqual(cache.key(url, auth=('a', 'x')), cache.key(url, auth=('b', 'x')))
+        self.assertNotIn('secret', open(self.write_entry(cache, ('user', 'secret'))).read())
+
+    def write_entry(self, cache, auth):
+        with Client(auth, cache=cache) as client:
+            gts_main.send_request('traffic', 'org', None, 'alpha', client)
+        return cache.path(cache.key(self.mock.url + '/repos/org/alpha/traffic/views', auth=auth))
+
+    def test_eviction(self):
+        cache = HttpCache(self.cache_dir, max_entries=1)
+        with Client(('user', 'pw'), cache=cache) as client:
+            gts_main.send_request('traffic', 'org', None, 'alpha', client)
+            gts_main.send_request('traffic', 'org', None, 'beta', client)
+        old = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        os.utime(old, (time.time() - 100, time.time() - 100))
+        cache.evict()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertFalse(os.path.exists(old))
+
+    def test_max_age(self):
+        cache = HttpCache(self.cache_dir, max_age=60)
+        entry_path = self.write_entry(cache, ('user', 'pw'))
+        os.utime(entry_path, (time.time() - 120, time.time() - 120))
+        self.assertIsNone(cache.get(os.path.basename(entry_path)[:-5]))
+        self.assertFalse(os.path.exists(entry_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from gts import main as gts_main
+from gts.client import Client
+from mock_github import MockGitHubTestCase
+
+
+class ClientTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.start_mock(['alpha', 'beta'])
+
+    def test_connection_is_reused(self):
+        with Client(('user', 'pw')) as client:
+            for repo in ['alpha', 'beta'] * 5:
+                response = gts_main.send_request('traffic', 'org', None, repo, client)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock.count('GET'), 10)
+        self.assertEqual(len(self.mock.connections), 1)
+
+    def test_default_headers(self):
+        client = Client(('user', 'pw'), headers={'X-Test': '1'})
+        self.assertEqual(client.session.auth, ('user', 'pw'))
+        self.assertIn('gzip', client.session.headers['Accept-Encoding'])
+        self.assertEqual(client.session.headers['X-Test'], '1')
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
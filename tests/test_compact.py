@@ -0,0 +1,219 @@
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import compact, report
+from gts import main as gts_main
+from gts.sqlite_store import SqliteStore, upsert_daily
+
+today = '2018-07-30'
+
+
+def days(count, end=today):
+    """ The `count` days up to `end`, oldest first """
+    last = compact.parse_date(end)
+    return [(last - datetime.timedelta(days=i)).isoformat() for i in range(count - 1, -1, -1)]
+
+
+def daily(repo, date):
+    """ Deterministic (count, uniques) of a day """
+    count = (sum(map(ord, repo + date)) % 17) + 1
+    return count, count // 2 + 1
+
+
+class RetentionTest(unittest.TestCase):
+
+    def test_period_start(self):
+        # 2017-07-30 is a Sunday, 2017-07-31 a Monday and 2017-08-01 a Tuesday
+        self.assertEqual(compact.period_start('2017-07-30', 'week'), '2017-07-24')
+        self.assertEqual(compact.period_start('2017-07-31', 'week'), '2017-07-31')
+        # Weeks are cut at month boundaries
+        self.assertEqual(compact.period_start('2017-08-03', 'week'), '2017-08-01')
+        self.assertEqual(compact.period_start('2017-08-03', 'month'), '2017-08-01')
+
+    def test_cutoffs(self):
+        retention = compact.Retention(keep_daily=30, keep_weekly=90, today=today)
+        self.assertEqual(retention.daily_cutoff, '2018-06-25')
+        self.assertEqual(retention.weekly_cutoff, '2018-05-01')
+        self.assertIsNone(retention.bucket('2018-06-25'))
+        self.assertEqual(retention.bucket('2018-06-24'), ('week', '2018-06-18'))
+        self.assertEqual(retention.bucket('2018-04-30'), ('month', '2018-04-01'))
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            compact.Retention(keep_daily=7)
+        with self.assertRaises(ValueError):
+            compact.Retention(keep_daily=90, keep_weekly=30)
+
+
+class SqliteCompactTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'history.sqlite3')
+        with SqliteStore(self.path) as store:
+            store.conn.executemany(upsert_daily, [(repo, metric, date) + daily(repo, date)
+                                                  for repo in ('alpha', 'beta') for metric in ('views', 'clones')
+                                                  for date in days(400)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def totals(self):
+        with SqliteStore(self.path) as store:
+            return store.totals('views'), store.totals('clones')
+
+    def test_totals_are_kept(self):
+        before = self.totals()
+        retention = compact.Retention(keep_daily=30, keep_weekly=90, today=today)
+        result = compact.compact_sqlite(self.path, retention, vacuum=True)
+        self.assertEqual(self.totals(), before)
+        with SqliteStore(self.path) as store:
+            first = store.conn.execute('SELECT MIN(date) FROM traffic_daily').fetchone()[0]
+            periods = store.conn.execute('SELECT period, MIN(start), MAX(start) FROM traffic_rollup '
+                                         'GROUP BY period ORDER BY period').fetchall()
+        self.assertEqual(first, retention.daily_cutoff)
+        self.assertEqual(periods, [('month', '2017-06-01', '2018-04-01'), ('week', '2018-05-01', '2018-06-18')])
+        self.assertEqual(result['rolled'], 4 * (400 - 36))
+
+        # Running again changes nothing, a month later the old weeks become months
+        compact.compact_sqlite(self.path, retention)
+        self.assertEqual(self.totals(), before)
+        compact.compact_sqlite(self.path, compact.Retention(30, 90, today='2018-08-30'))
+        self.assertEqual(self.totals(), before)
+        with SqliteStore(self.path) as store:
+            weeks = store.conn.execute("SELECT MIN(start) FROM traffic_rollup WHERE period = 'week'").fetchone()[0]
+        self.assertEqual(weeks, '2018-06-01')
+
+    def test_report_reads_rollups(self):
+        total = sum(row[2] for row in report.sqlite_rows(self.path, 'views'))
+        compact.compact_sqlite(self.path, compact.Retention(today=today))
+        rows = list(report.sqlite_rows(self.path, 'views'))
+        rollups = list(report.sqlite_rollups(self.path, 'views'))
+        self.assertEqual(sum(row[2] for row in rows) + sum(row[3] for row in rollups), total)
+        self.assertEqual(rows, sorted(rows))
+        self.assertEqual(set(row[1] for row in rollups), {'week', 'month'})
+
+
+class CsvCompactTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # Daily snapshots of the last 14 days, over 200 days
+        for end in days(200)[13::3]:
+            name = end + '-11h-17m-traffic-stats.csv'
+            self.write(name, [[repo, date, '%d' % daily(repo, date)[0], '%d' % daily(repo, date)[1]]
+                              for repo in ('alpha', 'beta') for date in days(14, end)])
+        self.write('2018-07-30-11h-17m-referrer-stats.csv', [['alpha', 'Google', '3', '1']],
+                   header='repository_name,site,views,unique_visitors/cloners')
+        self.write('2018-07-29-11h-17m-referrer-stats.csv', [['alpha', 'Google', '2', '1']],
+                   header='repository_name,site,views,unique_visitors/cloners')
+        self.retention = compact.Retention(keep_daily=30, keep_weekly=90, today=today)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, rows, header='repository_name,date,views,unique_visitors/cloners'):
+        with open(os.path.join(self.tmp, name), 'w') as f:
+            f.write(header + '\r\n')
+            for row in rows:
+                f.write(','.join(row) + '\r\n')
+
+    def total(self):
+        return (sum(row[2] for row in report.csv_rows([self.tmp], 'views'))
+                + sum(row[3] for row in report.csv_rollups([self.tmp], 'views')))
+
+    def test_snapshots_merged_and_rolled_up(self):
+        before = self.total()
+        snapshot = sorted(os.listdir(self.tmp))[0]
+        with open(os.path.join(self.tmp, snapshot)) as f:
+            old_snapshot = f.read()
+        results = compact.compact_csv(self.tmp, self.retention)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['2018-07-30-11h-17m-referrer-stats.csv',
+                                                        '2018-07-30-11h-17m-traffic-stats.csv',
+                                                        'traffic-rollup.csv'])
+        self.assertEqual([(r['kind'], r['rows']) for r in results], [('traffic', 2 * 36), ('referrer', 1)])
+        self.assertEqual(self.total(), before)
+        rollup = compact.read_rollup(os.path.join(self.tmp, 'traffic-rollup.csv'))
+        self.assertEqual(sorted(set(key[1] for key in rollup)), ['month', 'week'])
+
+        # An old snapshot left behind by an interrupted compaction is not counted twice
+        with open(os.path.join(self.tmp, snapshot), 'w') as f:
+            f.write(old_snapshot)
+        compact.compact_csv(self.tmp, self.retention)
+        self.assertEqual(self.total(), before)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, snapshot)))
+
+    def test_subcommand(self):
+        path = os.path.join(self.tmp, 'history.sqlite3')
+        SqliteStore(path).close()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['compact', self.tmp, '--sqlite', path, '--keep-daily', '30', '--today', today])
+        self.assertIn('Merged 63 traffic snapshots', out.getvalue())
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            compact.main([self.tmp, '--keep-daily', '7'])
+
+
+class FakeCursor(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 3
+
+    def execute(self, sql, params):
+        if self.conn.fail:
+            raise RuntimeError('lost connection')
+        self.conn.events.append((sql, params))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeConnection(object):
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.events = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+
+class PostgresCompactTest(unittest.TestCase):
+
+    def test_one_transaction(self):
+        conn = FakeConnection()
+        retention = compact.Retention(keep_daily=30, keep_weekly=90, today=today)
+        self.assertEqual(compact.compact_postgres(conn, retention), {'rollup': 6})
+        self.assertEqual(conn.events[-1], 'commit')
+        statements = conn.events[:-1]
+        self.assertEqual([params for sql, params in statements[:2]], [('2018-05-01',), ('2018-05-01',)])
+        self.assertIn('DELETE FROM repo_clones', statements[2][0])
+        self.assertEqual(statements[3][1], ('2018-06-25', 'views', '2018-05-01', '2018-05-01'))
+        # Values are always bound by the driver
+        for sql, params in statements:
+            self.assertEqual(sql.count('%s'), len(params))
+
+    def test_rolled_back_on_failure(self):
+        conn = FakeConnection(fail=True)
+        with self.assertRaises(RuntimeError):
+            compact.compact_postgres(conn, compact.Retention(today=today))
+        self.assertEqual(conn.events, ['rollback'])
+
+
+if __name__ == '__main__':
+    unittest.main()
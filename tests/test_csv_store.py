@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import csv_store
+from gts.main import store_csv, store_csv_referrers
+from mock_github import repo_stats, traffic_json, referrers_json
+
+
+class CsvStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.paths = [os.path.join(self.tmp, name) for name in ('views.csv', 'clones.csv', 'referrers.csv')]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, repos):
+        with csv_store.CsvStore(*self.paths) as store:
+            for repo in repos:
+                store.write(repo_stats(repo))
+        return store
+
+    def lines(self, path):
+        with open(path, newline='') as f:
+            return f.read().split('\r\n')[:-1]
+
+    def test_header_written_once(self):
+        store = self.write(['alpha', 'beta'])
+        self.write(['gamma'])
+        views = self.lines(self.paths[0])
+        self.assertEqual(views[0], 'repository_name,date,views,unique_visitors/cloners')
+        self.assertEqual(len(views), 1 + 3 * 14)
+        self.assertEqual(self.lines(self.paths[1])[0], 'repository_name,date,clones,unique_visitors/cloners')
+        self.assertEqual(self.lines(self.paths[2])[1:3],
+                         ['alpha,%s,%d,%d' % (r['referrer'], r['count'], r['uniques']) for r in referrers_json('alpha')])
+        self.assertEqual(store.rows, 2 * (14 + 14 + 2))
+
+    def test_matches_store_csv(self):
+        self.write(['alpha', 'beta'])
+        expected = [os.path.join(self.tmp, 'expected-' + name) for name in ('views.csv', 'clones.csv', 'referrers.csv')]
+        for repo in ('alpha', 'beta'):
+            store_csv(expected[0], repo, traffic_json(repo, 'views'), 'views')
+            store_csv(expected[1], repo, traffic_json(repo, 'clones'), 'clones')
+            store_csv_referrers(expected[2], repo, referrers_json(repo))
+        for path, expected_path in zip(self.paths, expected):
+            self.assertEqual(self.lines(path), self.lines(expected_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from gts.client import Client
+from gts.daemon import Daemon, MetricsServer, Scheduler, main as daemon_main
+from gts.sqlite_store import SqliteStore
+from gts.state import IncrementalStore, State
+from mock_github import MockGitHubTestCase
+
+
+class Clock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FailingStore(SqliteStore):
+    """ Fails the first write """
+
+    failures = 1
+
+    def write(self, stats):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('write failed')
+        SqliteStore.write(self, stats)
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_spread_over_interval(self):
+        scheduler = Scheduler(60)
+        scheduler.update(['a', 'b', 'c', 'd'], 0)
+        due = []
+        for now in range(0, 60):
+            repo = scheduler.pop(now)
+            if repo is not None:
+                due.append((now, repo))
+        self.assertEqual(due, [(0, 'a'), (15, 'b'), (30, 'c'), (45, 'd')])
+        # The next round keeps the slots
+        self.assertEqual(scheduler.next_due(), 60)
+
+    def test_relisting(self):
+        scheduler = Scheduler(60)
+        scheduler.update(['a', 'b'], 0)
+        self.assertEqual(scheduler.pop(0), 'a')
+        scheduler.update(['b', 'c'], 10)
+        self.assertEqual(len(scheduler), 2)
+        self.assertEqual(sorted(repo for _, repo in scheduler.heap), ['b', 'c'])
+        self.assertEqual(scheduler.pop(10), 'c')
+        self.assertIsNone(scheduler.pop(29))
+        self.assertEqual(scheduler.pop(30), 'b')
+
+
+class DaemonTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repos = ['repo-%d' % i for i in range(6)]
+        self.start_mock(self.repos)
+        self.client = Client(('user', 'token'))
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_polling_window(self):
+        clock = Clock()
+        store = SqliteStore(os.path.join(self.tmp_dir, 'history.sqlite3'))
+        daemon = Daemon(self.client, 'org', None, store=store, interval=600, relist_interval=1200, clock=clock)
+        # One repository every 100 seconds
+        fetched = []
+        for _ in range(12):
+            delay = daemon.step()
+            while delay == 0:
+                delay = daemon.step()
+            self.assertEqual(delay, 100)
+            fetched.append(daemon.fetches)
+            clock.now += delay
+        self.assertEqual(fetched, list(range(1, 13)))
+        self.assertEqual(self.mock.count('GET', '/users/org/repos'), 1)
+        self.assertEqual(self.mock.count('GET', '/repos/org/repo-0/traffic/views'), 2)
+        # The listing is refreshed on its own interval
+        daemon.step()
+        self.assertEqual(self.mock.count('GET', '/users/org/repos'), 2)
+        # Every fetch is committed, so the data is visible while the daemon runs
+        store.close()
+        store = SqliteStore(os.path.join(self.tmp_dir, 'history.sqlite3'))
+        self.assertEqual(len(store.totals('views')), 6)
+        store.close()
+
+    def test_errors_do_not_stop_polling(self):
+        clock = Clock()
+        daemon = Daemon(self.client, 'org', None, interval=60, clock=clock)
+        self.mock.fail('/users/org/repos', 500)
+        self.client.limiter.max_retries = 0
+        self.assertEqual(daemon.step(), 60)
+        self.assertEqual(daemon.listing_errors, 1)
+        clock.now += 60
+        daemon.step()
+        self.assertEqual(daemon.metrics()['repos_scheduled'], 6)
+
+    def test_failed_write_is_rolled_back(self):
+        state_path = os.path.join(self.tmp_dir, 'state.json')
+        inner = FailingStore(os.path.join(self.tmp_dir, 'history.sqlite3'))
+        state = State(state_path)
+        store = IncrementalStore(inner, state)
+        daemon = Daemon(self.client, 'org', None, 'repo-0', store=store, state=state, interval=60)
+        daemon.fetch('repo-0')
+        self.assertEqual((daemon.fetches, daemon.fetch_errors), (0, 1))
+        self.assertEqual(state.section('incremental'), {})
+        # The days of the failed write were not marked as stored, the next fetch saves them
+        daemon.fetch('repo-0')
+        self.assertEqual(daemon.fetches, 1)
+        self.assertEqual(len(inner.query('views')), 14)
+        daemon.save_state()
+        self.assertEqual(len(State(state_path).section('incremental')['repo-0']['views']['days']), 14)
+        store.close()
+
+    def test_state_saved_every_n_fetches(self):
+        state_path = os.path.join(self.tmp_dir, 'state.json')
+        state = State(state_path)
+        store = IncrementalStore(SqliteStore(os.path.join(self.tmp_dir, 'history.sqlite3')), state)
+        daemon = Daemon(self.client, 'org', None, store=store, state=state, interval=60, save_every=4)
+        for repo in self.repos[:3]:
+            daemon.fetch(repo)
+        self.assertFalse(os.path.exists(state_path))
+        daemon.fetch(self.repos[3])
+        self.assertEqual(len(State(state_path).section('incremental')), 4)
+        daemon.fetch(self.repos[4])
+        # Relisting saves the fetches since
+        daemon.relist(daemon.clock())
+        self.assertEqual(len(State(state_path).section('incremental')), 5)
+        store.close()
+
+    def test_one_shot_options_are_rejected(self):
+        for option in (['--config', 'accounts.json'], ['--resume'], ['--profile', 'run.prof']):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                daemon_main(['-', 'ALL', 'no_csv'] + option)
+
+    def test_metrics_endpoint(self):
+        daemon = Daemon(self.client, 'org', None, interval=60)
+        daemon.step()
+        server = MetricsServer(daemon, port=0)
+        server.start()
+        try:
+            response = requests.get(server.url)
+            self.assertEqual(requests.get(server.url.replace('/metrics', '/')).status_code, 404)
+        finally:
+            server.stop()
+        self.assertEqual(response.status_code, 200)
+        lines = response.text.splitlines()
+        self.assertIn('gts_fetches_total 1', lines)
+        self.assertIn('gts_repos_scheduled 6', lines)
+        self.assertIn('gts_requests_total 4', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
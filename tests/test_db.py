@@ -0,0 +1,87 @@
+import unittest
+
+from gts import db
+from gts.record import Referrers, RepoStats, Series
+from mock_github import traffic_json, referrers_json
+
+
+class DbRowsTest(unittest.TestCase):
+
+    def test_daily_rows(self):
+        rows = db.daily_rows('alpha', traffic_json('alpha', 'views'), 'views')
+        self.assertEqual(len(rows), 14)
+        self.assertEqual(rows[0][:2], ('alpha', '2017-07-17'))
+        self.assertTrue(all(len(r) == 4 for r in rows))
+
+    def test_referral_rows(self):
+        rows = db.referral_rows('alpha', referrers_json('alpha'))
+        self.assertEqual([r[1] for r in rows], ['Google', 'github.com'])
+
+    def test_statements_are_parameterized(self):
+        # Values are always bound by the driver, never formatted into the SQL text
+        self.assertEqual(db.upsert_overview.count('%s'), 4)
+        for sql in (db.upsert_daily, db.upsert_referrals):
+            self.assertEqual(sql.count('%s'), 1)
+            self.assertIn('ON CONFLICT', sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.events = []
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+    def close(self):
+        self.events.append('close')
+
+
+class FakeCursor(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class PostgresStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.saved = (db.connect, db.write_series, db.write_sites)
+        db.connect = lambda config: self.conn
+        db.write_series = lambda cur, repo, series, response_type: self.conn.events.append(response_type) or 15
+        db.write_sites = lambda cur, repo, referrers: self.conn.events.append('referrers') or 2
+
+    def tearDown(self):
+        db.connect, db.write_series, db.write_sites = self.saved
+
+    def test_one_connection_committed_at_the_end(self):
+        with db.PostgresStore({}) as store:
+            for repo in ('alpha', 'beta'):
+                store.write(RepoStats(repo, Series(), Series(), Referrers()))
+        self.assertEqual(self.conn.events, ['views', 'clones', 'referrers'] * 2 + ['commit', 'close'])
+        self.assertEqual(store.rows, 64)
+
+    def test_rolled_back_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            with db.PostgresStore({}) as store:
+                store.write(RepoStats('alpha', Series(), Series(), Referrers()))
+                raise RuntimeError('run failed')
+        self.assertEqual(self.conn.events[-2:], ['rollback', 'close'])
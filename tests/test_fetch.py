@@ -0,0 +1,42 @@
+import contextlib
+import io
+import unittest
+
+from gts import main as gts_main
+from mock_github import MockGitHubTestCase
+
+
+class ConcurrentFetchTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.repos = ['repo-%02d' % i for i in range(25)]
+        self.start_mock(self.repos, per_page=10)
+
+    def run_main(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(list(argv))
+        return out.getvalue()
+
+    def test_fetch_repos_keeps_order(self):
+        results = list(gts_main.fetch_repos('org', ('user', 'pw'), self.repos, workers=8))
+        self.assertEqual([r[0] for r in results], self.repos)
+        for repo, traffic, clones, referrers in results:
+            self.assertIn('views', traffic)
+            self.assertIn('clones', clones)
+            self.assertEqual(len(referrers), 2)
+
+    def test_fetch_repos_sequential_matches_concurrent(self):
+        sequential = list(gts_main.fetch_repos('org', ('user', 'pw'), self.repos, workers=1))
+        concurrent = list(gts_main.fetch_repos('org', ('user', 'pw'), self.repos, workers=6))
+        self.assertEqual(sequential, concurrent)
+
+    def test_main_workers_output_is_deterministic(self):
+        sequential = self.run_main('user:pw', 'ALL', 'no_csv', '-o', 'org', '--no-cache')
+        concurrent = self.run_main('user:pw', 'ALL', 'no_csv', '-o', 'org', '--no-cache', '--workers', '8')
+        self.assertEqual(sequential, concurrent)
+        self.assertEqual(self.mock.count('GET', '/repos/'), 2 * 3 * len(self.repos))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts.filters import RepoFilter, parse_timestamp
+from gts.record import RepoStats
+from gts.state import State
+from mock_github import MockGitHubTestCase
+
+day = 86400
+zero_views = {'count': 0, 'uniques': 0, 'views': []}
+zero_clones = {'count': 0, 'uniques': 0, 'clones': []}
+
+
+def info(name, pushed_at='2017-01-01T00:00:00Z', archived=False, fork=False):
+    return {'name': name, 'archived': archived, 'fork': fork, 'visibility': 'public', 'pushed_at': pushed_at}
+
+
+class Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RepoFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tmp_dir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_globs(self):
+        repo_filter = RepoFilter(include=['gts-*', 'docs'], exclude=['*-old'])
+        repos = [info(n) for n in ('gts-core', 'gts-old', 'docs', 'other')]
+        self.assertEqual(list(repo_filter.select(repos)), ['gts-core', 'docs'])
+        self.assertEqual((repo_filter.selected, repo_filter.skipped), (2, 2))
+
+    def test_archived_and_forks(self):
+        repo_filter = RepoFilter(skip_archived=True, skip_forks=True)
+        repos = [info('a', archived=True), info('b', fork=True), info('c')]
+        self.assertEqual(list(repo_filter.select(repos)), ['c'])
+
+    def test_dormant_schedule(self):
+        clock = Clock(parse_timestamp('2017-08-01T00:00:00Z'))
+        state = State(self.state_path)
+        repo_filter = RepoFilter(dormant_days=30, dormant_interval=7, state=state, clock=clock)
+        repos = [info('quiet'), info('busy'), info('pushed', pushed_at='2017-07-30T00:00:00Z')]
+        # Nothing is known yet, everything is fetched
+        self.assertEqual(list(repo_filter.select(repos)), ['quiet', 'busy', 'pushed'])
+        repo_filter.record(RepoStats.from_json('quiet', zero_views, zero_clones, []))
+        repo_filter.record(RepoStats.from_json('busy', dict(zero_views, count=3), zero_clones, []))
+        repo_filter.record(RepoStats.from_json('pushed', zero_views, zero_clones, []))
+        state.save()
+
+        # The next day only the dormant repository is skipped, also after a restart
+        clock.now += day
+        repo_filter = RepoFilter(dormant_days=30, dormant_interval=7, state=State(self.state_path), clock=clock)
+        self.assertEqual(list(repo_filter.select(repos)), ['busy', 'pushed'])
+        # Once the interval has passed it is checked again
+        clock.now += 7 * day
+        self.assertEqual(list(repo_filter.select(repos)), ['quiet', 'busy', 'pushed'])
+
+    def test_errors_are_not_recorded(self):
+        repo_filter = RepoFilter(dormant_days=30, state=State(self.state_path))
+        # A failed response is dropped by output_repo, leaving a partial record
+        repo_filter.record(RepoStats.from_json('gone', None, zero_clones, []))
+        repo_filter.record(None)
+        self.assertEqual(repo_filter.activity, {})
+
+
+class FilterCliTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repos = ['app-%d' % i for i in range(5)] + ['lib-%d' % i for i in range(5)]
+        self.start_mock(self.repos)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_include_exclude(self):
+        out = io.StringIO()
+        state_file = os.path.join(self.tmp_dir, 'state.json')
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['user:token', 'ALL', 'no_csv', '-o', 'org', '--no-cache', '--format', 'jsonl',
+                           '--include', 'app-*', '--exclude', 'app-3', '--skip-dormant', '30',
+                           '--state-file', state_file])
+        names = sorted(set(json.loads(line)['repo'] for line in out.getvalue().splitlines()))
+        self.assertEqual(names, ['app-0', 'app-1', 'app-2', 'app-4'])
+        self.assertEqual(self.mock.count('GET', '/repos/org/lib-0/'), 0)
+        with open(state_file) as f:
+            self.assertEqual(sorted(json.load(f)['activity']), names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+from gts import graphql
+from gts import main as gts_main
+from gts.client import ApiError, Client
+from mock_github import MockGitHubTestCase
+
+fixture_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'graphql_repos.json')
+
+
+class FixtureResponse(object):
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FixtureClient(object):
+    """ Replays recorded GraphQL responses and keeps the requests it was sent """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def post(self, url, json=None, auth=None):
+        self.requests.append(json)
+        return FixtureResponse(self.pages.pop(0))
+
+
+class GraphqlFixtureTest(unittest.TestCase):
+
+    def test_recorded_pages(self):
+        with open(fixture_path) as f:
+            client = FixtureClient(json.load(f))
+        repos = list(graphql.iter_repo_info('https://api.github.com/graphql', 'nchah', None, client))
+        self.assertEqual([r['name'] for r in repos], ['github-traffic-stats', 'old-experiments', 'requests', 'notes'])
+        self.assertEqual(repos[1]['archived'], True)
+        self.assertEqual(repos[2]['fork'], True)
+        self.assertEqual(repos[3]['visibility'], 'private')
+        self.assertEqual(repos[0]['pushed_at'], '2017-07-30T15:17:04Z')
+        # One call per 100 repositories, the second page continues from the first cursor
+        self.assertEqual(len(client.requests), 2)
+        self.assertIsNone(client.requests[0]['variables']['after'])
+        self.assertEqual(client.requests[1]['variables']['after'], 'Y3Vyc29yOnYyOpHOBHpmEw==')
+
+    def test_errors(self):
+        client = FixtureClient([{'errors': [{'message': 'Bad credentials'}]}])
+        with self.assertRaises(ApiError):
+            list(graphql.iter_repo_info('url', 'nchah', None, client))
+        client = FixtureClient([{'data': {'repositoryOwner': None}}])
+        with self.assertRaises(ApiError):
+            list(graphql.iter_repo_info('url', 'missing', None, client))
+
+
+class GraphqlListingTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.repos = ['repo-%03d' % i for i in range(150)]
+        metadata = {'repo-001': {'archived': True}, 'repo-002': {'fork': True}}
+        self.start_mock(self.repos, metadata=metadata)
+
+    def test_graphql_and_rest_agree(self):
+        with Client(('user', 'token')) as client:
+            rest = list(gts_main.iter_repo_info('org', None, client))
+            gql = list(gts_main.iter_repo_info('org', None, client, use_graphql=True))
+        self.assertEqual(rest, gql)
+        self.assertEqual(self.mock.count('POST', '/graphql'), 2)
+
+    def test_skipped_repos_get_no_traffic_calls(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['user:token', 'ALL', 'no_csv', '-o', 'org', '--no-cache', '--graphql',
+                           '--skip-archived', '--skip-forks', '--format', 'jsonl'])
+        names = [json.loads(line)['repo'] for line in out.getvalue().splitlines()]
+        self.assertEqual(len(names), 148)
+        self.assertNotIn('repo-001', names)
+        self.assertNotIn('repo-002', names)
+        self.assertEqual(self.mock.count('GET', '/repos/org/repo-001/'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts.journal import Journal
+from gts.sqlite_store import SqliteStore
+from mock_github import MockGitHubTestCase
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resume(self):
+        journal = Journal(self.path)
+        journal.record('a', ['traffic', 'clones', 'referrers'])
+        journal.record('b', ['traffic'])
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('b\tclo')  # cut short by a crash
+
+        journal = Journal(self.path, resume=True)
+        self.assertEqual(journal.resumed, 4)
+        self.assertTrue(journal.is_repo_done('a'))
+        self.assertFalse(journal.is_repo_done('b'))
+        self.assertTrue(journal.is_done('b', 'traffic'))
+        self.assertFalse(journal.is_done('b', 'clones'))
+        journal.close(complete=True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_new_run_starts_empty(self):
+        journal = Journal(self.path)
+        journal.record('a', ['traffic'])
+        journal.close()
+        journal = Journal(self.path)
+        self.assertFalse(journal.is_done('a', 'traffic'))
+        journal.close()
+
+
+class ResumeTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repos = ['repo-%d' % i for i in range(10)]
+        self.start_mock(self.repos)
+        self.output_repo = gts_main.output_repo
+        self.sqlite_path = os.path.join(self.tmp_dir, 'history.sqlite3')
+        self.journal_path = os.path.join(self.tmp_dir, 'journal.log')
+
+    def tearDown(self):
+        gts_main.output_repo = self.output_repo
+        shutil.rmtree(self.tmp_dir)
+
+    def run_main(self, *extra, journal=True):
+        if journal:
+            extra = ('--journal', self.journal_path) + extra
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            gts_main.main(['user:token', 'ALL', 'set_sqlite', '-o', 'org', '--no-cache', '-w', '2',
+                           '--max-retries', '0', '--sqlite-path', self.sqlite_path] + list(extra))
+
+    def interrupt_at(self, name):
+        def output_repo(renderer, store, repo, *responses):
+            if repo == name:
+                raise RuntimeError('interrupted')
+            return self.output_repo(renderer, store, repo, *responses)
+
+        gts_main.output_repo = output_repo
+
+    def test_interrupted_run(self):
+        self.interrupt_at('repo-6')
+        self.mock.fail('/repos/org/repo-2/traffic/clones', 500)
+        with self.assertRaises(RuntimeError):
+            self.run_main()
+        gts_main.output_repo = self.output_repo
+        self.assertTrue(os.path.exists(self.journal_path))
+        # What was saved before the failure is committed
+        store = SqliteStore(self.sqlite_path)
+        self.assertEqual([row[0] for row in store.totals('views')], self.repos[:6])
+        self.assertNotIn('repo-2', [row[0] for row in store.totals('clones')])
+        store.close()
+
+        calls = len(self.mock.calls)
+        self.run_main('--resume')
+        resumed = [c[1] for c in self.mock.calls[calls:] if c[1].startswith('/repos/')]
+        self.assertEqual(len(resumed), 1 + 4 * 3)
+        self.assertIn('/repos/org/repo-2/traffic/clones', resumed)
+        self.assertEqual(len([path for path in resumed if '/repo-0/' in path]), 0)
+        self.assertFalse(os.path.exists(self.journal_path))
+        store = SqliteStore(self.sqlite_path)
+        self.assertEqual([row[0] for row in store.totals('views')], self.repos)
+        self.assertEqual([row[0] for row in store.totals('clones')], self.repos)
+        store.close()
+
+    def test_all_or_nothing_without_journal(self):
+        self.interrupt_at('repo-6')
+        with self.assertRaises(RuntimeError):
+            self.run_main(journal=False)
+        gts_main.output_repo = self.output_repo
+        store = SqliteStore(self.sqlite_path)
+        self.assertEqual(store.totals('views'), [])
+        store.close()
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            self.run_main('--resume', journal=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
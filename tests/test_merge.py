@@ -0,0 +1,87 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts import merge
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.write('2017-07-30-11h-17m-traffic-stats.csv', [
+            ['beta', '2017-07-16', '1', '1'],
+            ['alpha', '2017-07-17', '10', '2'],
+            ['alpha', '2017-07-16', '4', '1'],
+        ])
+        self.write('2017-07-31-11h-17m-traffic-stats.csv', [
+            ['alpha', '2017-07-17', '12', '3'],
+            ['alpha', '2017-07-31', '2', '2'],
+            ['beta', '2017-07-16', '1', '1'],
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, rows, header='repository_name,date,views,unique_visitors/cloners'):
+        with open(os.path.join(self.tmp, name), 'w') as f:
+            f.write(header + '\r\n')
+            for row in rows:
+                f.write(','.join(row) + '\r\n')
+
+    def read(self, path):
+        with open(path, newline='') as f:
+            return f.read().split('\r\n')[:-1]
+
+    def expected(self):
+        return ['repository_name,date,views,unique_visitors/cloners',
+                'alpha,2017-07-16,4,1',
+                'alpha,2017-07-17,12,3',
+                'alpha,2017-07-31,2,2',
+                'beta,2017-07-16,1,1']
+
+    def test_newest_value_wins_and_output_is_sorted(self):
+        output = os.path.join(self.tmp, 'merged.csv')
+        self.assertEqual(merge.merge([self.tmp], output), 4)
+        self.assertEqual(self.read(output), self.expected())
+
+    def test_previous_output_is_not_an_input(self):
+        output = os.path.join(self.tmp, 'merged.csv')
+        merge.merge([self.tmp], output)
+        merge.merge([self.tmp], output)
+        self.assertEqual(self.read(output), self.expected())
+
+    def test_spilled_chunks_give_the_same_result(self):
+        output = os.path.join(self.tmp, 'merged.csv')
+        merge.merge([self.tmp], output, chunk_size=1)
+        self.assertEqual(self.read(output), self.expected())
+
+    def test_snapshots_override_other_files(self):
+        # Sorts after the timestamped names, but is not a snapshot
+        self.write('merged-traffic-stats.csv', [['alpha', '2017-07-17', '99', '9'],
+                                                ['gamma', '2017-07-01', '5', '1']])
+        files = merge.snapshot_files([self.tmp])
+        self.assertEqual(os.path.basename(files[0]), 'merged-traffic-stats.csv')
+        output = os.path.join(self.tmp, 'out.csv')
+        merge.merge([self.tmp], output)
+        self.assertEqual(self.read(output), self.expected() + ['gamma,2017-07-01,5,1'])
+
+    def test_mixed_kinds_are_rejected(self):
+        self.write('2017-07-31-11h-17m-referrer-stats.csv', [['alpha', 'Google', '3', '1']],
+                   header='repository_name,site,views,unique_visitors/cloners')
+        with self.assertRaises(ValueError):
+            merge.merge([self.tmp], os.path.join(self.tmp, 'merged.csv'))
+
+    def test_subcommand(self):
+        output = os.path.join(self.tmp, 'out.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            gts_main.main(['merge', self.tmp, '-o', output])
+        self.assertEqual(self.read(output), self.expected())
+
+
+if __name__ == '__main__':
+    unittest.main()
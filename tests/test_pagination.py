@@ -0,0 +1,46 @@
+import contextlib
+import io
+import unittest
+
+from gts import main as gts_main
+from gts.client import Client
+from mock_github import MockGitHubTestCase
+
+
+class RepoPaginationTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.repos = ['repo-%02d' % i for i in range(25)]
+        self.start_mock(self.repos, per_page=10, owners=['org'])
+        self.client = Client(('user', 'pw'))
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_one_get_per_page(self):
+        names = list(gts_main.iter_repos('org', None, self.client))
+        self.assertEqual(names, self.repos)
+        # 25 repos at 10 per page: 3 pages, 1 GET each and no HEAD requests
+        self.assertEqual(self.mock.count('GET', '/users/org/repos'), 3)
+        self.assertEqual(self.mock.count('HEAD'), 0)
+
+    def test_pages_are_fetched_lazily(self):
+        repos = gts_main.iter_repos('org', None, self.client)
+        for _ in range(10):
+            next(repos)
+        self.assertEqual(self.mock.count('GET', '/users/org/repos'), 1)
+        next(repos)
+        self.assertEqual(self.mock.count('GET', '/users/org/repos'), 2)
+
+    def test_error_payload(self):
+        with self.assertRaises(gts_main.ApiError):
+            list(gts_main.iter_repos('missing', None, self.client))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            result = gts_main.main(['user:pw', 'ALL', 'no_csv', '-o', 'missing', '--no-cache'])
+        self.assertEqual(result, 'Code done.')
+        self.assertEqual(out.getvalue().strip(), 'Not Found')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+from gts import main as gts_main
+from gts.client import Client
+from gts.ratelimit import RateLimiter
+from mock_github import MockGitHubTestCase
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeClock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def budget(remaining, reset, limit=5000):
+    return FakeResponse(headers={'X-RateLimit-Limit': str(limit),
+                                 'X-RateLimit-Remaining': str(remaining),
+                                 'X-RateLimit-Reset': str(reset)})
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(clock=self.clock.time, sleep=self.clock.sleep)
+
+    def test_no_wait_with_plenty_of_budget(self):
+        self.limiter.update(budget(4000, 2000))
+        for _ in range(100):
+            self.limiter.before_request()
+        self.assertEqual(self.limiter.wait_time, 0)
+        self.assertEqual(self.limiter.remaining, 3900)
+
+    def test_paces_when_budget_is_low(self):
+        # 10 requests left for the next 100 seconds: one every 10 seconds
+        self.limiter.update(budget(10, 1100))
+        for _ in range(5):
+            self.limiter.before_request()
+        self.assertAlmostEqual(self.clock.now, 1040.0)
+
+    def test_waits_for_reset_when_exhausted(self):
+        self.limiter.update(budget(0, 1300))
+        self.limiter.before_request()
+        self.assertEqual(self.clock.now, 1300)
+        self.assertEqual(self.limiter.wait_time, 300)
+
+    def test_retry_decisions(self):
+        self.assertIsNone(self.limiter.retry_delay(FakeResponse(200), 0))
+        self.assertIsNone(self.limiter.retry_delay(FakeResponse(404), 0))
+        self.assertIsNone(self.limiter.retry_delay(FakeResponse(403, body={'message': 'Must have push access'}), 0))
+        self.assertIsNotNone(self.limiter.retry_delay(FakeResponse(502), 0))
+        self.assertEqual(self.limiter.retry_delay(FakeResponse(429, {'Retry-After': '7'}), 0), 7)
+        abuse = FakeResponse(403, body={'message': 'You have exceeded a secondary rate limit'})
+        self.assertIsNotNone(self.limiter.retry_delay(abuse, 0))
+        exhausted = FakeResponse(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1060'})
+        self.assertEqual(self.limiter.retry_delay(exhausted, 0), 61)
+        self.assertIsNone(self.limiter.retry_delay(FakeResponse(502), self.limiter.max_retries))
+
+    def test_backoff_is_bounded(self):
+        for attempt in range(5):
+            delay = self.limiter.retry_delay(FakeResponse(503), attempt)
+            self.assertTrue(0 <= delay <= min(self.limiter.max_backoff, 2 ** attempt))
+
+
+class ClientRetryTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.start_mock(['alpha'], rate_limit=5000)
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(sleep=self.clock.sleep)
+        self.client = Client(('user', 'pw'), limiter=self.limiter)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_retries_server_errors(self):
+        self.mock.fail('/repos/org/alpha/traffic/views', 502, times=2)
+        response = gts_main.send_request('traffic', 'org', None, 'alpha', self.client)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.limiter.retries, 2)
+        self.assertEqual(self.limiter.counters()['requests'], 3)
+        self.assertEqual(self.limiter.remaining, 4997)
+
+    def test_gives_up_after_max_retries(self):
+        self.limiter.max_retries = 1
+        self.mock.fail('/repos/org/alpha/traffic/views', 429, times=5, headers={'Retry-After': '3'})
+        response = gts_main.send_request('traffic', 'org', None, 'alpha', self.client)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.limiter.retries, 1)
+        self.assertEqual(self.limiter.wait_time, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from gts.record import Referrers, RepoStats, Series, date_ordinal, date_string
+from mock_github import referrers_json, traffic_json
+
+
+class RecordTest(unittest.TestCase):
+
+    def test_dates(self):
+        ordinal = date_ordinal('2017-07-30T00:00:00Z')
+        self.assertEqual(date_string(ordinal), '2017-07-30')
+        self.assertEqual(date_ordinal('2017-07-31T00:00:00Z') - ordinal, 1)
+        # Ordinals never seen as timestamps are converted too
+        self.assertEqual(date_string(ordinal + 365), '2018-07-30')
+
+    def test_round_trip(self):
+        views = traffic_json('alpha', 'views')
+        series = Series.from_json(views, 'views')
+        self.assertEqual(len(series), 14)
+        self.assertEqual(series.to_json('views'), views)
+        self.assertEqual(next(iter(series.rows())),
+                         ('2017-07-17', views['views'][0]['count'], views['views'][0]['uniques']))
+        referrers = referrers_json('alpha')
+        self.assertEqual(Referrers.from_json(referrers).to_json(), referrers)
+
+    def test_select(self):
+        series = Series.from_json(traffic_json('alpha', 'clones'), 'clones')
+        selected = series.select([0, 13])
+        self.assertEqual([day for day, count, uniques in selected.rows()], ['2017-07-17', '2017-07-30'])
+        self.assertEqual((selected.count, selected.uniques), (series.count, series.uniques))
+
+    def test_repo_stats(self):
+        zero = {'count': 0, 'uniques': 0, 'views': []}
+        stats = RepoStats.from_json('alpha', zero, None, [])
+        self.assertEqual(stats.endpoints(), ['traffic', 'referrers'])
+        self.assertFalse(stats.is_complete())
+        stats.clones = Series()
+        self.assertTrue(stats.is_all_zero())
+        stats.referrers = Referrers.from_json(referrers_json('alpha'))
+        self.assertEqual(stats.is_all_zero(), not any(r['count'] for r in referrers_json('alpha')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import json
+import unittest
+
+from gts import main as gts_main
+from gts.record import Referrers, RepoStats
+from gts.render import Renderer
+from mock_github import MockGitHubTestCase, repo_stats, traffic_json, referrers_json
+
+
+def render(fmt, repos):
+    out = io.StringIO()
+    renderer = Renderer(out, fmt)
+    for repo in repos:
+        renderer.write(repo_stats(repo))
+    return out.getvalue()
+
+
+class RendererTest(MockGitHubTestCase):
+
+    def test_table_columns_sized_from_data(self):
+        long_site = 'very-long-referring-site.example.com'
+        out = io.StringIO()
+        Renderer(out).table('alpha', Referrers.from_json([{'referrer': long_site, 'count': 12345, 'uniques': 3}]), 'referrers')
+        lines = out.getvalue().split('\n')
+        self.assertEqual(lines[0], '> alpha - Referring sites')
+        # Sites are no longer truncated and the value columns line up
+        self.assertTrue(lines[3].startswith(long_site + '  12345  3'))
+        self.assertEqual(lines[1].index('Views'), lines[3].index('12345'))
+
+    def test_table_layout(self):
+        table = gts_main.json_to_table('alpha', traffic_json('alpha', 'views'), 'traffic').split('\n')
+        self.assertEqual(table[0], '> alpha - Visitors')
+        self.assertEqual(table[1].split(), ['Date', 'Views', 'Unique', 'visitors'])
+        self.assertEqual(table[2].split()[0], 'Totals')
+        self.assertEqual(len(table), 2 + 1 + 14 + 1)
+
+    def test_tsv(self):
+        lines = render('tsv', ['alpha', 'beta']).splitlines()
+        self.assertEqual(lines[0], 'repository_name\tmetric\tdate_or_site\tcount\tuniques')
+        self.assertEqual(len(lines), 1 + 2 * (14 + 14 + 2))
+        self.assertEqual(lines[1].split('\t')[:3], ['alpha', 'views', '2017-07-17'])
+
+    def test_jsonl(self):
+        lines = render('jsonl', ['alpha', 'beta']).splitlines()
+        self.assertEqual(len(lines), 2)
+        record = json.loads(lines[1])
+        self.assertEqual(record['repo'], 'beta')
+        self.assertEqual(record['referrers'], referrers_json('beta'))
+
+    def test_jsonl_empty_and_missing_parts(self):
+        out = io.StringIO()
+        stats = RepoStats.from_json('quiet', {'count': 0, 'uniques': 0, 'views': []},
+                                    {'count': 0, 'uniques': 0, 'clones': []}, [])
+        Renderer(out, 'jsonl').write(stats)
+        Renderer(out, 'jsonl').write(RepoStats('partial', views=stats.views))
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records[0]['views'], {'count': 0, 'uniques': 0, 'views': []})
+        self.assertEqual(records[0]['referrers'], [])
+        self.assertEqual((records[1]['clones'], records[1]['referrers']), (None, None))
+
+    def test_main_format_option(self):
+        self.start_mock(['alpha', 'beta'])
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['user:pw', 'ALL', 'no_csv', '--no-cache', '--format', 'jsonl'])
+        self.assertEqual([json.loads(line)['repo'] for line in out.getvalue().splitlines()], ['alpha', 'beta'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts import report
+from gts.sqlite_store import SqliteStore
+from mock_github import repo_stats, traffic_json
+
+sample_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample-data')
+
+
+class AggregatorTest(unittest.TestCase):
+
+    def test_week_over_week_and_rolling_average(self):
+        aggregator = report.Aggregator()
+        for day in range(1, 15):
+            aggregator.add('alpha', '2017-07-%02d' % day, 2 if day > 7 else 1, 1)
+        aggregator.add('beta', '2017-07-14', 100, 10)
+        result = aggregator.result(top=1)
+        self.assertEqual(result['repositories'], 2)
+        self.assertEqual(result['count'], 7 + 14 + 100)
+        self.assertEqual([r['repo'] for r in result['top']], ['beta'])
+        self.assertEqual((result['last_week'], result['previous_week']), (114, 7))
+        self.assertEqual(len(result['daily']), 14)
+        self.assertAlmostEqual(result['daily'][-1]['rolling_average'], 114 / 7.0)
+        self.assertAlmostEqual(result['daily'][0]['rolling_average'], 1 / 7.0)
+
+    def test_end_before_the_latest_date(self):
+        aggregator = report.Aggregator(end='2020-01-31')
+        for day in range(60):
+            date = (datetime.date(2020, 1, 1) + datetime.timedelta(days=day)).isoformat()
+            aggregator.add('alpha', date, 10, 1)
+        result = aggregator.result()
+        self.assertEqual((result['last_week'], result['previous_week'], result['count']), (70, 70, 310))
+        self.assertEqual(result['daily'][-1]['date'], '2020-01-31')
+
+    def test_rolled_up_periods_only_count_in_totals(self):
+        aggregator = report.Aggregator(end='2020-02-14')
+        aggregator.add_period('alpha', 'month', '2020-01-01', 3100, 100)
+        aggregator.add_period('alpha', 'week', '2020-02-01', 700, 70)
+        aggregator.add_period('alpha', 'week', '2020-03-02', 700, 70)
+        for day in range(8, 15):
+            aggregator.add('alpha', '2020-02-%02d' % day, 10, 1)
+        result = aggregator.result()
+        self.assertEqual((result['first_date'], result['count'], result['uniques']), ('2020-01-01', 3870, 177))
+        # The week starting 2020-02-01 is not counted in the previous window
+        self.assertEqual((result['last_week'], result['previous_week']), (70, 0))
+        self.assertEqual([day['date'] for day in result['daily']][0], '2020-02-08')
+        self.assertEqual(max(day['count'] for day in result['daily']), 10)
+
+
+class ReportCommandTest(unittest.TestCase):
+
+    def run_report(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gts_main.main(['report'] + list(argv))
+        return out.getvalue()
+
+    def test_csv_snapshots(self):
+        result = json.loads(self.run_report(sample_data, '--json'))
+        self.assertEqual(result['count'], 125)
+        self.assertEqual(result['last_date'], '2017-07-30')
+        clones = json.loads(self.run_report(sample_data, '-m', 'clones', '--json'))
+        self.assertEqual(clones['count'], 5)
+        self.assertIn('github-traffic-stats', self.run_report(sample_data))
+
+    def test_sqlite_history(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'history.sqlite3')
+            with SqliteStore(path) as store:
+                for repo in ('alpha', 'beta'):
+                    store.write(repo_stats(repo))
+            result = json.loads(self.run_report('--sqlite', path, '--json'))
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(result['repositories'], 2)
+        self.assertEqual(result['count'], traffic_json('alpha', 'views')['count'] + traffic_json('beta', 'views')['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
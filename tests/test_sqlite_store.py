@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts.sqlite_store import SqliteStore
+from mock_github import repo_stats, traffic_json
+
+
+class SqliteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'history.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, repos, commit=True):
+        store = SqliteStore(self.path)
+        for repo in repos:
+            store.write(repo_stats(repo))
+        store.close(commit)
+
+    def test_upsert_and_range_query(self):
+        self.write(['alpha', 'beta'])
+        # Writing the same window again updates rows rather than duplicating them
+        self.write(['alpha'])
+        with SqliteStore(self.path) as store:
+            rows = store.query('views', '2017-07-20', '2017-07-22')
+            self.assertEqual([r[:2] for r in rows], [('alpha', '2017-07-20'), ('alpha', '2017-07-21'),
+                                                     ('alpha', '2017-07-22'), ('beta', '2017-07-20'),
+                                                     ('beta', '2017-07-21'), ('beta', '2017-07-22')])
+            self.assertEqual(len(store.query('clones', repos=['beta'])), 14)
+            totals = dict((r[0], r[1]) for r in store.totals('views'))
+            self.assertEqual(totals['alpha'], traffic_json('alpha', 'views')['count'])
+
+    def test_rollback(self):
+        self.write(['alpha'], commit=False)
+        with SqliteStore(self.path) as store:
+            self.assertEqual(store.query('views'), [])
+
+    def test_range_query_uses_index(self):
+        with SqliteStore(self.path) as store:
+            plan = store.conn.execute('EXPLAIN QUERY PLAN SELECT repo FROM traffic_daily '
+                                      'WHERE metric = ? AND date BETWEEN ? AND ?', ('views', 'a', 'b')).fetchall()
+        self.assertIn('traffic_daily_metric_date', ' '.join(str(r) for r in plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
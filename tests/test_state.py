@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gts.record import RepoStats
+from gts.sqlite_store import SqliteStore
+from gts.state import IncrementalStore, State
+
+
+def window(first_day, overrides=None):
+    rows = []
+    for day in range(first_day, first_day + 14):
+        count = (overrides or {}).get(day, day)
+        rows.append({'timestamp': '2017-07-%02dT00:00:00Z' % day, 'count': count, 'uniques': 1})
+    return {'count': sum(r['count'] for r in rows), 'uniques': 14, 'views': rows, 'clones': rows}
+
+
+class RecordingStore(object):
+
+    def __init__(self):
+        self.written = []
+        self.closed = None
+
+    def write(self, stats):
+        self.written.append((stats.repo, [day for day, count, uniques in stats.views.rows()],
+                             [day for day, count, uniques in stats.clones.rows()], stats.referrers.to_json()))
+
+    def commit(self):
+        pass
+
+    def close(self, commit=True):
+        self.closed = commit
+
+
+class IncrementalStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_once(self, response, commit=True):
+        inner = RecordingStore()
+        store = IncrementalStore(inner, State(self.path))
+        store.write(RepoStats.from_json('alpha', response, response, []))
+        store.close(commit)
+        return inner.written[0]
+
+    def test_only_new_or_changed_days(self):
+        first = self.run_once(window(1))
+        self.assertEqual(len(first[1]), 14)
+        # Next day: one new day and day 14 updated
+        second = self.run_once(window(2, {14: 99}))
+        self.assertEqual(second[1], ['2017-07-14', '2017-07-15'])
+        self.assertEqual(second[2], ['2017-07-14', '2017-07-15'])
+        # Nothing changed
+        self.assertEqual(self.run_once(window(2, {14: 99}))[1], [])
+
+    def test_days_before_the_high_water_mark_are_skipped(self):
+        self.run_once(window(10))
+        # An older window reappearing is not written again
+        self.assertEqual(self.run_once(window(3))[1], [])
+
+    def test_rows_of_the_wrapped_store(self):
+        referrers = [{'referrer': 'Google', 'count': 3, 'uniques': 1}]
+        with IncrementalStore(SqliteStore(os.path.join(self.tmp, 'history.sqlite3')), State(self.path)) as store:
+            store.write(RepoStats.from_json('alpha', window(1), window(1), referrers))
+            store.write(RepoStats.from_json('alpha', window(2), window(2), referrers))
+            # Referrers are counted, and the days already stored are not
+            self.assertEqual((store.rows, store.kept, store.skipped), (2 * 14 + 1 + 2 + 1, 30, 26))
+
+    def test_state_not_saved_without_commit(self):
+        self.run_once(window(1), commit=False)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(len(self.run_once(window(1))[1]), 14)
+
+    def test_state_saved_every_n_commits(self):
+        store = IncrementalStore(RecordingStore(), State(self.path), save_every=3)
+        for i in range(5):
+            store.write(RepoStats.from_json('repo-%d' % i, window(1), window(1), []))
+            store.commit()
+            self.assertEqual(os.path.exists(self.path), i >= 2)
+        self.assertEqual(len(State(self.path).section('incremental')), 3)
+        store.close()
+        self.assertEqual(len(State(self.path).section('incremental')), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+from gts import main as gts_main
+from gts.stats import Histogram, Stats, endpoint_name
+from mock_github import MockGitHubTestCase
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_quantiles(self):
+        histogram = Histogram()
+        for ms in range(1, 101):
+            histogram.add(ms / 1000.0)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.total, 5.05)
+        self.assertAlmostEqual(histogram.max, 0.1)
+        # Quantiles are bucket bounds, within a factor of two of the exact value
+        self.assertTrue(0.05 <= histogram.quantile(0.5) <= 0.1)
+        self.assertTrue(0.095 <= histogram.quantile(0.95) <= 0.1)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name('GET', 'https://api.github.com/repos/nchah/gts/traffic/popular/referrers'),
+                         'GET /repos/{owner}/{repo}/traffic/popular/referrers')
+        self.assertEqual(endpoint_name('GET', 'https://api.github.com/users/nchah/repos?per_page=100&page=2'),
+                         'GET /users/{owner}/repos')
+        self.assertEqual(endpoint_name('POST', 'https://api.github.com/graphql'), 'POST /graphql')
+
+
+class StatsCliTest(MockGitHubTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.start_mock(['repo-%d' % i for i in range(12)], per_page=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_stats_json_and_profile(self):
+        stats_path = os.path.join(self.tmp_dir, 'stats.json')
+        profile_path = os.path.join(self.tmp_dir, 'run.prof')
+        self.mock.fail('/repos/org/repo-3/traffic/clones', 502)
+        err = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(err):
+            gts_main.main(['user:token', 'ALL', 'set_sqlite', '-o', 'org', '--no-cache', '-w', '3',
+                           '--sqlite-path', os.path.join(self.tmp_dir, 'h.sqlite3'),
+                           '--journal', os.path.join(self.tmp_dir, 'journal.log'),
+                           '--stats', '--stats-json', stats_path, '--profile', profile_path])
+        with open(stats_path) as f:
+            summary = json.load(f)
+        requests = dict(((r['endpoint'], r['status']), r['count']) for r in summary['requests'])
+        self.assertEqual(requests[('GET /users/{owner}/repos', 200)], 3)
+        self.assertEqual(requests[('GET /repos/{owner}/{repo}/traffic/views', 200)], 12)
+        self.assertEqual(requests[('GET /repos/{owner}/{repo}/traffic/clones', 502)], 1)
+        self.assertEqual(requests[('GET /repos/{owner}/{repo}/traffic/clones', 200)], 12)
+        self.assertEqual(summary['counters']['retries'], 1)
+        self.assertEqual(summary['counters']['rows_written'], 12 * (14 + 14 + 2))
+        self.assertEqual(summary['stages']['request']['count'], 3 + 12 * 3 + 1)
+        self.assertEqual(summary['stages']['decode']['count'], 3 + 12 * 3)
+        self.assertEqual(summary['stages']['store']['count'], 12)
+        self.assertEqual(summary['stages']['render']['count'], 12)
+        self.assertGreater(summary['bytes'], 0)
+        self.assertIn('Endpoint', err.getvalue())
+        self.assertIn('Rows written: 360', err.getvalue())
+        # The fetches of the -w workers are in the profile, not only the waits of the main thread
+        profile = pstats.Stats(profile_path)
+        self.assertTrue(any(name == 'fetch_json' for (path, line, name) in profile.stats))
+
+    def test_threads_share_stats(self):
+        stats = Stats()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in executor.map(lambda i: stats.observe('decode', 0.001), range(1000)):
+                pass
+        self.assertEqual(stats.summary()['stages']['decode']['count'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()